@@ -0,0 +1,87 @@
+"""
+Measures prompt compaction on the generated sample corpus and checks that it
+keeps what the summary needs.
+
+    python benchmarks/bench_compaction.py [--budget 3000] [--repeat 3]
+
+For each PDF it reports tokens before and after compaction, the tokens saved,
+the time per page for the whole-document and streaming variants, and what was
+removed. On the paper-shaped fixtures it also asserts that running headers,
+page numbers and references are gone, hyphenated line breaks are joined, and
+that the abstract and conclusion survive a small token budget.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "kairos-take-home-0"))
+
+from chunked_summarizer import estimate_tokens
+from pdf_extraction import extract_pages, shutdown_pool
+from prompt_compaction import compact_page_stream, compact_pages
+from sample_pdfs import ensure_paper_samples, ensure_samples
+
+PAGE_FOOTER_RE = re.compile(r"^Page \d+ of \d+$", re.MULTILINE)
+REFERENCE_RE = re.compile(r"^\[\d+\] Author", re.MULTILINE)
+
+
+def best_time(func, repeat: int):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def check_paper(name: str, pages, budget: int):
+    # Invariants for the fixtures built by sample_pdfs.build_paper_lines.
+    for text, label in ((compact_pages(pages).render(), "unbudgeted"),
+                        ("\n".join(compact_page_stream(pages)), "streamed")):
+        assert not PAGE_FOOTER_RE.search(text), f"{name} ({label}): page footer left in"
+        assert "- Preprint" not in text, f"{name} ({label}): running header left in"
+        assert not REFERENCE_RE.search(text), f"{name} ({label}): reference entries left in"
+        assert "[References omitted]" in text, f"{name} ({label}): references marker missing"
+        assert "repre-\n" not in text and "representation" in text, f"{name} ({label}): hyphenated break not joined"
+
+    document = compact_pages(pages)
+    text = document.render(budget)
+    assert document.stats["tokens_after"] <= budget, f"{name}: {document.stats['tokens_after']} tokens over budget {budget}"
+    assert "Abstract" in text, f"{name}: abstract dropped under budget {budget}"
+    assert "Conclusion" in text, f"{name}: conclusion dropped under budget {budget}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=int, default=3000, help="token budget for the invariant checks")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    paper_paths = ensure_paper_samples()
+    print(f"{'pdf':<16}{'pages':>7}{'tokens':>9}{'compact':>9}{'saved':>8}{'ms/page':>9}{'stream_ms/page':>16}"
+          f"{'boiler':>8}{'refs':>7}{'table':>7}")
+    for path in ensure_samples() + paper_paths:
+        pages = extract_pages(path)
+        compact_s, document = best_time(lambda: compact_pages(pages), args.repeat)
+        document.render()
+        stream_s, _ = best_time(lambda: list(compact_page_stream(pages)), args.repeat)
+        stats = document.stats
+        assert stats["tokens_before"] == sum(estimate_tokens(page) for page in pages)
+
+        name = os.path.splitext(os.path.basename(path))[0]
+        print(f"{name:<16}{len(pages):>7}{stats['tokens_before']:>9}{stats['tokens_after']:>9}{stats['tokens_saved']:>8}"
+              f"{compact_s * 1000 / len(pages):>9.3f}{stream_s * 1000 / len(pages):>16.3f}"
+              f"{stats['boilerplate_lines']:>8}{stats['reference_lines']:>7}{stats['table_rows']:>7}")
+        if path in paper_paths:
+            check_paper(name, pages, args.budget)
+
+    print(f"checks passed (budget {args.budget} tokens)")
+    shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Measures peak RSS and wall time of N concurrent PDF downloads against a local
+HTTP server, comparing the original read-everything download with the
+streaming, spooled download_pdf (cold, then revalidated with a 304).
+
+    python benchmarks/bench_download.py [--concurrency 16] [--size-mb 20]
+
+Each mode runs in its own subprocess so peak RSS is not shared between them.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "kairos-take-home-0")
+sys.path.append(BACKEND_DIR)
+
+
+def make_payload_server(size_bytes: int):
+    """
+    Starts a threaded HTTP server on a free port that serves a payload of
+    size_bytes with an ETag, honouring If-None-Match. Returns (server, url).
+    """
+    block = (b"%PDF-1.4\n" + b"0" * 65527)[:65536]
+    etag = '"%s"' % hashlib.sha256(str(size_bytes).encode()).hexdigest()[:16]
+    last_modified = formatdate(0, usegmt=True)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(size_bytes))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.end_headers()
+            remaining = size_bytes
+            while remaining > 0:
+                chunk = block[:min(len(block), remaining)]
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/paper.pdf"
+
+
+def legacy_download(url: str):
+    # The original download_pdf body.
+    import requests
+    response = requests.get(url, stream=True)
+    response.raise_for_status()
+    return io.BytesIO(response.content)
+
+
+def run_mode(mode: str, url: str, concurrency: int, blob_dir: str):
+    os.environ["PDF_BLOB_STORE_DIR"] = blob_dir
+    from pdf_summarize_server import download_pdf
+
+    def fetch(_):
+        if mode == "legacy":
+            content = legacy_download(url)
+            return len(content.getvalue())
+        result = download_pdf(url)
+        size = result.size
+        result.close()
+        return size
+
+    if mode == "revalidate":
+        fetch(0)  # populate the blob store
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        sizes = list(executor.map(fetch, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"mode": mode, "downloads": len(sizes), "bytes_each": sizes[0], "seconds": round(elapsed, 3),
+            "peak_rss_mb": round(peak_kb / 1024, 1), "rss_growth_mb": round((peak_kb - baseline_kb) / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--size-mb", type=float, default=20)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    parser.add_argument("--blob-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.url, args.concurrency, args.blob_dir)))
+        return
+
+    server, url = make_payload_server(int(args.size_mb * 1024 * 1024))
+    try:
+        for mode in ("legacy", "streaming", "revalidate"):
+            with tempfile.TemporaryDirectory() as blob_dir:
+                output = subprocess.run(
+                    [sys.executable, __file__, "--mode", mode, "--url", url, "--blob-dir", blob_dir,
+                     "--concurrency", str(args.concurrency)],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+            print(output.strip().splitlines()[-1])
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compares the original single-threaded PyPDF2 loop with the process-pool page
+extractor on the generated sample corpus.
+
+    python benchmarks/bench_extract.py [--workers 4] [--repeat 3]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "kairos-take-home-0"))
+
+import PyPDF2
+
+from pdf_extraction import iter_page_texts, shutdown_pool
+from sample_pdfs import ensure_samples
+
+
+def legacy_extract(pdf_content: io.BytesIO) -> str:
+    # The pre-pool implementation of extract_text_from_pdf.
+    text = ""
+    reader = PyPDF2.PdfReader(pdf_content)
+    for page_num in range(len(reader.pages)):
+        page = reader.pages[page_num]
+        text += page.extract_text() or ""
+    return text
+
+
+def time_call(func, repeat: int):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Warm the pool so process start-up is not billed to the first PDF.
+    list(iter_page_texts(ensure_samples()[-1], workers=args.workers))
+
+    print(f"{'pdf':<16}{'pages':>7}{'legacy_s':>11}{'pool_s':>10}{'first_page_s':>14}{'speedup':>9}")
+    for path in ensure_samples():
+        with open(path, "rb") as f:
+            data = f.read()
+        legacy_s, legacy_text = time_call(lambda: legacy_extract(io.BytesIO(data)), args.repeat)
+        pool_s, pages = time_call(lambda: list(iter_page_texts(io.BytesIO(data), workers=args.workers)), args.repeat)
+
+        start = time.perf_counter()
+        next(iter_page_texts(io.BytesIO(data), workers=args.workers))
+        first_page_s = time.perf_counter() - start
+
+        assert "".join(pages) == legacy_text, f"text mismatch for {path}"
+        name = os.path.splitext(os.path.basename(path))[0]
+        print(f"{name:<16}{len(pages):>7}{legacy_s:>11.3f}{pool_s:>10.3f}{first_page_s:>14.3f}{legacy_s / pool_s:>8.2f}x")
+
+    shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
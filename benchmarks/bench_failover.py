@@ -0,0 +1,147 @@
+"""
+Drives concurrent completions through the LLM router against an in-process
+fake primary that has a fixed capacity, answering 429 to calls beyond it,
+and stalls on some calls, with a fake fallback behind it. Reports how many
+completions succeeded, time to first token and total latency percentiles,
+and the router's retries, hedges, failovers and final concurrency limits.
+
+    python benchmarks/bench_failover.py [--requests 200] [--concurrency 32] [--capacity 8]
+
+Run it with --first-token-timeout 0 --no-fallback to compare with retries and
+adaptive limiting alone. With --hang-every N, every Nth primary call never
+sends its first token and only ends when its response is closed; the calls
+the router leaves open on the primary and the slots its limiter still holds
+are reported as hung_open and primary_in_flight (both should be 0).
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "kairos-take-home-0")
+sys.path.append(BACKEND_DIR)
+os.environ.setdefault("TRACE_LOG_PATH", "")
+
+from llm_providers import RATE_LIMITED, FakeProvider, LLMError, on_cancel, register_provider  # noqa: E402
+from llm_routing import LLMRouter  # noqa: E402
+
+PROMPT = "Summarize the following text:\n\n" + " ".join(f"word{i}" for i in range(200))
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def make_primary(capacity: int, stall_every: int, stall: float, hang_every: int = 0):
+    class CapacityProvider(FakeProvider):
+        # Rejects calls beyond capacity with a 429, as a provider's rate
+        # limiter would, stalls every stall_every-th call before its first
+        # chunk, and hangs every hang_every-th call until its response is
+        # closed.
+        in_flight = 0
+        calls = 0
+        rejected = 0
+        hung = 0
+        hung_open = 0
+        lock = threading.Lock()
+
+        def stream(self, prompt: str, model: str):
+            cls = CapacityProvider
+            with cls.lock:
+                cls.calls += 1
+                stalled = stall_every and cls.calls % stall_every == 0
+                hung = hang_every and cls.calls % hang_every == 0
+                if cls.in_flight >= capacity:
+                    cls.rejected += 1
+                    raise LLMError("Error summarizing with primary: 429 rate limit exceeded", kind=RATE_LIMITED)
+                cls.in_flight += 1
+                cls.hung += bool(hung)
+                cls.hung_open += bool(hung)
+            try:
+                if hung:
+                    closed = threading.Event()
+                    on_cancel(closed.set)
+                    closed.wait()
+                    with cls.lock:
+                        cls.hung_open -= 1
+                    return
+                if stalled:
+                    time.sleep(stall)
+                yield from super().stream(prompt, model)
+            finally:
+                with cls.lock:
+                    cls.in_flight -= 1
+
+    return CapacityProvider
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--capacity", type=int, default=8, help="calls the primary serves at once before answering 429")
+    parser.add_argument("--ttft", type=float, default=0.05, help="seconds to the first chunk")
+    parser.add_argument("--token-delay", type=float, default=0.002)
+    parser.add_argument("--stall-every", type=int, default=20, help="every Nth primary call stalls (0: never)")
+    parser.add_argument("--stall", type=float, default=3.0, help="seconds a stalled call waits before its first chunk")
+    parser.add_argument("--hang-every", type=int, default=0, help="every Nth primary call never sends a chunk (0: never)")
+    parser.add_argument("--first-token-timeout", type=float, default=0.5)
+    parser.add_argument("--max-retries", type=int, default=2)
+    parser.add_argument("--retry-base-delay", type=float, default=0.5)
+    parser.add_argument("--no-fallback", action="store_true")
+    args = parser.parse_args()
+
+    os.environ.update(FAKE_LLM_FIRST_TOKEN_DELAY=str(args.ttft), FAKE_LLM_DELAY=str(args.token_delay), FAKE_LLM_WORDS="50")
+    primary = make_primary(args.capacity, args.stall_every, args.stall, args.hang_every)
+    register_provider("primary", primary)
+    register_provider("fallback", FakeProvider)
+    targets = [("primary", "stub")] + ([] if args.no_fallback else [("fallback", "stub")])
+    router = LLMRouter(first_token_timeout=args.first_token_timeout, max_retries=args.max_retries,
+                       retry_base_delay=args.retry_base_delay,
+                       limiter_options={"initial": args.concurrency, "max_limit": args.concurrency * 2,
+                                        "latency_target": args.first_token_timeout or 1.0})
+
+    def run(_):
+        start = time.perf_counter()
+        first_token = None
+        try:
+            for _ in router.stream(PROMPT, targets):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+        except LLMError:
+            return None
+        return first_token, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(run, range(args.requests)))
+    elapsed = time.perf_counter() - start
+    succeeded = [result for result in results if result is not None]
+    stats = router.stats()
+
+    print(json.dumps({
+        "requests": args.requests,
+        "succeeded": len(succeeded),
+        "throughput_rps": round(len(succeeded) / elapsed, 1),
+        **{f"ttft_{label}_ms": round(percentile([ttft for ttft, _ in succeeded], fraction) * 1000, 1)
+           for label, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))},
+        **{f"total_{label}_ms": round(percentile([total for _, total in succeeded], fraction) * 1000, 1)
+           for label, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))},
+        "primary_calls": primary.calls,
+        "primary_rejected": primary.rejected,
+        "hung": primary.hung,
+        "hung_open": primary.hung_open,
+        "primary_in_flight": stats["providers"]["primary"]["in_flight"],
+        "retries": stats["retries"],
+        "hedges": stats["hedges"],
+        "failovers": stats["failovers"],
+        "limits": {name: provider["limit"] for name, provider in stats["providers"].items()},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
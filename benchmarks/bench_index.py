@@ -0,0 +1,110 @@
+"""
+Builds a local index over synthetic paper metadata and measures ingest
+throughput, on-disk size, reload time and query latency.
+
+    python benchmarks/bench_index.py [--docs 100000] [--queries 500]
+
+Words are drawn from a Zipf-like distribution over a fixed vocabulary so
+common terms have long postings lists, as in real abstracts.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "kairos-take-home-0")
+sys.path.append(BACKEND_DIR)
+
+from local_index import LocalIndex  # noqa: E402
+
+
+def make_vocabulary(size: int, rng: random.Random):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(4, 10))))
+    return sorted(words)
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--words", type=int, default=150, help="Words per abstract")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        index = LocalIndex(index_dir, compact_after=args.docs + 1)
+        start = time.perf_counter()
+        for i in range(args.docs):
+            words = rng.choices(vocabulary, cum_weights=cum_weights, k=args.words + 10)
+            index.add_paper({
+                "title": " ".join(words[:10]),
+                "authors": f"Author {i % 997}, Author {i % 991}",
+                "summary": " ".join(words[10:]),
+                "pdf_url": f"http://arxiv.org/pdf/{2400 + i // 100000}.{i % 100000:05d}v1",
+            })
+        ingest_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index.compact()
+        compact_seconds = time.perf_counter() - start
+        disk_bytes = sum(os.path.getsize(os.path.join(index_dir, name)) for name in os.listdir(index_dir))
+
+        start = time.perf_counter()
+        index = LocalIndex(index_dir)
+        load_seconds = time.perf_counter() - start
+
+        # "zipf" queries draw terms from the document distribution, so most
+        # include a term that appears in nearly every document. "content"
+        # queries skip the 1% most common terms, which in real abstracts are
+        # stopwords the tokenizer already drops.
+        common = len(vocabulary) // 100
+        content_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(common, len(vocabulary))))
+        query_sets = {
+            "zipf": [" ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(2, 4)))
+                     for _ in range(args.queries)],
+            "content": [" ".join(rng.choices(vocabulary[common:], cum_weights=content_weights, k=rng.randint(2, 4)))
+                        for _ in range(args.queries)],
+        }
+        latencies = {}
+        for name, queries in query_sets.items():
+            for query in queries:  # warm the decoded postings cache
+                index.search(query, limit=10)
+            latencies[name] = []
+            for query in queries:
+                start = time.perf_counter()
+                index.search(query, limit=10)
+                latencies[name].append(time.perf_counter() - start)
+
+        stats = index.stats()
+        print(json.dumps({
+            "docs": args.docs,
+            "terms": stats["terms"],
+            "ingest_docs_per_s": round(args.docs / ingest_seconds),
+            "compact_s": round(compact_seconds, 2),
+            "load_s": round(load_seconds, 2),
+            "postings_mb": round(stats["postings_bytes"] / 1e6, 1),
+            "disk_mb": round(disk_bytes / 1e6, 1),
+            **{f"{name}_query_{label}_ms": round(percentile(values, fraction) * 1000, 2)
+               for name, values in latencies.items() for label, fraction in (("p50", 0.50), ("p99", 0.99))},
+        }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Measures how much search-result prefetching cuts the time to the first
+summary chunk, using the stub arXiv and PDF servers and the fake LLM
+provider.
+
+    python benchmarks/bench_prefetch.py [--pdf-delay 0.5] [--top-k 3] [--think 2]
+
+For each mode it runs a search, waits --think seconds (the user reading the
+results), then summarizes each of the top-K results in turn and reports the
+median time to the first chunk and to the end of the summary:
+- "off": no prefetching
+- "prefetch": downloaded and extracted in the background
+- "presummarize": also summarized while idle
+
+Every mode uses its own temporary caches, so nothing is carried over.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(os.path.dirname(BENCH_DIR), "kairos-take-home-0")
+
+from stubs import start_arxiv_stub, start_pdf_stub
+
+# Runs in a fresh interpreter per mode, as the pipeline reads its settings at import.
+RUN_SCRIPT = """
+import json, statistics, sys, time
+sys.path.append(%(backend_dir)r)
+from paper_search_server import search_papers
+from summary_pipeline import prefetch_search_results, prefetcher, summarize_pdf_url
+
+papers = search_papers("prefetch benchmark", max_results=%(top_k)d, start=%(start)d)
+prefetch_search_results(papers)
+time.sleep(%(think)f)
+first_chunk, total = [], []
+for paper in papers:
+    with prefetcher.foreground():
+        start = time.perf_counter()
+        stream = summarize_pdf_url(paper["pdf_url"])
+        next(stream)
+        first_chunk.append(time.perf_counter() - start)
+        for _ in stream:
+            pass
+        total.append(time.perf_counter() - start)
+print(json.dumps({"first_chunk_p50_s": round(statistics.median(first_chunk), 3),
+                  "total_p50_s": round(statistics.median(total), 3), "prefetch": prefetcher.stats()}))
+"""
+
+MODES = {
+    "off": {"PREFETCH_TOP_K": "0"},
+    "prefetch": {"PREFETCH_SUMMARIZE": "0"},
+    "presummarize": {"PREFETCH_SUMMARIZE": "1"},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-delay", type=float, default=0.5, help="seconds the PDF stub waits before each response")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--think", type=float, default=2.0, help="seconds between the search and the first summarize")
+    parser.add_argument("--llm-delay", type=float, default=0.01, help="FAKE_LLM_DELAY between chunks")
+    args = parser.parse_args()
+
+    pdf_server, pdf_base_url = start_pdf_stub(delay=args.pdf_delay)
+    arxiv_server, arxiv_url = start_arxiv_stub(pdf_base_url)
+    for start, (mode, overrides) in enumerate(MODES.items()):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, ARXIV_API_URL=arxiv_url, ARXIV_MIN_INTERVAL="0", LLM_PROVIDER="fake", LLM_MODEL="stub",
+                       FAKE_LLM_DELAY=str(args.llm_delay), PREFETCH_TOP_K=str(args.top_k), TRACE_LOG_PATH="",
+                       SUMMARY_CACHE_DIR=os.path.join(tmp, "summaries"), LOCAL_INDEX_DIR=os.path.join(tmp, "index"),
+                       PDF_BLOB_STORE_DIR=os.path.join(tmp, "blobs"), SUMMARY_JOBS_DB=os.path.join(tmp, "jobs.sqlite3"))
+            env.update(overrides)
+            script = RUN_SCRIPT % {"backend_dir": BACKEND_DIR, "top_k": args.top_k, "start": start * 100, "think": args.think}
+            output = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True).stdout
+            print(json.dumps({"mode": mode, "top_k": args.top_k, "pdf_delay_s": args.pdf_delay, **json.loads(output.splitlines()[-1])}))
+    pdf_server.shutdown()
+    arxiv_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Measures LLM provider cold start and per-request setup overhead against the
+local OpenAI-compatible stub.
+
+    python benchmarks/bench_providers.py [--requests 200] [--provider openai]
+
+"cold start" times importing pdf_summarize_server and building the first
+client in a fresh interpreter. The request loop then streams the same prompt
+repeatedly, either through the shared registry client ("pooled") or with the
+client rebuilt for every request ("fresh", what the code did before the
+registry), and reports time to first chunk, total time and the number of TCP
+connections the stub accepted.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(os.path.dirname(BENCH_DIR), "kairos-take-home-0")
+sys.path.append(BACKEND_DIR)
+
+from stubs import start_openai_stub
+
+COLD_START_SCRIPT = """
+import json, sys, time
+sys.path.append(%r)
+start = time.perf_counter()
+import pdf_summarize_server
+imported = time.perf_counter()
+from llm_providers import get_provider
+get_provider(%r)
+built = time.perf_counter()
+print(json.dumps({"import_s": imported - start, "first_client_s": built - imported}))
+"""
+
+
+def cold_start(provider: str, env: dict, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT % (BACKEND_DIR, provider)],
+                                env=env, capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.splitlines()[-1]))
+    return {key: round(statistics.median(sample[key] for sample in samples) * 1000, 1)
+            for key in ("import_s", "first_client_s")}
+
+
+def _percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def request_loop(mode: str, requests: int, prompt: str, model: str) -> dict:
+    from llm_providers import get_provider, reset_providers
+
+    first_chunk, total = [], []
+    for _ in range(requests):
+        if mode == "fresh":
+            reset_providers()
+        start = time.perf_counter()
+        stream = get_provider().stream(prompt, model)
+        next(stream)
+        first_chunk.append(time.perf_counter() - start)
+        for _ in stream:
+            pass
+        total.append(time.perf_counter() - start)
+    reset_providers()
+    return {
+        "first_chunk_p50_ms": round(statistics.median(first_chunk) * 1000, 3),
+        "first_chunk_p99_ms": round(_percentile(first_chunk, 0.99) * 1000, 3),
+        "total_p50_ms": round(statistics.median(total) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--provider", default="openai", help="openai (against the stub) or fake")
+    parser.add_argument("--cold-runs", type=int, default=5)
+    parser.add_argument("--words", type=int, default=20)
+    args = parser.parse_args()
+
+    server, base_url = start_openai_stub(words=args.words)
+    os.environ.update(LLM_PROVIDER=args.provider, LLM_MODEL="stub", OPENAI_BASE_URL=base_url,
+                      OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "stub-key"), FAKE_LLM_WORDS=str(args.words))
+
+    print(json.dumps({"provider": args.provider, "cold_start_ms": cold_start(args.provider, dict(os.environ), args.cold_runs)}))
+
+    prompt = "Summarize the following text:\n\n" + " ".join(f"word{i}" for i in range(2000))
+    for mode in ("fresh", "pooled"):
+        connections_before = server.handler_class.connections
+        result = request_loop(mode, args.requests, prompt, "stub")
+        result["connections"] = server.handler_class.connections - connections_before
+        print(json.dumps({"provider": args.provider, "mode": mode, "requests": args.requests, **result}))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Fills a vector store with synthetic embeddings and measures ingest
+throughput, reload time, nearest-neighbour latency and the recall of the
+LSH index against exact search. Also times re-ranking a page of search
+candidates with the hashing embedder.
+
+    python benchmarks/bench_semantic.py [--vectors 100000] [--queries 200]
+
+Vectors are drawn around a few thousand random topic centres, so that, as
+with real abstracts, each one has a handful of close neighbours.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "kairos-take-home-0")
+sys.path.append(BACKEND_DIR)
+
+from semantic_search import HashingEmbedder, SemanticIndex  # noqa: E402
+from vector_store import VectorStore  # noqa: E402
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=5000)
+    parser.add_argument("--candidates", type=int, default=50, help="search results per re-rank")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centres = rng.standard_normal((args.topics, args.dim)).astype(np.float32)
+    topics = rng.integers(0, args.topics, args.vectors)
+    vectors = centres[topics] + 0.6 * rng.standard_normal((args.vectors, args.dim)).astype(np.float32)
+    keys = [f"{2400 + i // 100000}.{i % 100000:05d}" for i in range(args.vectors)]
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = VectorStore(store_dir, args.dim, "synthetic", exact_below=0)
+        start = time.perf_counter()
+        for batch_start in range(0, args.vectors, 1000):
+            store.add_many(keys[batch_start:batch_start + 1000], vectors[batch_start:batch_start + 1000])
+        ingest_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store = VectorStore(store_dir, args.dim, "synthetic", exact_below=0)
+        load_seconds = time.perf_counter() - start
+        exact = VectorStore(store_dir, args.dim, "synthetic", exact_below=args.vectors + 1)
+
+        queries = rng.choice(args.vectors, args.queries, replace=False)
+        latencies = {"ann": [], "exact": []}
+        hits = 0
+        for row in queries.tolist():
+            query = vectors[row] + 0.3 * rng.standard_normal(args.dim).astype(np.float32)
+            results = {}
+            for name, target in (("ann", store), ("exact", exact)):
+                start = time.perf_counter()
+                results[name] = target.nearest(query, 10)
+                latencies[name].append(time.perf_counter() - start)
+            hits += len({key for key, _ in results["ann"]} & {key for key, _ in results["exact"]})
+        disk_bytes = sum(os.path.getsize(os.path.join(store_dir, name)) for name in os.listdir(store_dir))
+
+    # Re-ranking cost per /search, embedding every candidate (cold) or none
+    # of them (warm).
+    words = [f"term{i}" for i in range(5000)]
+    word_rng = random.Random(args.seed)
+    papers = [{"title": " ".join(word_rng.choices(words, k=10)), "summary": " ".join(word_rng.choices(words, k=150)),
+               "pdf_url": f"http://arxiv.org/pdf/2401.{i:05d}v1"} for i in range(args.candidates)]
+    with tempfile.TemporaryDirectory() as index_dir:
+        index = SemanticIndex(index_dir, embedder=HashingEmbedder.name)
+        start = time.perf_counter()
+        index.rerank("term1 term2 term3", papers)
+        cold_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        index.rerank("term4 term5 term6", papers)
+        warm_seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        "vectors": args.vectors,
+        "dim": args.dim,
+        "ingest_vectors_per_s": round(args.vectors / ingest_seconds),
+        "load_s": round(load_seconds, 3),
+        "disk_mb": round(disk_bytes / 1e6, 1),
+        "recall_at_10": round(hits / (10 * args.queries), 3),
+        **{f"{name}_query_{label}_ms": round(percentile(values, fraction) * 1000, 2)
+           for name, values in latencies.items() for label, fraction in (("p50", 0.50), ("p99", 0.99))},
+        "rerank_cold_ms": round(cold_seconds * 1000, 2),
+        "rerank_warm_ms": round(warm_seconds * 1000, 2),
+    }))
+
+
+if __name__ == "__main__":
+    main()
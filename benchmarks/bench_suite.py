@@ -0,0 +1,287 @@
+"""
+Offline benchmark of every pipeline stage against the local stand-ins in
+stubs.py: the arXiv Atom API, the static PDF server over the generated
+sample corpus, and a streaming LLM with a set time to first token and token
+rate. No network access or API keys are needed.
+
+    python benchmarks/bench_suite.py [--output results.json] [--baseline previous.json]
+
+Stages:
+- search: search_arxiv, uncached
+- download: download_pdf of each sample PDF, bypassing the blob store
+- extract: extract_pages_from_pdf of each sample PDF
+- llm: summarize_text_with_llm of a paper-sized prompt
+- endpoint_search, endpoint_summarize: POST /search and /summarize on a
+  running host (--backend), with the summary cache disabled
+
+Each stage reports its throughput, p50/p95/p99 latency and peak memory:
+peak_alloc_mb is the most Python memory one operation had allocated at once
+(tracemalloc, measured on a separate untimed run), and peak_rss_mb the peak
+RSS of the process running the stage (Linux only). Extraction runs partly in
+worker processes, which neither figure covers.
+
+The results are one JSON document, printed and written to --output. With
+--baseline, each stage is compared with an earlier run, and the script exits
+with status 1 if any latency percentile grew, or throughput fell, by more
+than --max-regression (default 20%).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from load_test import BENCH_DIR, REPO_ROOT, percentile, process_stats, run_load, start_backend
+from sample_pdfs import ensure_samples
+
+BACKEND_DIR = os.path.join(REPO_ROOT, "kairos-take-home-0")
+sys.path.append(BACKEND_DIR)
+
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def reset_peak_rss():
+    # Writing 5 to clear_refs resets the VmHWM high-water mark (Linux only).
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def measure(run_one, items, unit: str, repeat: int) -> dict:
+    """
+    Times run_one(item) for every item, repeat times over, after one warm-up
+    pass. run_one returns how many units (bytes, pages, ...) it processed,
+    or None on failure.
+    """
+    for item in items:
+        run_one(item)
+    reset_peak_rss()
+    latencies = []
+    units = 0
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            op_start = time.perf_counter()
+            processed = run_one(item)
+            if processed is None:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - op_start)
+            units += processed
+    elapsed = time.perf_counter() - start
+    result = summarize_latencies(latencies, elapsed)
+    result.update(errors=errors, **{f"{unit}_per_s": round(units / elapsed, 1)})
+
+    peak_alloc = 0
+    for item in items:
+        tracemalloc.start()
+        run_one(item)
+        peak_alloc = max(peak_alloc, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    result["peak_alloc_mb"] = round(peak_alloc / 1e6, 2)
+    rss = process_stats(os.getpid()).get("server_peak_rss_mb")
+    if rss is not None:
+        result["peak_rss_mb"] = rss
+    return result
+
+
+def summarize_latencies(latencies, elapsed: float) -> dict:
+    return {
+        "ops": len(latencies),
+        "ops_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        **{key: round(percentile(latencies, fraction) * 1000, 2)
+           for key, fraction in zip(LATENCY_KEYS, (0.50, 0.95, 0.99))},
+    }
+
+
+def bench_pipeline(args, urls: dict) -> dict:
+    # The backend modules read their settings from the environment when
+    # imported, so they are imported once main() has set it up.
+    from paper_search_server import search_arxiv
+    from pdf_extraction import shutdown_pool
+    from pdf_summarize_server import download_pdf, extract_pages_from_pdf, summarize_text_with_llm
+
+    pdf_names = [os.path.basename(path) for path in ensure_samples()]
+    stages = {}
+
+    def search(i):
+        return len(search_arxiv(f"benchmark query {i}", max_results=args.search_results, use_cache=False)) or None
+
+    stages["search"] = measure(search, range(args.search_queries), "papers", args.repeat)
+
+    sequence = iter(range(10 ** 9))
+
+    def download(name):
+        # A new query string each time, so every download is a full one.
+        pdf = download_pdf(f"{urls['pdf_base_url']}/{name}?n={next(sequence)}")
+        if pdf is None:
+            return None
+        with pdf:
+            return pdf.size
+
+    stages["download"] = measure(download, pdf_names, "bytes", args.repeat)
+
+    def extract(name):
+        return len(extract_pages_from_pdf(os.path.join(BENCH_DIR, "samples", name))) or None
+
+    stages["extract"] = measure(extract, pdf_names, "pages", args.repeat)
+    shutdown_pool()
+
+    prompt_text = "\n".join(extract_pages_from_pdf(os.path.join(BENCH_DIR, "samples", "paper-12p.pdf")))
+    first_tokens = []
+
+    def summarize(_):
+        start = time.perf_counter()
+        chunks = 0
+        for chunk in summarize_text_with_llm(prompt_text):
+            if not chunks:
+                first_tokens.append(time.perf_counter() - start)
+            if chunk.startswith("Error"):
+                return None
+            chunks += 1
+        return chunks
+
+    stages["llm"] = measure(summarize, range(args.llm_requests), "tokens", args.repeat)
+    stages["llm"]["ttft_p50_ms"] = round(percentile(first_tokens, 0.50) * 1000, 2)
+    return stages
+
+
+def bench_endpoints(args, urls: dict, work_dir: str) -> dict:
+    env = dict(os.environ, SUMMARY_CACHE_DIR=os.path.join(work_dir, "endpoint-summaries"),
+               PDF_BLOB_STORE_DIR=os.path.join(work_dir, "endpoint-blobs"),
+               LOCAL_INDEX_DIR=os.path.join(work_dir, "endpoint-index"),
+               SUMMARY_JOBS_DB=os.path.join(work_dir, "endpoint-jobs.sqlite3"))
+    workloads = {
+        "endpoint_search": ("/search", lambda i: {"query": f"endpoint query {i}"}),
+        "endpoint_summarize": ("/summarize", lambda i: {"pdf_url": f"{urls['pdf_base_url']}/short-4p.pdf?n={i}"}),
+    }
+    stages = {}
+    process, base_url = start_backend(args.backend, env)
+    try:
+        for name, (path, make_body) in workloads.items():
+            result = asyncio.run(run_load(base_url, path, make_body, args.endpoint_requests, args.concurrency))
+            stages[name] = {
+                "ops": result["requests"] - result["errors"],
+                "ops_per_s": result["throughput_rps"],
+                **{key: round(result[key.replace("_ms", "_s")] * 1000, 2) for key in LATENCY_KEYS},
+                "errors": result["errors"],
+                "ttfb_p50_ms": round(result["ttfb_p50_s"] * 1000, 2),
+                "concurrency": args.concurrency,
+            }
+        rss = process_stats(process.pid).get("server_peak_rss_mb")
+        if rss is not None:
+            for name in workloads:
+                stages[name]["peak_rss_mb"] = rss
+    finally:
+        process.terminate()
+        process.wait()
+    return stages
+
+
+def compare(current: dict, baseline: dict, max_regression: float):
+    """
+    Returns a description of each metric that regressed by more than
+    max_regression (a fraction) from baseline to current.
+    """
+    regressions = []
+    for stage, result in current["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous:
+            continue
+        for key in LATENCY_KEYS:
+            if previous.get(key) and result.get(key, 0) > previous[key] * (1 + max_regression):
+                regressions.append(f"{stage}.{key}: {previous[key]} -> {result[key]}")
+        if previous.get("ops_per_s") and result.get("ops_per_s", 0) < previous["ops_per_s"] * (1 - max_regression):
+            regressions.append(f"{stage}.ops_per_s: {previous['ops_per_s']} -> {result['ops_per_s']}")
+    return regressions
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="write the results JSON here too")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes over each stage's inputs")
+    parser.add_argument("--search-queries", type=int, default=20)
+    parser.add_argument("--search-results", type=int, default=25)
+    parser.add_argument("--llm-requests", type=int, default=5)
+    parser.add_argument("--llm-provider", default="fake", choices=["fake", "openai"],
+                        help="fake runs in-process; openai streams from the stub over HTTP")
+    parser.add_argument("--llm-ttft", type=float, default=0.2, help="seconds to the first LLM token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200)
+    parser.add_argument("--llm-words", type=int, default=100, help="tokens per completion")
+    parser.add_argument("--arxiv-delay", type=float, default=0.0)
+    parser.add_argument("--pdf-delay", type=float, default=0.0)
+    parser.add_argument("--backend", default="flask", choices=["flask", "asgi"])
+    parser.add_argument("--endpoint-requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--skip-endpoints", action="store_true")
+    args = parser.parse_args()
+
+    # The stubs get their own process so they do not compete with the
+    # measured code for the GIL.
+    stubs = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "stubs.py"),
+                              "--arxiv-delay", str(args.arxiv_delay), "--pdf-delay", str(args.pdf_delay),
+                              "--llm-ttft", str(args.llm_ttft), "--llm-tokens-per-second", str(args.llm_tokens_per_second),
+                              "--llm-words", str(args.llm_words)],
+                             stdout=subprocess.PIPE, text=True)
+    urls = json.loads(stubs.stdout.readline())
+
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            os.environ.update(
+                LLM_PROVIDER=args.llm_provider, LLM_MODEL="stub", OPENAI_BASE_URL=urls["openai_base_url"],
+                OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "stub-key"),
+                FAKE_LLM_FIRST_TOKEN_DELAY=str(args.llm_ttft), FAKE_LLM_DELAY=str(1 / args.llm_tokens_per_second),
+                FAKE_LLM_WORDS=str(args.llm_words),
+                ARXIV_API_URL=urls["arxiv_url"], ARXIV_MIN_INTERVAL="0", SUMMARY_MODE="single",
+                SUMMARY_CACHE_DIR=os.path.join(work_dir, "summaries"), SUMMARY_CACHE_MAX_BYTES="0",
+                PDF_BLOB_STORE_DIR=os.path.join(work_dir, "blobs"), LOCAL_INDEX_DIR=os.path.join(work_dir, "index"),
+                SUMMARY_JOBS_DB=os.path.join(work_dir, "jobs.sqlite3"), TRACE_LOG_PATH="")
+            stages = bench_pipeline(args, urls)
+            if not args.skip_endpoints:
+                stages.update(bench_endpoints(args, urls, work_dir))
+    finally:
+        stubs.terminate()
+        stubs.wait()
+
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "stages": stages,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Measures how /summarize throughput scales with the number of worker
+processes in the multi-process deployment (gunicorn.conf.py), against the
+stub arXiv and PDF servers and the fake LLM provider.
+
+    python benchmarks/bench_workers.py [--workers 1,2,4] [--backend flask] [--pdf paper-30p.pdf]
+
+Every request asks for a distinct URL and the summary cache is disabled, so
+each one downloads, extracts and compacts the PDF. With no LLM delay the
+work is CPU-bound, and a single process is limited by the GIL. Each worker
+count gets its own shared store and caches. Requires gunicorn (and
+uvicorn-worker for --backend asgi).
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from load_test import BENCH_DIR, REPO_ROOT, free_port, run_load
+
+BACKENDS = {
+    "flask": ["main:app"],
+    "asgi": ["-k", "uvicorn_worker.UvicornWorker", "main_async:app"],
+}
+
+
+def start_gunicorn(backend: str, workers: int, env: dict):
+    port = free_port()
+    env = dict(env, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{port}")
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", *BACKENDS[backend]],
+                               cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(base_url + "/", timeout=1).status_code == 200:
+                # Let the remaining workers finish importing the app.
+                time.sleep(1 + workers * 0.25)
+                return process, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("gunicorn did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=f"1,2,{os.cpu_count()}", help="comma-separated worker counts")
+    parser.add_argument("--backend", default="flask", choices=sorted(BACKENDS))
+    parser.add_argument("--pdf", default="paper-30p.pdf", help="sample PDF every request summarizes")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="FAKE_LLM_DELAY between chunks")
+    args = parser.parse_args()
+
+    stubs = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "stubs.py")], stdout=subprocess.PIPE, text=True)
+    urls = json.loads(stubs.stdout.readline())
+    pdf_url = f"{urls['pdf_base_url']}/{args.pdf}"
+
+    baseline = None
+    try:
+        for workers in (int(count) for count in args.workers.split(",")):
+            with tempfile.TemporaryDirectory() as work_dir:
+                env = dict(os.environ,
+                           LLM_PROVIDER="fake", LLM_MODEL="stub", FAKE_LLM_DELAY=str(args.llm_delay),
+                           ARXIV_API_URL=urls["arxiv_url"], ARXIV_MIN_INTERVAL="0", SUMMARY_MODE="single",
+                           SUMMARY_CACHE_DIR=os.path.join(work_dir, "summaries"), SUMMARY_CACHE_MAX_BYTES="0",
+                           PDF_BLOB_STORE_DIR=os.path.join(work_dir, "blobs"), LOCAL_INDEX_DIR=os.path.join(work_dir, "index"),
+                           SUMMARY_JOBS_DB=os.path.join(work_dir, "jobs.sqlite3"), TRACE_LOG_PATH="",
+                           SHARED_STORE_PATH=os.path.join(work_dir, "store.sqlite3"), PDF_EXTRACT_WORKERS="1")
+                process, base_url = start_gunicorn(args.backend, workers, env)
+                try:
+                    result = asyncio.run(run_load(base_url, "/summarize", lambda i: {"pdf_url": f"{pdf_url}?n={workers}-{i}"},
+                                                  args.requests, args.concurrency))
+                finally:
+                    process.terminate()
+                    process.wait()
+            baseline = baseline or result["throughput_rps"]
+            speedup = round(result["throughput_rps"] / baseline, 2) if baseline else None
+            print(json.dumps({"backend": args.backend, "workers": workers, "cpus": os.cpu_count(), **result, "speedup": speedup}))
+    finally:
+        stubs.terminate()
+        stubs.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Load test comparing the Flask host (main.py) with the ASGI host
+(main_async.py) against local stub arXiv and PDF servers and the fake LLM
+provider, so no network access or API keys are needed.
+
+    python benchmarks/load_test.py [--concurrency 200] [--requests 400]
+
+Reports throughput, p50/p95/p99 latency, p50 time-to-first-byte and the server's
+peak RSS and thread count per backend and endpoint as JSON lines.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+
+BACKENDS = {
+    "flask": lambda port: [sys.executable, "-c", f"import main; main.app.run(port={port}, threaded=True)"],
+    "asgi": lambda port: [sys.executable, "-m", "uvicorn", "main_async:app", "--port", str(port), "--log-level", "warning", "--timeout-keep-alive", "30"],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def process_stats(pid: int) -> dict:
+    """
+    Returns peak RSS and current thread count of a process (Linux only).
+    """
+    stats = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    stats["server_peak_rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+                elif line.startswith("Threads:"):
+                    stats["server_threads"] = int(line.split()[1])
+    except OSError:
+        pass
+    return stats
+
+
+def start_backend(name: str, env: dict):
+    port = free_port()
+    process = subprocess.Popen(BACKENDS[name](port), cwd=REPO_ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(base_url + "/", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{name} backend did not start")
+
+
+async def run_load(base_url: str, path: str, make_body, total: int, concurrency: int):
+    latencies = []
+    ttfbs = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=300) as client:
+        async def one(index):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                first = None
+                try:
+                    async with client.stream("POST", path, json=make_body(index)) as response:
+                        async for chunk in response.aiter_bytes():
+                            if first is None and chunk:
+                                first = time.perf_counter() - start
+                        if response.status_code != 200:
+                            errors += 1
+                            return
+                except httpx.HTTPError:
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - start)
+                ttfbs.append(first or latencies[-1])
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_s": round(percentile(latencies, 0.50), 4),
+        "p95_s": round(percentile(latencies, 0.95), 4),
+        "p99_s": round(percentile(latencies, 0.99), 4),
+        "ttfb_p50_s": round(percentile(ttfbs, 0.50), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--llm-delay", type=float, default=0.02, help="Seconds between fake LLM chunks")
+    parser.add_argument("--llm-words", type=int, default=50)
+    parser.add_argument("--arxiv-delay", type=float, default=0.05)
+    parser.add_argument("--backends", default="flask,asgi")
+    args = parser.parse_args()
+
+    # The stubs get their own process so they do not compete with the load
+    # generator for the GIL.
+    stubs = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "stubs.py"), "--arxiv-delay", str(args.arxiv_delay)],
+                             stdout=subprocess.PIPE, text=True)
+    urls = json.loads(stubs.stdout.readline())
+    pdf_base_url, arxiv_url = urls["pdf_base_url"], urls["arxiv_url"]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        env = dict(os.environ,
+                   LLM_PROVIDER="fake", LLM_MODEL="stub",
+                   FAKE_LLM_DELAY=str(args.llm_delay), FAKE_LLM_WORDS=str(args.llm_words),
+                   ARXIV_API_URL=arxiv_url, ARXIV_MIN_INTERVAL="0", SUMMARY_MODE="single",
+                   SUMMARY_CACHE_DIR=os.path.join(work_dir, "summaries"), SUMMARY_CACHE_MAX_BYTES="0",
+                   PDF_BLOB_STORE_DIR=os.path.join(work_dir, "blobs"),
+                   LOCAL_INDEX_DIR=os.path.join(work_dir, "index"),
+                   SUMMARY_JOBS_DB=os.path.join(work_dir, "jobs.sqlite3"))
+
+        workloads = {
+            "/search": lambda i: {"query": f"load test {i % 20}"},
+            "/summarize": lambda i: {"pdf_url": f"{pdf_base_url}/short-4p.pdf?n={i}"},
+        }
+        for name in args.backends.split(","):
+            process, base_url = start_backend(name, env)
+            try:
+                for path, make_body in workloads.items():
+                    result = asyncio.run(run_load(base_url, path, make_body, args.requests, args.concurrency))
+                    print(json.dumps({"backend": name, "endpoint": path, **result, **process_stats(process.pid)}))
+            finally:
+                process.terminate()
+                process.wait()
+
+    stubs.terminate()
+    stubs.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Generates a deterministic corpus of text PDFs for the offline benchmarks.
+
+The PDFs are written by hand (one Helvetica text stream per page) so no PDF
+authoring library is needed; PyPDF2 extracts their text like any other PDF.
+"""
+import os
+import random
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples")
+
+# (name, pages) pairs for the default corpus.
+DEFAULT_CORPUS = [
+    ("short-4p", 4),
+    ("paper-12p", 12),
+    ("paper-30p", 30),
+    ("survey-120p", 120),
+]
+# (name, pages) pairs for the paper-shaped fixtures (see build_paper_lines).
+PAPER_CORPUS = [
+    ("structured-12p", 12),
+    ("structured-40p", 40),
+]
+
+_WORDS = (
+    "model language transformer attention layer token training data loss gradient "
+    "benchmark evaluation retrieval agent reasoning policy reward network sparse dense "
+    "embedding vector corpus inference latency throughput memory scaling parameter "
+    "result table figure section method baseline ablation dataset experiment analysis"
+).split()
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_lines(rng: random.Random, page_number: int, title: str, lines_per_page: int):
+    yield f"{title} - page {page_number}"
+    for _ in range(lines_per_page):
+        yield " ".join(rng.choice(_WORDS) for _ in range(12))
+    yield f"Preprint under review. {page_number}"
+
+
+def build_pdf(pages: int, title: str = "Sample Paper", seed: int = 0, lines_per_page: int = 45) -> bytes:
+    """
+    Builds a PDF with the given number of pages of pseudo-random English words.
+
+    Args:
+        pages (int): Number of pages.
+        title (str): Running header printed at the top of every page.
+        seed (int): Seed for the word generator, so output is reproducible.
+        lines_per_page (int): Body lines per page.
+
+    Returns:
+        bytes: The PDF file contents.
+    """
+    rng = random.Random(seed)
+    return render_pdf([list(_page_lines(rng, page_number, title, lines_per_page)) for page_number in range(1, pages + 1)])
+
+
+def _sentence(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def build_paper_lines(pages: int, title: str = "Structured Paper", seed: int = 0, lines_per_page: int = 45):
+    """
+    Returns the lines of each page of a paper-shaped document: title block,
+    abstract, numbered sections with hyphenated line breaks and numeric
+    tables, a conclusion, references taking the last fifth of the pages, and
+    a running header and footer with page numbers.
+    """
+    rng = random.Random(seed)
+    reference_pages = max(1, pages // 5)
+    body_pages = pages - reference_pages
+    sections = ["Introduction", "Related Work", "Method", "Experiments", "Results", "Discussion", "Conclusion"]
+    # Body lines are spread evenly over the sections.
+    body = [title, "Author One, Author Two", "Abstract"]
+    body += [_sentence(rng) for _ in range(8)]
+    per_section = max(4, (body_pages * lines_per_page - len(body)) // len(sections) - 1)
+    for number, heading in enumerate(sections, start=1):
+        body.append(f"{number} {heading}")
+        for i in range(per_section):
+            if heading in ("Experiments", "Results") and i % 20 < 8:
+                body.append(" ".join(f"{rng.random() * 100:.2f}" for _ in range(7)))
+            elif i % 9 == 4:
+                body.append(_sentence(rng, 10) + " repre-")
+                body.append("sentation " + _sentence(rng, 10))
+            else:
+                body.append(_sentence(rng))
+    references = ["References"] + [
+        f"[{i}] Author {i}, Author {i + 1}. {_sentence(rng, 6).title()}. In Proceedings, 20{i % 25:02d}."
+        for i in range(1, reference_pages * lines_per_page)
+    ]
+
+    lines = body[:body_pages * lines_per_page] + references
+    page_lines = []
+    for page_number in range(1, pages + 1):
+        start = (page_number - 1) * lines_per_page
+        page_lines.append([f"{title} - Preprint"] + lines[start:start + lines_per_page] + [f"Page {page_number} of {pages}"])
+    return page_lines
+
+
+def render_pdf(page_lines) -> bytes:
+    """
+    Builds a PDF with one page per list of text lines.
+    """
+    objects = []  # object bodies, object number = index + 1
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(b"")  # filled in once the page tree exists
+    pages_id = add(b"")
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for lines in page_lines:
+        parts = ["BT /F1 9 Tf 11 TL 50 770 Td"]
+        for line in lines:
+            parts.append(f"({_escape(line)}) Tj T*")
+        parts.append("ET")
+        stream = "\n".join(parts).encode("latin-1")
+        content_id = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font_id, content_id)
+        ))
+
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref_offset)
+    return bytes(out)
+
+
+def ensure_paper_samples(samples_dir: str = SAMPLES_DIR, corpus=PAPER_CORPUS):
+    """
+    Writes the paper-shaped fixtures to samples_dir if they are not there yet
+    and returns the list of PDF paths.
+    """
+    os.makedirs(samples_dir, exist_ok=True)
+    paths = []
+    for seed, (name, pages) in enumerate(corpus):
+        path = os.path.join(samples_dir, f"{name}.pdf")
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(render_pdf(build_paper_lines(pages, title=name.replace("-", " ").title(), seed=seed)))
+        paths.append(path)
+    return paths
+
+
+def ensure_samples(samples_dir: str = SAMPLES_DIR, corpus=DEFAULT_CORPUS):
+    """
+    Writes the sample corpus to samples_dir if it is not there yet and returns
+    the list of PDF paths.
+    """
+    os.makedirs(samples_dir, exist_ok=True)
+    paths = []
+    for seed, (name, pages) in enumerate(corpus):
+        path = os.path.join(samples_dir, f"{name}.pdf")
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(build_pdf(pages, title=name, seed=seed))
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    for path in ensure_samples():
+        print(f"{path} ({os.path.getsize(path)} bytes)")
@@ -0,0 +1,247 @@
+"""
+Local stand-ins for the upstream services used by the benchmarks: an arXiv
+Atom API, a static PDF server and an OpenAI-compatible chat completions API
+with a configurable time to first token and token rate. Each runs a
+ThreadingHTTPServer on a free port in a daemon thread.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+from sample_pdfs import SAMPLES_DIR, ensure_samples
+
+_WORDS = "neural sparse attention retrieval agent scaling benchmark language graph diffusion".split()
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections under load tests.
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def _serve(handler_class):
+    server = StubHTTPServer(("127.0.0.1", 0), handler_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def build_atom_feed(query: str, start: int, max_results: int, pdf_base_url: str, pdf_names, total_results: int = 1000) -> bytes:
+    """
+    Builds an arXiv-style Atom feed page of synthetic entries for a query.
+    """
+    entries = []
+    for index in range(start, min(start + max_results, total_results)):
+        seed = int(hashlib.md5(f"{query}:{index}".encode()).hexdigest()[:8], 16)
+        words = " ".join(_WORDS[(seed >> shift) % len(_WORDS)] for shift in range(0, 24, 3))
+        arxiv_id = f"2401.{seed % 100000:05d}"
+        pdf_name = pdf_names[index % len(pdf_names)]
+        entries.append(f"""
+  <entry>
+    <id>http://arxiv.org/abs/{arxiv_id}v1</id>
+    <updated>2024-01-{index % 28 + 1:02d}T00:00:00Z</updated>
+    <published>2024-01-{index % 28 + 1:02d}T00:00:00Z</published>
+    <title>{escape(query.title())}: {escape(words)}</title>
+    <summary>We study {escape(query)} with {escape(words)}. Result {index}.</summary>
+    <author><name>Author {seed % 97}</name></author>
+    <author><name>Author {seed % 89}</name></author>
+    <arxiv:doi>10.0000/stub.{index}</arxiv:doi>
+    <link href="http://arxiv.org/abs/{arxiv_id}v1" rel="alternate" type="text/html"/>
+    <link title="pdf" href="{pdf_base_url}/{pdf_name}?id={arxiv_id}" rel="related" type="application/pdf"/>
+    <arxiv:primary_category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cs.CL" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>""")
+    feed = f"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/" xmlns:arxiv="http://arxiv.org/schemas/atom">
+  <title type="html">ArXiv Query: search_query=all:{escape(query)}</title>
+  <opensearch:totalResults>{total_results}</opensearch:totalResults>
+  <opensearch:startIndex>{start}</opensearch:startIndex>
+  <opensearch:itemsPerPage>{max_results}</opensearch:itemsPerPage>{''.join(entries)}
+</feed>
+"""
+    return feed.encode("utf-8")
+
+
+def start_arxiv_stub(pdf_base_url: str, pdf_names=None, delay: float = 0.0, total_results: int = 1000):
+    """
+    Starts a fake arXiv API. Returns (server, api_url); point ARXIV_API_URL at
+    api_url. Every request sleeps for delay seconds to mimic upstream latency.
+    """
+    pdf_names = pdf_names or [os.path.basename(path) for path in ensure_samples()]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+        requests_served = 0
+
+        def do_GET(self):
+            Handler.requests_served += 1
+            params = parse_qs(urlparse(self.path).query)
+            query = params.get("search_query", ["all:"])[0].split(":", 1)[-1]
+            start = int(params.get("start", ["0"])[0])
+            max_results = int(params.get("max_results", ["10"])[0])
+            if delay:
+                time.sleep(delay)
+            body = build_atom_feed(query, start, max_results, pdf_base_url, pdf_names, total_results)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/atom+xml")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server, base_url = _serve(Handler)
+    server.handler_class = Handler
+    return server, f"{base_url}/api/query"
+
+
+def start_pdf_stub(samples_dir: str = SAMPLES_DIR, delay: float = 0.0):
+    """
+    Starts a static PDF server over samples_dir with ETag/Last-Modified and
+    If-None-Match support. Returns (server, base_url).
+    """
+    ensure_samples(samples_dir)
+    last_modified = formatdate(0, usegmt=True)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            name = os.path.basename(urlparse(self.path).path)
+            path = os.path.join(samples_dir, name)
+            if not os.path.isfile(path):
+                self.send_error(404)
+                return
+            stat = os.stat(path)
+            etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+            if delay:
+                time.sleep(delay)
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(stat.st_size))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.end_headers()
+            with open(path, "rb") as f:
+                while True:
+                    chunk = f.read(64 * 1024)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+
+        def log_message(self, *args):
+            pass
+
+    return _serve(Handler)
+
+
+def start_openai_stub(delay: float = 0.0, words: int = 50, first_token_delay: float = 0.0, error_rate: float = 0.0):
+    """
+    Starts a fake OpenAI chat completions API that streams the fake provider's
+    deterministic output as server-sent events over keep-alive connections.
+    An error_rate share of requests get a 429 rate-limit response instead.
+    Returns (server, base_url); point OPENAI_BASE_URL at base_url. The
+    server's handler_class counts requests, rate-limited requests and new
+    connections.
+    """
+    rng = random.Random(0)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+        requests_served = 0
+        rate_limited = 0
+        connections = 0
+
+        def setup(self):
+            super().setup()
+            Handler.connections += 1
+
+        def do_POST(self):
+            Handler.requests_served += 1
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", "0"))) or b"{}")
+            prompt = "".join(message.get("content", "") for message in body.get("messages", []))
+            prompt_body = prompt.split("\n\n", 1)[-1]
+            chunks = [f"[fake summary of {len(prompt)} chars]"] + [f" {word}" for word in prompt_body.split()[:words]]
+            if error_rate and rng.random() < error_rate:
+                Handler.rate_limited += 1
+                error = json.dumps({"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}).encode()
+                self.send_response(429)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(error)))
+                self.end_headers()
+                self.wfile.write(error)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            if first_token_delay:
+                time.sleep(first_token_delay)
+            for i, chunk in enumerate(chunks):
+                if delay and i:
+                    time.sleep(delay)
+                event = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0, "model": body.get("model"),
+                         "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}]}
+                self._write_event(json.dumps(event))
+            self._write_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _write_event(self, data: str):
+            payload = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+            self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    server, base_url = _serve(Handler)
+    server.handler_class = Handler
+    return server, f"{base_url}/v1"
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the stub arXiv and PDF servers until interrupted.")
+    parser.add_argument("--arxiv-delay", type=float, default=0.0)
+    parser.add_argument("--pdf-delay", type=float, default=0.0)
+    parser.add_argument("--total-results", type=int, default=1000, help="Results the arXiv stub reports per query")
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="Seconds between streamed chat completion chunks")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0.0, help="Chunk rate; overrides --llm-delay")
+    parser.add_argument("--llm-ttft", type=float, default=0.0, help="Seconds before the first chat completion chunk")
+    parser.add_argument("--llm-words", type=int, default=50, help="Prompt words echoed per completion")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Share of chat completions answered with a 429")
+    args = parser.parse_args()
+
+    llm_delay = 1 / args.llm_tokens_per_second if args.llm_tokens_per_second else args.llm_delay
+    pdf_server, pdf_base_url = start_pdf_stub(delay=args.pdf_delay)
+    arxiv_server, arxiv_url = start_arxiv_stub(pdf_base_url, delay=args.arxiv_delay, total_results=args.total_results)
+    openai_server, openai_base_url = start_openai_stub(delay=llm_delay, words=args.llm_words, first_token_delay=args.llm_ttft,
+                                                        error_rate=args.llm_error_rate)
+    print(json.dumps({"pdf_base_url": pdf_base_url, "arxiv_url": arxiv_url, "openai_base_url": openai_base_url}), flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Multi-process (pre-fork) deployment of the agent host.
+
+    gunicorn -c gunicorn.conf.py main:app
+    gunicorn -c gunicorn.conf.py -k uvicorn_worker.UvicornWorker main_async:app
+
+(the ASGI worker class is in the uvicorn-worker package.)
+
+The master forks WEB_CONCURRENCY workers (default: one per CPU). Each worker
+imports the app after the fork, so thread pools, SQLite connections and HTTP
+sessions are never shared across processes. The workers share their caches,
+in-flight deduplication and rate limits through the SQLite store at
+SHARED_STORE_PATH (see kairos-take-home-0/shared_store.py). The LLM
+concurrency limits are split evenly between the workers, each worker writes
+its own trace log, and GET /metrics reports the worker that served it.
+
+Send SIGHUP to the master for a graceful reload: new workers are started with
+the new code, and old ones finish their in-flight requests (up to
+graceful_timeout seconds) before exiting.
+"""
+import multiprocessing
+import os
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kairos-take-home-0")
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Summaries stream for as long as the LLM takes, so each Flask worker serves
+# requests from a thread pool; the ASGI worker class ignores this.
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "32"))
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "60"))
+keepalive = 30
+preload_app = False
+
+# The workers inherit the environment of the master, so setting the path here
+# turns on the shared store in every worker.
+os.environ.setdefault("SHARED_STORE_PATH", os.path.join(BACKEND_DIR, ".shared", "store.sqlite3"))
+# Each worker keeps its own adaptive LLM concurrency limits, with a
+# 1/workers share of LLM_CONCURRENCY_INITIAL and LLM_CONCURRENCY_MAX.
+os.environ.setdefault("LLM_CONCURRENCY_PROCESSES", str(workers))
+# One trace log per worker, so rotation never races another process.
+os.environ.setdefault("TRACE_LOG_PATH", os.path.join(BACKEND_DIR, ".traces", "traces-{pid}.ndjson"))
+
+
+def on_starting(server):
+    server.log.info("Shared store: %s", os.environ["SHARED_STORE_PATH"])
+
+
+def post_worker_init(worker):
+    # Each worker imports the app after the fork (preload_app is off), and
+    # main.py leaves the batch job workers to whichever process serves
+    # requests: start this worker's here. Jobs left running by a worker that
+    # died are queued again. main_async starts them from its lifespan
+    # handler instead.
+    if worker.cfg.worker_class_str.startswith("uvicorn"):
+        return
+    from summary_pipeline import job_queue
+
+    job_queue.start()
@@ -0,0 +1,153 @@
+import asyncio
+import contextvars
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from llm_routing import llm_targets
+from pdf_summarize_server import (
+    DOWNLOAD_CHUNK_SIZE,
+    PDF_CONNECT_TIMEOUT,
+    PDF_DOWNLOAD_TIMEOUT,
+    PDF_MAX_BYTES,
+    PDF_SPOOL_MAX_MEMORY,
+    DownloadLimitError,
+    PDFDownload,
+    blob_store,
+    llm_router,
+)
+
+# Threads that drain blocking generators (chunked summaries, SDKs without an
+# async client) for the event loop.
+_bridge_executor = ThreadPoolExecutor(max_workers=int(os.getenv("ASYNC_BRIDGE_THREADS", "64")))
+
+
+def make_http_client() -> httpx.AsyncClient:
+    """
+    Builds the shared keep-alive client used for PDF requests.
+    """
+    limits = httpx.Limits(max_connections=int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "200")),
+                          max_keepalive_connections=int(os.getenv("ASYNC_HTTP_MAX_KEEPALIVE", "50")))
+    timeout = httpx.Timeout(PDF_DOWNLOAD_TIMEOUT, connect=PDF_CONNECT_TIMEOUT)
+    return httpx.AsyncClient(limits=limits, timeout=timeout, follow_redirects=True)
+
+
+async def download_pdf_async(client: httpx.AsyncClient, pdf_url: str, max_bytes: int = None, timeout: float = None):
+    """
+    Async version of download_pdf with the same limits, spooling and blob
+    store revalidation. Returns a PDFDownload or None.
+    """
+    max_bytes = PDF_MAX_BYTES if max_bytes is None else max_bytes
+    timeout = PDF_DOWNLOAD_TIMEOUT if timeout is None else timeout
+    stored = await asyncio.to_thread(blob_store.lookup, pdf_url)
+
+    try:
+        # httpx only bounds each read, so the total limit is a timeout around
+        # the whole request; it also fires while waiting for data.
+        return await asyncio.wait_for(_fetch_pdf_async(client, pdf_url, max_bytes, stored), timeout)
+    except asyncio.TimeoutError:
+        print(f"Error downloading PDF from {pdf_url}: PDF download exceeded {timeout}s")
+        return None
+    except (httpx.HTTPError, DownloadLimitError) as e:
+        print(f"Error downloading PDF from {pdf_url}: {e}")
+        return None
+
+
+async def _fetch_pdf_async(client: httpx.AsyncClient, pdf_url: str, max_bytes: int, stored):
+    async with client.stream("GET", pdf_url, headers=blob_store.conditional_headers(stored)) as response:
+        if response.status_code == 304 and stored:
+            fileobj = await asyncio.to_thread(blob_store.open, stored)
+            return PDFDownload(fileobj, stored["size"], stored["sha256"], path=stored["path"], not_modified=True)
+        response.raise_for_status()
+
+        content_length = response.headers.get("Content-Length")
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise DownloadLimitError(f"PDF is {content_length} bytes, over the {max_bytes} byte limit")
+
+        spool = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_MEMORY)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise DownloadLimitError(f"PDF exceeds the {max_bytes} byte limit")
+                digest.update(chunk)
+                spool.write(chunk)
+            spool.seek(0)
+        except BaseException:
+            spool.close()
+            raise
+
+        sha256 = digest.hexdigest()
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            try:
+                path = await asyncio.to_thread(blob_store.put, pdf_url, spool, sha256, size, etag, last_modified)
+                spool.close()
+                return PDFDownload(open(path, "rb"), size, sha256, path=path)
+            except OSError as e:
+                print(f"Error storing PDF from {pdf_url} in blob store: {e}")
+        return PDFDownload(spool, size, sha256)
+
+
+async def iterate_in_thread(make_iterator):
+    """
+    Drains a blocking iterator on a bridge thread and yields its items on the
+    event loop. If the consumer stops early (e.g. the client disconnected),
+    the producer stops pulling from the iterator at the next item. The
+    iterator runs in a copy of the caller's context, so its spans join the
+    caller's trace.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def put(kind, value):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (kind, value))
+        except RuntimeError:
+            cancelled.set()  # the event loop is gone
+
+    def produce():
+        iterator = make_iterator()
+        try:
+            for item in iterator:
+                if cancelled.is_set():
+                    break
+                put("item", item)
+            put("done", None)
+        except BaseException as e:
+            put("error", e)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+
+    loop.run_in_executor(_bridge_executor, contextvars.copy_context().run, produce)
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == "item":
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                return
+    finally:
+        cancelled.set()
+
+
+async def astream_llm(prompt: str):
+    """
+    Async version of stream_llm. Providers with a native async client are
+    streamed on the event loop; others are bridged from the blocking client.
+    Raises LLMError on configuration or provider errors.
+    """
+    async for chunk in llm_router.astream(prompt, llm_targets(), iterate_in_thread):
+        yield chunk
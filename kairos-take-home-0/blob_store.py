@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+
+class BlobStore:
+    """
+    Content-addressed on-disk store for downloaded PDFs.
+
+    Blobs are stored once per SHA-256. Each source URL maps to the blob it last
+    resolved to plus the ETag/Last-Modified validators the server sent, so a
+    later download can be a conditional request.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 2 * 1024 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(root, "urls"), exist_ok=True)
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "blobs", sha256[:2], f"{sha256}.pdf")
+
+    def _url_path(self, url: str) -> str:
+        return os.path.join(self.root, "urls", f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json")
+
+    def lookup(self, url: str):
+        """
+        Returns the stored metadata for url ({sha256, size, etag,
+        last_modified, path}) if its blob is still on disk, otherwise None.
+        """
+        try:
+            with open(self._url_path(url), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        path = self._blob_path(meta["sha256"])
+        if not os.path.exists(path):
+            return None
+        meta["path"] = path
+        return meta
+
+    def conditional_headers(self, meta) -> dict:
+        """
+        Returns If-None-Match / If-Modified-Since headers for a lookup() result.
+        """
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def open(self, meta):
+        """
+        Opens a stored blob for reading and marks it as recently used.
+        """
+        path = meta["path"]
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return open(path, "rb")
+
+    def put(self, url: str, fileobj, sha256: str, size: int, etag: str = None, last_modified: str = None) -> str:
+        """
+        Copies fileobj into the store (if that blob is not already present),
+        records the validators for url and returns the blob path.
+        """
+        path = self._blob_path(sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            fileobj.seek(0)
+            with open(tmp_path, "wb") as out:
+                shutil.copyfileobj(fileobj, out, 1024 * 1024)
+            os.replace(tmp_path, path)
+            fileobj.seek(0)
+
+        meta = {"url": url, "sha256": sha256, "size": size, "etag": etag,
+                "last_modified": last_modified, "stored": time.time()}
+        url_path = self._url_path(url)
+        tmp_path = f"{url_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, url_path)
+        self._evict()
+        return path
+
+    def _evict(self):
+        with self._lock:
+            blobs = []
+            total = 0
+            for dirpath, _, filenames in os.walk(os.path.join(self.root, "blobs")):
+                for name in filenames:
+                    if not name.endswith(".pdf"):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    blobs.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+            # URL entries pointing at an evicted blob are ignored by lookup().
+            for _, size, path in sorted(blobs):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
@@ -0,0 +1,227 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from pdf_summarize_server import LLMError, SUMMARY_PROMPT, stream_llm
+
+CHUNK_PROMPT = (
+    "The following is section {index} of a longer document. "
+    "Summarize the key points of this section:\n\n{text}"
+)
+REDUCE_PROMPT = (
+    "The following are summaries of consecutive sections of one document. "
+    "Combine them into a single coherent summary of the whole document:\n\n{text}"
+)
+
+DEFAULT_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "8000"))
+DEFAULT_MAX_WORKERS = int(os.getenv("SUMMARY_MAX_WORKERS", "4"))
+# Documents estimated above this size are chunked when mode is "auto".
+DEFAULT_MAX_INPUT_TOKENS = int(os.getenv("SUMMARY_MAX_INPUT_TOKENS", "100000"))
+
+SUMMARY_MODES = ("single", "chunked", "auto")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token estimate (about four characters per token for English text).
+    """
+    return (len(text) + 3) // 4
+
+
+def _split_units(text: str):
+    # Prefer page breaks, then paragraphs, then lines as split points.
+    for separator in ("\f", "\n\n", "\n"):
+        if separator in text:
+            return [unit for unit in text.split(separator) if unit.strip()], separator
+    return [text], ""
+
+
+def split_text(text: str, max_tokens: int = DEFAULT_CHUNK_TOKENS):
+    """
+    Splits text into chunks of at most max_tokens (estimated), breaking on
+    page, paragraph or line boundaries where possible.
+
+    Args:
+        text (str): The text to split.
+        max_tokens (int): The token budget for each chunk.
+
+    Returns:
+        list: The chunks, in document order.
+    """
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return [text] if text.strip() else []
+
+    units, separator = _split_units(text)
+    chunks = []
+    current = []
+    current_len = 0
+    for unit in units:
+        if len(unit) > max_chars:
+            if current:
+                chunks.append(separator.join(current))
+                current, current_len = [], 0
+            if separator:
+                chunks.extend(split_text(unit, max_tokens))
+            else:
+                chunks.extend(unit[i:i + max_chars] for i in range(0, len(unit), max_chars))
+            continue
+        if current and current_len + len(separator) + len(unit) > max_chars:
+            chunks.append(separator.join(current))
+            current, current_len = [], 0
+        current.append(unit)
+        current_len += len(unit) + (len(separator) if current_len else 0)
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def chunk_pages(pages, max_tokens: int = DEFAULT_CHUNK_TOKENS):
+    """
+    Packs an iterable of page texts into chunks of at most max_tokens
+    (estimated), yielding each chunk as soon as it is full. Works with a page
+    generator so chunks can be summarized while later pages are still parsed.
+    """
+    max_chars = max_tokens * 4
+    current = []
+    current_len = 0
+    for page in pages:
+        if not page.strip():
+            continue
+        if len(page) > max_chars:
+            if current:
+                yield "\n".join(current)
+                current, current_len = [], 0
+            yield from split_text(page, max_tokens)
+            continue
+        if current and current_len + 1 + len(page) > max_chars:
+            yield "\n".join(current)
+            current, current_len = [], 0
+        current.append(page)
+        current_len += len(page) + (1 if current_len else 0)
+    if current:
+        yield "\n".join(current)
+
+
+def _complete(llm, prompt: str) -> str:
+    return "".join(llm(prompt))
+
+
+def _section(index: int, summary: str) -> str:
+    return f"## Section {index + 1}\n\n{summary.strip()}\n\n"
+
+
+def summarize_chunked(text, llm=stream_llm, max_chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+                      max_workers: int = DEFAULT_MAX_WORKERS, incremental: bool = False):
+    """
+    Map-reduce summarization: summarizes chunks of the text concurrently, then
+    streams a final pass that combines the chunk summaries.
+
+    Args:
+        text: The text to summarize, or an iterable of page texts (e.g. from
+            pdf_extraction.iter_page_texts) so chunks are submitted as pages arrive.
+        llm (callable): Takes a prompt and yields completion chunks; defaults to
+            the configured provider. Raises LLMError on failure.
+        max_chunk_tokens (int): Token budget for each map prompt.
+        max_workers (int): Maximum number of concurrent LLM calls.
+        incremental (bool): If True, each section summary is streamed as soon
+            as it finishes, before the combined summary.
+    """
+    if isinstance(text, str):
+        chunks = iter(split_text(text, max_chunk_tokens))
+    else:
+        chunks = chunk_pages(text, max_chunk_tokens)
+
+    first_chunk = next(chunks, None)
+    if first_chunk is None:
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        summaries = []
+        pending_first = first_chunk
+        try:
+            for i, chunk in enumerate(chunks, start=1):
+                # The first chunk is held back until we know the document has
+                # more than one, so short documents take the single-prompt path.
+                if pending_first is not None:
+                    futures[executor.submit(_complete, llm, CHUNK_PROMPT.format(index=1, text=pending_first))] = 0
+                    summaries.append(None)
+                    pending_first = None
+                futures[executor.submit(_complete, llm, CHUNK_PROMPT.format(index=i + 1, text=chunk))] = i
+                summaries.append(None)
+                if incremental:
+                    for future in [f for f in futures if f.done() and summaries[futures[f]] is None]:
+                        summaries[futures[future]] = future.result()
+                        yield _section(futures[future], summaries[futures[future]])
+
+            if pending_first is not None:
+                yield from llm(SUMMARY_PROMPT.format(text=pending_first))
+                return
+
+            for future in as_completed(futures):
+                index = futures[future]
+                if summaries[index] is not None:
+                    continue
+                summaries[index] = future.result()
+                if incremental:
+                    yield _section(index, summaries[index])
+        finally:
+            for future in futures:
+                future.cancel()
+
+        # Section summaries can themselves exceed the budget on very long
+        # documents; fold them until they fit into one reduce prompt.
+        combined = "\n\n".join(summaries)
+        while estimate_tokens(combined) > max_chunk_tokens:
+            groups = split_text(combined, max_chunk_tokens)
+            if len(groups) <= 1:
+                break
+            futures = {executor.submit(_complete, llm, REDUCE_PROMPT.format(text=group)): i for i, group in enumerate(groups)}
+            folded = [None] * len(groups)
+            for future in as_completed(futures):
+                folded[futures[future]] = future.result()
+            combined = "\n\n".join(folded)
+
+    if incremental:
+        yield "## Overall summary\n\n"
+    yield from llm(REDUCE_PROMPT.format(text=combined))
+
+
+def summarize_text(text: str, mode: str = "auto", incremental: bool = False, llm=stream_llm, stats: dict = None,
+                   max_input_tokens: int = None):
+    """
+    Summarizes text with a single prompt or with map-reduce chunking, streaming
+    the response. Errors are yielded as text like summarize_text_with_llm,
+    possibly after part of the summary, and recorded as stats["error"].
+
+    Args:
+        text: The text to summarize. In "chunked" mode this may also be an
+            iterable of page texts.
+        mode (str): "single", "chunked", or "auto" (chunk only when the text is
+            estimated to exceed max_input_tokens).
+        incremental (bool): Stream section summaries as they finish (chunked only).
+        llm (callable): Prompt-to-stream function, for tests and benchmarks.
+        stats (dict): If given, gets "error" set to the error message when
+            the summary ends in an error.
+        max_input_tokens (int): The largest text "auto" mode sends as a single
+            prompt; SUMMARY_MAX_INPUT_TOKENS by default.
+    """
+    if stats is None:
+        stats = {}
+    if mode not in SUMMARY_MODES:
+        stats["error"] = f"Error: unsupported summary mode '{mode}'. Use one of: {', '.join(SUMMARY_MODES)}."
+        yield stats["error"]
+        return
+    if not isinstance(text, str) and mode != "chunked":
+        text = "".join(text)
+    if max_input_tokens is None:
+        max_input_tokens = DEFAULT_MAX_INPUT_TOKENS
+    use_chunks = mode == "chunked" or (mode == "auto" and estimate_tokens(text) > max_input_tokens)
+    try:
+        if use_chunks:
+            yield from summarize_chunked(text, llm=llm, incremental=incremental)
+        else:
+            yield from llm(SUMMARY_PROMPT.format(text=text))
+    except LLMError as e:
+        stats["error"] = str(e)
+        yield str(e)
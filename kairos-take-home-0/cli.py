@@ -2,118 +2,241 @@ import requests
 import time
 import sys
 import os
+import threading
 
 
-BACKEND_URL = "http://127.0.0.1:5000"
+BASE_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:5000")
+# Commands run at once in batch mode.
+CLI_BATCH_CONCURRENCY = int(os.getenv("CLI_BATCH_CONCURRENCY", "4"))
 
-BASE_URL = "http://localhost:5000"
+_session = None
+_session_lock = threading.Lock()
 
-def search_papers(query):
+
+def get_session() -> requests.Session:
+    """
+    Returns the keep-alive session every command goes through, so a run of
+    commands reuses its connections to the backend instead of reconnecting.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(CLI_BATCH_CONCURRENCY, 1))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+def search_papers(query, out=None):
+    """
+    Prints the papers the backend finds for query to out (stdout by
+    default). Returns the papers, or None if the request failed.
+    """
+    out = out or sys.stdout
     url = f"{BASE_URL}/search"
     start_time = time.time()
-    print(f"Tool Call: search_papers_api(query='{query}')")
+    print(f"Tool Call: search_papers_api(query='{query}')", file=out)
     try:
-        response = requests.post(url, json={"query": query})
+        response = get_session().post(url, json={"query": query})
         response.raise_for_status()  # Raise an exception for HTTP errors
         papers = response.json()
         end_time = time.time()
         latency = end_time - start_time
-        print(f"Tool Outcome: search_papers_api - Success (Latency: {latency:.2f}s)")
+        print(f"Tool Outcome: search_papers_api - Success (Latency: {latency:.2f}s)", file=out)
         if papers:
-            print("Found Papers:")
+            print("Found Papers:", file=out)
             for i, paper in enumerate(papers):
-                print(f"\n--- Paper {i+1} ---")
-                print(f"Title: {paper.get('title', 'N/A')}")
-                print(f"Authors: {paper.get('authors', 'N/A')}")
-                print(f"Summary: {paper.get('summary', 'N/A')}")
+                print(f"\n--- Paper {i+1} ---", file=out)
+                print(f"Title: {paper.get('title', 'N/A')}", file=out)
+                print(f"Authors: {paper.get('authors', 'N/A')}", file=out)
+                print(f"Summary: {paper.get('summary', 'N/A')}", file=out)
                 if paper.get('pdf_url'):
-                    print(f"PDF URL: {paper['pdf_url']}")
+                    print(f"PDF URL: {paper['pdf_url']}", file=out)
         else:
-            print("No papers found for your query.")
+            print("No papers found for your query.", file=out)
+        return papers
     except requests.exceptions.RequestException as e:
         end_time = time.time()
         latency = end_time - start_time
-        print(f"Tool Outcome: search_papers_api - Failed (Error: {e}, Latency: {latency:.2f}s)")
-        print(f"Error connecting to backend: {e}")
+        print(f"Tool Outcome: search_papers_api - Failed (Error: {e}, Latency: {latency:.2f}s)", file=out)
+        print(f"Error connecting to backend: {e}", file=out)
     except ValueError:
         end_time = time.time()
         latency = end_time - start_time
-        print(f"Tool Outcome: search_papers_api - Failed (Error: Could not decode JSON response, Latency: {latency:.2f}s)")
-        print("Error: Could not decode JSON response from backend.")
+        print(f"Tool Outcome: search_papers_api - Failed (Error: Could not decode JSON response, Latency: {latency:.2f}s)", file=out)
+        print("Error: Could not decode JSON response from backend.", file=out)
+    return None
 
-def summarize_pdf(pdf_url):
+def summarize_pdf(pdf_url, out=None):
+    """
+    Streams the backend's summary of the PDF to out (stdout by default) as
+    it is generated. Returns the summary, or None if the request failed.
+    """
+    out = out or sys.stdout
     url = f"{BASE_URL}/summarize"
     start_time = time.time()
-    print(f"Tool Call: summarize_pdf_api(pdf_url='{pdf_url}')")
+    print(f"Tool Call: summarize_pdf_api(pdf_url='{pdf_url}')", file=out)
     try:
-        response = requests.post(url, json={"pdf_url": pdf_url})
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        summary_data = response.json()
-        end_time = time.time()
-        latency = end_time - start_time
-        print(f"Tool Outcome: summarize_pdf_api - Success (Latency: {latency:.2f}s)")
-        print(f"Summary:\n{summary_data.get('summary', 'N/A')}")
+        with get_session().post(url, json={"pdf_url": pdf_url}, stream=True) as response:
+            response.raise_for_status()  # Raise an exception for HTTP errors
+            response.encoding = "utf-8"  # the summary stream carries no charset
+
+            full_summary = ""
+            print("\n--- Summary ---", file=out)
+            for chunk in response.iter_content(chunk_size=8192, decode_unicode=True):
+                if chunk:
+                    full_summary += chunk
+                    print(chunk, end='', flush=True, file=out)
+            print("\n-----------------", file=out)
+
+        latency = time.time() - start_time
+        print(f"Tool Outcome: summarize_pdf_api - Success (Latency: {latency:.2f}s)", file=out)
+        return full_summary
     except requests.exceptions.RequestException as e:
-        end_time = time.time()
-        latency = end_time - start_time
-        print(f"Tool Outcome: summarize_pdf_api - Failed (Error: {e}, Latency: {latency:.2f}s)")
-        print(f"Error connecting to backend: {e}")
-    except ValueError:
-        end_time = time.time()
-        latency = end_time - start_time
-        print(f"Tool Outcome: summarize_pdf_api - Failed (Error: Could not decode JSON response, Latency: {latency:.2f}s)")
-        print("Error: Could not decode JSON response from backend.")
+        latency = time.time() - start_time
+        print(f"Tool Outcome: summarize_pdf_api - Failed (Error: {e}, Latency: {latency:.2f}s)", file=out)
+        print(f"Error connecting to backend: {e}", file=out)
+    except Exception as e:
+        latency = time.time() - start_time
+        print(f"Tool Outcome: summarize_pdf_api - Failed (Error: {e}, Latency: {latency:.2f}s)", file=out)
+        print(f"An unexpected error occurred: {e}", file=out)
+    return None
+
+def harvest_papers(query, max_results=None, start=0, sort_by="submittedDate", output=None):
+    """
+    Streams the backend's /harvest NDJSON to output (a file path, or stdout)
+    one record per line. Progress goes to stderr so stdout can be piped.
+    """
+    url = f"{BASE_URL}/harvest"
+    payload = {"query": query, "max_results": max_results, "start": start, "sort_by": sort_by}
+    start_time = time.time()
+    print(f"Tool Call: harvest_papers_api(query='{query}', max_results={max_results})", file=sys.stderr)
+    out = open(output, "w", encoding="utf-8") if output else sys.stdout
+    count = 0
+    try:
+        with get_session().post(url, json=payload, stream=True) as response:
+            response.raise_for_status()
+            response.encoding = "utf-8"  # NDJSON responses carry no charset
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                if line.startswith('{"error"'):
+                    print(f"Harvest stopped early: {line}", file=sys.stderr)
+                    break
+                out.write(line + "\n")
+                count += 1
+                if count % 1000 == 0:
+                    print(f"  {count} records...", file=sys.stderr)
+        latency = time.time() - start_time
+        print(f"Tool Outcome: harvest_papers_api - Success ({count} records, Latency: {latency:.2f}s)", file=sys.stderr)
+    except requests.exceptions.RequestException as e:
+        latency = time.time() - start_time
+        print(f"Tool Outcome: harvest_papers_api - Failed (Error: {e}, {count} records, Latency: {latency:.2f}s)", file=sys.stderr)
+        print(f"Error connecting to backend: {e}", file=sys.stderr)
+    finally:
+        if output:
+            out.close()
+    return count
+
+def run_command(user_input, out=None):
+    """
+    Runs one 'search <query>', 'summarize <PDF_URL>' or 'harvest <query>'
+    command, printing to out (stdout by default). Returns False if the
+    command was invalid or failed.
+    """
+    out = out or sys.stdout
+    if user_input.lower().startswith('search '):
+        query = user_input[len('search '):].strip()
+        if query:
+            return search_papers(query, out) is not None
+        print("Please provide a search query. Example: search LLMs", file=out)
+    elif user_input.lower().startswith('harvest '):
+        query = user_input[len('harvest '):].strip()
+        if query:
+            output = f"harvest-{int(time.time() * 1000)}.ndjson"
+            count = harvest_papers(query, max_results=1000, output=output)
+            print(f"Wrote {count} records to {output} (use 'python cli.py harvest' for larger sweeps).", file=out)
+            return True
+        print("Please provide a search query. Example: harvest LLMs", file=out)
+    elif user_input.lower().startswith('summarize '):
+        pdf_url = user_input[len('summarize '):].strip()
+        if pdf_url:
+            print(f"Downloading and summarizing PDF from: {pdf_url}...", file=out)
+            return summarize_pdf(pdf_url, out) is not None
+        print("Please provide a PDF URL to summarize.", file=out)
+    else:
+        print("Invalid command. Please use 'search <query>', 'harvest <query>' or 'summarize <PDF_URL>'.", file=out)
+    return False
+
+def run_batch(lines, concurrency=CLI_BATCH_CONCURRENCY):
+    """
+    Runs commands (one per line; blank lines and '#' comments are skipped)
+    concurrently over the shared session. Each command's output is buffered
+    and printed whole, in input order, as soon as the commands before it are
+    done. Returns the number of commands that failed.
+    """
+    import io
+    from concurrent.futures import ThreadPoolExecutor
+
+    def run(command):
+        out = io.StringIO()
+        ok = run_command(command, out)
+        return ok, out.getvalue()
+
+    commands = [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        futures = [pool.submit(run, command) for command in commands]
+        for command, future in zip(commands, futures):
+            ok, output = future.result()
+            failed += not ok
+            print(f"\n>>> {command}")
+            print(output, end='', flush=True)
+    print(f"\nBatch finished: {len(commands) - failed} of {len(commands)} commands succeeded.", file=sys.stderr)
+    return failed
+
+def run_subcommand(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Scientific-Paper Scout Agent CLI. Run without arguments for the interactive prompt.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    harvest = subcommands.add_parser("harvest", help="Stream all arXiv results for a query as NDJSON")
+    harvest.add_argument("query")
+    harvest.add_argument("--max-results", type=int, default=None, help="Stop after this many records (default: all)")
+    harvest.add_argument("--start", type=int, default=0)
+    harvest.add_argument("--sort-by", default="submittedDate", choices=("relevance", "lastUpdatedDate", "submittedDate"))
+    harvest.add_argument("--output", "-o", help="Write to this file instead of stdout")
+    batch = subcommands.add_parser("batch", help="Run commands from a file or stdin, one per line, concurrently")
+    batch.add_argument("file", nargs="?", default="-", help="Command file (default: stdin)")
+    batch.add_argument("--concurrency", "-c", type=int, default=CLI_BATCH_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    if args.command == "harvest":
+        harvest_papers(args.query, args.max_results, args.start, args.sort_by, args.output)
+    elif args.command == "batch":
+        if args.file == "-":
+            failed = run_batch(sys.stdin, args.concurrency)
+        else:
+            with open(args.file, "r", encoding="utf-8") as f:
+                failed = run_batch(f, args.concurrency)
+        sys.exit(1 if failed else 0)
 
 def main():
+    if len(sys.argv) > 1:
+        run_subcommand(sys.argv[1:])
+        return
+    if not sys.stdin.isatty():
+        # Commands piped in: run them as a batch instead of prompting.
+        sys.exit(1 if run_batch(sys.stdin) else 0)
+
     print("Scientific-Paper Scout Agent CLI (Type 'exit' to quit)")
     while True:
         user_input = input("\nEnter command (e.g., search LLMs, summarize PDF_URL): ").strip()
         if user_input.lower() == 'exit':
             print("Exiting CLI. Goodbye!")
             break
-
-        if user_input.lower().startswith('search '):
-            query = user_input[len('search '):].strip()
-            if query:
-                search_papers(query)
-            else:
-                print("Please provide a search query. Example: search LLMs")
-        elif user_input.lower().startswith('summarize '):
-            pdf_url = user_input[len('summarize '):].strip()
-            if pdf_url:
-                print(f"Downloading and summarizing PDF from: {pdf_url}...")
-                try:
-                    start_time_api = time.time()
-                    print(f"Tool Call: summarize_pdf_api(pdf_url='{pdf_url}')")
-                    response = requests.post(f"{BACKEND_URL}/summarize", json={'pdf_url': pdf_url}, stream=True)
-                    response.raise_for_status()  # Raise an exception for HTTP errors
-
-                    full_summary = ""
-                    print("\n--- Summary ---")
-                    for chunk in response.iter_content(chunk_size=8192, decode_unicode=True):
-                        if chunk:
-                            full_summary += chunk
-                            print(chunk, end='', flush=True)
-                    print("\n-----------------")
-
-                    end_time_api = time.time()
-                    latency_api = end_time_api - start_time_api
-                    print(f"Tool Outcome: summarize_pdf_api - Success (Latency: {latency_api:.2f}s)")
-
-                except requests.exceptions.RequestException as e:
-                    end_time_api = time.time()
-                    latency_api = end_time_api - start_time_api
-                    print(f"Tool Outcome: summarize_pdf_api - Failed (Error: {e}, Latency: {latency_api:.2f}s)")
-                    print(f"Error connecting to backend: {e}")
-                except Exception as e:
-                    end_time_api = time.time()
-                    latency_api = end_time_api - start_time_api
-                    print(f"Tool Outcome: summarize_pdf_api - Failed (Error: {e}, Latency: {latency_api:.2f}s)")
-                    print(f"An unexpected error occurred: {e}")
-            else:
-                print("Please provide a PDF URL to summarize.")
-        else:
-            print("Invalid command. Please use 'search <query>' or 'summarize <PDF_URL>'.")
+        run_command(user_input)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,308 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+from shared_store import pid_alive
+
+# New-style (2401.00001v2) and old-style (hep-th/9901001) arXiv identifiers,
+# optionally prefixed with "arXiv:".
+ARXIV_ID_PATTERN = re.compile(r"^(?:arxiv:)?(\d{4}\.\d{4,5}(?:v\d+)?|[a-z\-]+(?:\.[a-z]{2})?/\d{7}(?:v\d+)?)$", re.IGNORECASE)
+
+ACTIVE_STATUSES = ("queued", "running")
+TERMINAL_STATUSES = ("done", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    dedupe_key TEXT NOT NULL,
+    pdf_url TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    model TEXT,
+    mode TEXT NOT NULL,
+    status TEXT NOT NULL,
+    summary TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    pid INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_by_dedupe_key ON jobs (dedupe_key, status);
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batch_items (
+    batch_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    job_id TEXT,
+    error TEXT,
+    PRIMARY KEY (batch_id, position)
+);
+"""
+
+
+def resolve_pdf_url(item: str):
+    """
+    Turns a batch item (a PDF URL or an arXiv ID) into a PDF URL, or None.
+    """
+    item = (item or "").strip()
+    match = ARXIV_ID_PATTERN.match(item)
+    if match:
+        return f"https://arxiv.org/pdf/{match.group(1)}"
+    if item.startswith(("http://", "https://")):
+        return item
+    return None
+
+
+def parse_provider_limits(spec: str) -> dict:
+    """
+    Parses "gemini=4,anthropic=2" into {"gemini": 4, "anthropic": 2}.
+    """
+    limits = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            name, value = part.split("=", 1)
+            limits[name.strip()] = int(value)
+    return limits
+
+
+class JobQueue:
+    """
+    Persistent summarization job queue backed by SQLite, drained by a pool of
+    worker threads.
+
+    Each job is run with run_job(pdf_url, mode), which returns the summary or
+    raises. At most provider_limits[provider] jobs (default_limit if unset)
+    run at once per LLM provider, counted across every process sharing the
+    database. Submitting a URL that is already queued or running for the
+    same provider, model and mode joins the existing job.
+    """
+
+    def __init__(self, db_path: str, run_job, workers: int = 4, provider_limits: dict = None,
+                 default_limit: int = None, poll_interval: float = 1.0):
+        self.db_path = db_path
+        self.run_job = run_job
+        self.workers = workers
+        self.provider_limits = provider_limits or {}
+        self.default_limit = default_limit or workers
+        self.poll_interval = poll_interval
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        if "pid" not in {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN pid INTEGER")
+        self._lock = threading.Lock()  # guards the connection
+        self._changed = threading.Condition(self._lock)
+        self._threads = []
+        self._stop = threading.Event()
+
+    def start(self):
+        """
+        Starts the worker threads (once). Jobs left running by a process that
+        has exited are queued again.
+        """
+        with self._lock:
+            if self._threads:
+                return
+            for row in self._db.execute("SELECT DISTINCT pid FROM jobs WHERE status = 'running'").fetchall():
+                if row["pid"] is None or not pid_alive(row["pid"]):
+                    self._db.execute("UPDATE jobs SET status = 'queued', started_at = NULL, pid = NULL"
+                                     " WHERE status = 'running' AND pid IS ?", (row["pid"],))
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"summary-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        with self._changed:
+            self._changed.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def submit(self, items, provider: str, model: str, mode: str = "auto") -> dict:
+        """
+        Enqueues a batch of PDF URLs or arXiv IDs and returns its description
+        (see get_batch). Items that cannot be resolved to a URL are recorded
+        with an error instead of a job.
+        """
+        batch_id = uuid.uuid4().hex
+        now = time.time()
+        provider = provider or ""
+        deduplicated = set()
+        with self._changed:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("INSERT INTO batches (id, created_at) VALUES (?, ?)", (batch_id, now))
+                for position, item in enumerate(items):
+                    item = str(item)
+                    pdf_url = resolve_pdf_url(item)
+                    if pdf_url is None:
+                        self._db.execute("INSERT INTO batch_items (batch_id, position, item, error) VALUES (?, ?, ?, ?)",
+                                         (batch_id, position, item, "not a PDF URL or arXiv ID"))
+                        continue
+                    dedupe_key = f"{pdf_url}|{provider}|{model}|{mode}"
+                    row = self._db.execute(
+                        "SELECT id FROM jobs WHERE dedupe_key = ? AND status IN ('queued', 'running') LIMIT 1",
+                        (dedupe_key,)).fetchone()
+                    if row:
+                        job_id = row["id"]
+                        deduplicated.add(position)
+                    else:
+                        job_id = uuid.uuid4().hex
+                        self._db.execute(
+                            "INSERT INTO jobs (id, dedupe_key, pdf_url, provider, model, mode, status, created_at)"
+                            " VALUES (?, ?, ?, ?, ?, ?, 'queued', ?)",
+                            (job_id, dedupe_key, pdf_url, provider, model, mode, now))
+                    self._db.execute("INSERT INTO batch_items (batch_id, position, item, job_id) VALUES (?, ?, ?, ?)",
+                                     (batch_id, position, item, job_id))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._changed.notify_all()
+
+        batch = self.get_batch(batch_id, include_summaries=False)
+        for position, job in enumerate(batch["jobs"]):
+            job["deduplicated"] = position in deduplicated
+        return batch
+
+    def _claim(self):
+        # Takes the oldest queued job whose provider has a free slot, counting
+        # the jobs every process is running. The caller holds the lock.
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            running = self._db.execute("SELECT provider, COUNT(*) AS jobs FROM jobs WHERE status = 'running' GROUP BY provider").fetchall()
+            full = [row["provider"] for row in running
+                    if row["jobs"] >= self.provider_limits.get(row["provider"], self.default_limit)]
+            placeholders = ",".join("?" * len(full))
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE status = 'queued'"
+                + (f" AND provider NOT IN ({placeholders})" if full else "")
+                + " ORDER BY created_at, rowid LIMIT 1", full).fetchone()
+            if row is not None:
+                self._db.execute("UPDATE jobs SET status = 'running', started_at = ?, pid = ? WHERE id = ?",
+                                 (time.time(), os.getpid(), row["id"]))
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        self._changed.notify_all()
+        return dict(row)
+
+    def _work(self):
+        while not self._stop.is_set():
+            with self._changed:
+                job = self._claim()
+                if job is None:
+                    # Woken by submits and finished jobs; the timeout also
+                    # picks up jobs submitted by other processes.
+                    self._changed.wait(self.poll_interval)
+                    continue
+            summary, error = None, None
+            try:
+                summary = self.run_job(job["pdf_url"], job["mode"])
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+                print(f"Error running summary job {job['id']} for {job['pdf_url']}: {error}")
+            with self._changed:
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, summary = ?, error = ?, finished_at = ? WHERE id = ?",
+                    ("failed" if error else "done", summary, error, time.time(), job["id"]))
+                self._changed.notify_all()
+
+    def _job_dict(self, row, include_summary: bool = True) -> dict:
+        job = {
+            "job_id": row["id"],
+            "pdf_url": row["pdf_url"],
+            "status": row["status"],
+            "mode": row["mode"],
+            "provider": row["provider"] or None,
+            "model": row["model"],
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+        if include_summary:
+            job["summary"] = row["summary"]
+        return job
+
+    def get_job(self, job_id: str):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job_dict(row) if row else None
+
+    def get_batch(self, batch_id: str, include_summaries: bool = True):
+        """
+        Returns the batch with per-item job status (and summaries, once
+        done), or None if it does not exist.
+        """
+        with self._lock:
+            batch = self._db.execute("SELECT * FROM batches WHERE id = ?", (batch_id,)).fetchone()
+            if batch is None:
+                return None
+            rows = self._db.execute(
+                "SELECT batch_items.position, batch_items.item, batch_items.error AS item_error, jobs.*"
+                " FROM batch_items LEFT JOIN jobs ON jobs.id = batch_items.job_id"
+                " WHERE batch_items.batch_id = ? ORDER BY batch_items.position", (batch_id,)).fetchall()
+
+        jobs = []
+        counts = dict.fromkeys(ACTIVE_STATUSES + TERMINAL_STATUSES + ("invalid",), 0)
+        for row in rows:
+            if row["id"] is None:
+                job = {"item": row["item"], "status": "invalid", "error": row["item_error"]}
+            else:
+                job = dict(self._job_dict(row, include_summaries), item=row["item"])
+            counts[job["status"]] += 1
+            jobs.append(job)
+        return {
+            "batch_id": batch_id,
+            "created_at": batch["created_at"],
+            "complete": counts["queued"] == 0 and counts["running"] == 0,
+            "counts": counts,
+            "jobs": jobs,
+        }
+
+    def iter_batch_events(self, batch_id: str, timeout: float = None):
+        """
+        Generator yielding a job (with its summary once done) every time one
+        in the batch changes status, starting with the current state of each,
+        and ending when the whole batch is complete or after timeout seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        seen = {}
+        while True:
+            batch = self.get_batch(batch_id)
+            if batch is None:
+                return
+            for position, job in enumerate(batch["jobs"]):
+                if seen.get(position) != job["status"]:
+                    seen[position] = job["status"]
+                    yield dict(job, position=position)
+            if batch["complete"]:
+                return
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            with self._changed:
+                # Woken by local workers; the poll also picks up other processes.
+                self._changed.wait(self.poll_interval)
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) AS jobs FROM jobs GROUP BY status").fetchall()
+            running = self._db.execute("SELECT provider, COUNT(*) AS jobs FROM jobs WHERE status = 'running' GROUP BY provider").fetchall()
+            return {
+                "jobs": {row["status"]: row["jobs"] for row in rows},
+                "running_by_provider": {row["provider"]: row["jobs"] for row in running},
+                "workers": len(self._threads),
+            }
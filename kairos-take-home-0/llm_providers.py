@@ -0,0 +1,436 @@
+import asyncio
+import contextvars
+import json
+import os
+import random
+import threading
+from contextlib import contextmanager
+from urllib.parse import parse_qsl
+
+# Upper bound on the length of a completion, for providers that require one.
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "1024"))
+
+
+# LLMError kinds that a retry, or another provider, may get past.
+RATE_LIMITED = "rate_limited"
+UNAVAILABLE = "unavailable"
+
+_RATE_LIMIT_MARKERS = ("429", "rate limit", "rate_limit", "resource exhausted", "resource_exhausted", "quota")
+_UNAVAILABLE_MARKERS = ("timeout", "timed out", "overloaded", "unavailable", "connection error", "connection reset")
+
+
+class LLMError(Exception):
+    """
+    Raised by stream_llm when the provider is misconfigured or the call fails.
+    The message is the user-facing error string. kind is RATE_LIMITED or
+    UNAVAILABLE for errors worth retrying (see error_kind), else None.
+    """
+
+    def __init__(self, message: str, kind: str = None):
+        super().__init__(message)
+        self.kind = kind
+
+
+def error_kind(e):
+    """
+    Classifies a provider SDK exception (or error message): RATE_LIMITED for 429s and quota
+    errors, UNAVAILABLE for timeouts, dropped connections and 5xx or
+    "overloaded" responses, or None for errors a retry would not fix.
+    """
+    status = getattr(e, "status_code", None) or getattr(e, "code", None)
+    message = str(e).lower()
+    if status == 429 or any(marker in message for marker in _RATE_LIMIT_MARKERS):
+        return RATE_LIMITED
+    if (isinstance(status, int) and status >= 500) or any(marker in message for marker in _UNAVAILABLE_MARKERS):
+        return UNAVAILABLE
+    return None
+
+
+class Cancellation:
+    """
+    Cancels one LLM call from another thread, e.g. the losing side of a
+    hedge. set() runs the callbacks registered with on_cancel while the call
+    may still be blocked waiting for its next chunk, so its HTTP response is
+    closed and its concurrency slot freed at once rather than when that
+    chunk arrives.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def is_set(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._event.wait(timeout)
+
+    def add_callback(self, callback):
+        """
+        Runs callback when the call is cancelled, or now if it already was.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def set(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error cancelling LLM call: {e}")
+
+
+_current_cancellation = contextvars.ContextVar("llm_cancellation", default=None)
+
+
+@contextmanager
+def cancellation_scope(cancellation: Cancellation):
+    """
+    Makes cancellation the one on_cancel registers with, in this thread.
+    """
+    token = _current_cancellation.set(cancellation)
+    try:
+        yield
+    finally:
+        _current_cancellation.reset(token)
+
+
+def on_cancel(callback):
+    """
+    For providers: runs callback (typically closing the response being read)
+    if the router cancels the current call. It runs on the cancelling
+    thread, so it must be safe to call while stream() is blocked in a read.
+    """
+    cancellation = _current_cancellation.get()
+    if cancellation is not None:
+        cancellation.add_callback(callback)
+
+
+class LLMProvider:
+    """
+    A long-lived client for one LLM provider, built once per process by
+    get_provider and shared by all requests, so HTTP connections and TLS
+    sessions are reused.
+
+    Subclasses implement stream(prompt, model), a generator of text chunks,
+    and, when the SDK has a native async client, astream(prompt, model) with
+    has_async = True. Both raise LLMError on provider errors. Clients are
+    built without SDK-level retries; llm_routing retries and fails over.
+    stream() registers how to abort a blocked read with on_cancel; astream()
+    is cancelled like any other coroutine.
+    """
+
+    name = None
+    has_async = False
+
+    def stream(self, prompt: str, model: str):
+        raise NotImplementedError
+
+    async def astream(self, prompt: str, model: str):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def _require_env(name: str, provider_label: str) -> str:
+    value = os.getenv(name)
+    if not value:
+        raise LLMError(f"Error: {name} not set for {provider_label} provider.")
+    return value
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+    has_async = True
+
+    def __init__(self):
+        import google.generativeai as genai
+
+        self._genai = genai
+        genai.configure(api_key=_require_env("GOOGLE_API_KEY", "Gemini"))
+        self._models = {}
+
+    def _model(self, model: str):
+        generative_model = self._models.get(model)
+        if generative_model is None:
+            generative_model = self._models[model] = self._genai.GenerativeModel(model)
+        return generative_model
+
+    def _error(self, e: Exception) -> LLMError:
+        if "404 models" in str(e) and "is not found" in str(e):
+            print("\n--- Available Gemini Models ---")
+            try:
+                for m in self._genai.list_models():
+                    if 'generateContent' in m.supported_generation_methods:
+                        print(m.name)
+            except Exception as list_error:
+                print(f"Error listing models: {list_error}")
+            print("-----------------------------")
+            return LLMError(f"Error summarizing with Gemini: {e}\nPlease update LLM_MODEL in your .env file with one of the available models listed above.")
+        return LLMError(f"Error summarizing with Gemini: {e}", kind=error_kind(e))
+
+    @staticmethod
+    def _cancel(response):
+        # The response reads from the streaming call (gRPC or REST), which
+        # both transports can cancel from another thread.
+        call = getattr(response, "_iterator", None)
+        if call is not None and hasattr(call, "cancel"):
+            call.cancel()
+
+    def stream(self, prompt: str, model: str):
+        try:
+            # generate_content returns once the first chunk is in; a call
+            # cancelled before then is closed as soon as it returns.
+            response = self._model(model).generate_content(prompt, stream=True)
+            on_cancel(lambda: self._cancel(response))
+            for chunk in response:
+                yield chunk.text
+        except Exception as e:
+            raise self._error(e)
+
+    async def astream(self, prompt: str, model: str):
+        try:
+            response_stream = await self._model(model).generate_content_async(prompt, stream=True)
+            async for chunk in response_stream:
+                yield chunk.text
+        except Exception as e:
+            raise self._error(e)
+
+
+class AnthropicProvider(LLMProvider):
+    name = "anthropic"
+    has_async = True
+
+    def __init__(self):
+        import anthropic
+
+        self._anthropic = anthropic
+        self._api_key = _require_env("ANTHROPIC_API_KEY", "Anthropic")
+        self._client = anthropic.Anthropic(api_key=self._api_key, max_retries=0)
+        self._async_client = None  # built on first use, inside the event loop
+
+    def stream(self, prompt: str, model: str):
+        try:
+            with self._client.messages.stream(
+                model=model,
+                max_tokens=LLM_MAX_OUTPUT_TOKENS,
+                messages=[{"role": "user", "content": prompt}],
+            ) as stream:
+                on_cancel(stream.close)
+                for text_chunk in stream.text_stream:
+                    yield text_chunk
+        except Exception as e:
+            raise LLMError(f"Error summarizing with Anthropic: {e}", kind=error_kind(e))
+
+    async def astream(self, prompt: str, model: str):
+        if self._async_client is None:
+            self._async_client = self._anthropic.AsyncAnthropic(api_key=self._api_key, max_retries=0)
+        try:
+            async with self._async_client.messages.stream(
+                model=model,
+                max_tokens=LLM_MAX_OUTPUT_TOKENS,
+                messages=[{"role": "user", "content": prompt}],
+            ) as stream:
+                async for text_chunk in stream.text_stream:
+                    yield text_chunk
+        except Exception as e:
+            raise LLMError(f"Error summarizing with Anthropic: {e}", kind=error_kind(e))
+
+    def close(self):
+        self._client.close()
+
+
+class OpenAIProvider(LLMProvider):
+    """
+    OpenAI chat completions. OPENAI_BASE_URL points it at any compatible
+    server (e.g. a local inference server or the benchmark stub).
+    """
+
+    name = "openai"
+    has_async = True
+
+    def __init__(self):
+        import openai
+
+        self._openai = openai
+        self._options = {"api_key": _require_env("OPENAI_API_KEY", "OpenAI"), "base_url": os.getenv("OPENAI_BASE_URL") or None,
+                         "max_retries": 0}
+        self._client = openai.OpenAI(**self._options)
+        self._async_client = None  # built on first use, inside the event loop
+
+    def _request(self, prompt: str, model: str) -> dict:
+        return {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": LLM_MAX_OUTPUT_TOKENS,
+            "stream": True,
+        }
+
+    @staticmethod
+    def _event_text(line: str):
+        # Text of one server-sent event line, or None. The SDK's own Stream
+        # closes the response at [DONE] without reading the end of the body,
+        # which drops the connection, so the events are parsed here and the
+        # body is always read to the end.
+        if not line.startswith("data:"):
+            return None
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return None
+        event = json.loads(data)
+        if event.get("error"):
+            raise LLMError(f"Error summarizing with OpenAI: {event['error']}", kind=error_kind(str(event["error"])))
+        choices = event.get("choices")
+        return choices[0].get("delta", {}).get("content") if choices else None
+
+    def stream(self, prompt: str, model: str):
+        try:
+            with self._client.chat.completions.with_streaming_response.create(**self._request(prompt, model)) as response:
+                on_cancel(response.close)
+                for line in response.iter_lines():
+                    text = self._event_text(line)
+                    if text:
+                        yield text
+        except LLMError:
+            raise
+        except Exception as e:
+            raise LLMError(f"Error summarizing with OpenAI: {e}", kind=error_kind(e))
+
+    async def astream(self, prompt: str, model: str):
+        if self._async_client is None:
+            self._async_client = self._openai.AsyncOpenAI(**self._options)
+        try:
+            async with self._async_client.chat.completions.with_streaming_response.create(**self._request(prompt, model)) as response:
+                async for line in response.iter_lines():
+                    text = self._event_text(line)
+                    if text:
+                        yield text
+        except LLMError:
+            raise
+        except Exception as e:
+            raise LLMError(f"Error summarizing with OpenAI: {e}", kind=error_kind(e))
+
+    def close(self):
+        self._client.close()
+
+
+def fake_llm_chunks(prompt: str, words: int = None):
+    """
+    Returns the deterministic output of the fake provider for a prompt: a
+    header followed by the first FAKE_LLM_WORDS words of the prompt body.
+    """
+    if words is None:
+        words = int(os.getenv("FAKE_LLM_WORDS", "50"))
+    body = prompt.split("\n\n", 1)[-1]
+    return [f"[fake summary of {len(prompt)} chars]"] + [f" {word}" for word in body.split()[:words]]
+
+
+class FakeProvider(LLMProvider):
+    """
+    Deterministic offline stand-in for a real provider, sleeping
+    FAKE_LLM_FIRST_TOKEN_DELAY seconds before the first chunk and
+    FAKE_LLM_DELAY seconds before each chunk after it. A FAKE_LLM_ERROR_RATE
+    share of calls fail up front with a rate-limit error.
+
+    Options in the model name override the environment for that model, e.g.
+    LLM_MODEL="slow?first_token_delay=5&error_rate=0.5", so tests can pair a
+    slow or throttled primary with a healthy fallback.
+    """
+
+    name = "fake"
+    has_async = True
+
+    def __init__(self):
+        self.first_token_delay = float(os.getenv("FAKE_LLM_FIRST_TOKEN_DELAY", "0"))
+        self.delay = float(os.getenv("FAKE_LLM_DELAY", "0"))
+        self.words = int(os.getenv("FAKE_LLM_WORDS", "50"))
+        self.error_rate = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+
+    def _options(self, model: str) -> dict:
+        options = {"first_token_delay": self.first_token_delay, "delay": self.delay, "words": self.words, "error_rate": self.error_rate}
+        for name, value in parse_qsl(model.partition("?")[2]):
+            if name in options:
+                options[name] = type(options[name])(value)
+        if options["error_rate"] and random.random() < options["error_rate"]:
+            raise LLMError("Error summarizing with fake provider: 429 rate limit exceeded", kind=RATE_LIMITED)
+        return options
+
+    def stream(self, prompt: str, model: str):
+        options = self._options(model)
+        # Like closing a real response, cancelling the call ends a wait.
+        closed = threading.Event()
+        on_cancel(closed.set)
+        for i, chunk in enumerate(fake_llm_chunks(prompt, options["words"])):
+            delay = options["delay"] if i else options["first_token_delay"]
+            if delay and closed.wait(delay):
+                return
+            yield chunk
+
+    async def astream(self, prompt: str, model: str):
+        options = self._options(model)
+        for i, chunk in enumerate(fake_llm_chunks(prompt, options["words"])):
+            delay = options["delay"] if i else options["first_token_delay"]
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk
+
+
+_provider_classes = {}
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def register_provider(name: str, provider_class):
+    """
+    Makes provider_class available as LLM_PROVIDER=name. It is instantiated
+    (reading its credentials from the environment) on first use.
+    """
+    _provider_classes[name] = provider_class
+
+
+for _provider_class in (GeminiProvider, AnthropicProvider, OpenAIProvider, FakeProvider):
+    register_provider(_provider_class.name, _provider_class)
+
+
+def get_provider(name: str = None) -> LLMProvider:
+    """
+    Returns the shared client for a provider (LLM_PROVIDER by default),
+    building it on first use. Raises LLMError if the provider is unknown or
+    its credentials are missing; failures are not cached.
+    """
+    name = name or os.getenv("LLM_PROVIDER")
+    provider = _providers.get(name)
+    if provider is not None:
+        return provider
+    provider_class = _provider_classes.get(name)
+    if provider_class is None:
+        raise LLMError(f"Unsupported LLM provider: {name}")
+    with _providers_lock:
+        provider = _providers.get(name)
+        if provider is None:
+            provider = _providers[name] = provider_class()
+    return provider
+
+
+def reset_providers():
+    """
+    Closes and forgets every shared client, e.g. after credentials change.
+    """
+    with _providers_lock:
+        providers = list(_providers.values())
+        _providers.clear()
+    for provider in providers:
+        try:
+            provider.close()
+        except Exception as e:
+            print(f"Error closing LLM provider {provider.name}: {e}")
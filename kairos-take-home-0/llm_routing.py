@@ -0,0 +1,519 @@
+import asyncio
+import contextvars
+import os
+import queue
+import random
+import threading
+import time
+
+from llm_providers import RATE_LIMITED, Cancellation, LLMError, cancellation_scope, get_provider
+from tool_logging import log_tool_call
+
+
+def parse_targets(spec: str) -> list:
+    """
+    Parses "anthropic:claude-3-5-haiku-latest,openai:gpt-4o-mini" into
+    [("anthropic", "claude-3-5-haiku-latest"), ("openai", "gpt-4o-mini")].
+    """
+    targets = []
+    for part in (spec or "").split(","):
+        provider, _, model = part.strip().partition(":")
+        if provider and model:
+            targets.append((provider, model))
+    return targets
+
+
+def llm_targets() -> list:
+    """
+    The (provider, model) pairs a completion may come from, in order of
+    preference: LLM_PROVIDER/LLM_MODEL, then each LLM_FALLBACK entry. Raises
+    LLMError if the primary is not configured.
+    """
+    llm_provider = os.getenv("LLM_PROVIDER")
+    llm_model = os.getenv("LLM_MODEL")
+
+    if not llm_provider or not llm_model:
+        raise LLMError("Error: LLM configuration missing (LLM_PROVIDER or LLM_MODEL).")
+    return [(llm_provider, llm_model)] + parse_targets(os.getenv("LLM_FALLBACK"))
+
+
+class AdaptiveLimiter:
+    """
+    Caps the calls in flight to one LLM provider with an AIMD limit: each
+    success with a time to first token under latency_target raises the limit
+    by 1/limit (about one per limit's worth of calls), and a rate-limit error
+    or a slower first token scales it by backoff_ratio. As in TCP, only
+    calls started after the last decrease can cause another, so a burst of
+    failures from one window of calls counts once. Callers over the limit
+    wait in line, from threads (acquire) or the event loop (aacquire).
+    """
+
+    def __init__(self, initial: float = 8, min_limit: int = 1, max_limit: int = 64, latency_target: float = 10.0,
+                 backoff_ratio: float = 0.5):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.latency_target = latency_target
+        self.backoff_ratio = backoff_ratio
+        self._in_flight = 0
+        self._queued = 0
+        self._epoch = 0  # bumped by every decrease
+        self._cond = threading.Condition()
+        self._wakers = set()  # callables notified of every release, for async waiters
+        self.started = 0
+        self.succeeded = 0
+        self.rate_limited = 0
+        self.slow = 0
+        self.failed = 0
+        self.queue_timeouts = 0
+
+    def _take(self):
+        # Caller holds the condition.
+        if self._in_flight >= int(self.limit):
+            return None
+        self._in_flight += 1
+        self.started += 1
+        return self._epoch
+
+    def acquire(self, timeout: float = None):
+        """
+        Takes a slot, waiting up to timeout seconds (forever if None).
+        Returns the ticket to pass to release, or None if no slot freed up
+        in time.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._queued += 1
+            try:
+                while True:
+                    ticket = self._take()
+                    if ticket is not None:
+                        return ticket
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self.queue_timeouts += 1
+                        return None
+                    self._cond.wait(remaining)
+            finally:
+                self._queued -= 1
+
+    async def aacquire(self, timeout: float = None):
+        """
+        Async variant of acquire for the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def waker():
+            try:
+                loop.call_soon_threadsafe(changed.set)
+            except RuntimeError:
+                pass  # the event loop is gone
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._wakers.add(waker)
+            self._queued += 1
+        try:
+            while True:
+                changed.clear()
+                with self._cond:
+                    ticket = self._take()
+                if ticket is not None:
+                    return ticket
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    with self._cond:
+                        self.queue_timeouts += 1
+                    return None
+                try:
+                    await asyncio.wait_for(changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self._wakers.discard(waker)
+                self._queued -= 1
+
+    def release(self, ticket: int, outcome: str, first_token_latency: float = None):
+        """
+        Frees the slot acquired with ticket and adjusts the limit. outcome is
+        "success", "rate_limited", "error" or "cancelled"; only the first two
+        move it.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            slow = outcome == "success" and first_token_latency is not None and first_token_latency > self.latency_target
+            if outcome == "success":
+                self.succeeded += 1
+                self.slow += slow
+            elif outcome == RATE_LIMITED:
+                self.rate_limited += 1
+            elif outcome != "cancelled":
+                self.failed += 1
+            if outcome == RATE_LIMITED or slow:
+                if ticket == self._epoch:
+                    self.limit = max(float(self.min_limit), self.limit * self.backoff_ratio)
+                    self._epoch += 1
+            elif outcome == "success":
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+            wakers = list(self._wakers)
+        for waker in wakers:
+            waker()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self._in_flight,
+                "queued": self._queued,
+                "started": self.started,
+                "succeeded": self.succeeded,
+                "rate_limited": self.rate_limited,
+                "slow": self.slow,
+                "failed": self.failed,
+                "queue_timeouts": self.queue_timeouts,
+            }
+
+
+def _scoped_stream(cancellation: Cancellation, chunks):
+    # Iterates a provider stream on the bridge thread with cancellation as
+    # the one its on_cancel hook registers with.
+    with cancellation_scope(cancellation):
+        yield from chunks
+
+
+class LLMRouter:
+    """
+    Streams completions through a per-provider AdaptiveLimiter, retrying
+    rate-limited and unavailable calls with full-jitter exponential backoff,
+    and falling back to the next target in llm_targets() when one fails.
+
+    With first_token_timeout set and a fallback configured, a call that has
+    not produced its first chunk by the deadline is hedged: the next target
+    is started alongside it and the first to produce a chunk is streamed,
+    the other cancelled. Retries, hedges and failovers only happen before the
+    first chunk, so a response always comes from a single completion; an
+    error after that is raised to the caller.
+    """
+
+    def __init__(self, first_token_timeout: float = 30.0, max_retries: int = 2, retry_base_delay: float = 0.5,
+                 retry_max_delay: float = 8.0, queue_timeout: float = 60.0, limiter_options: dict = None):
+        self.first_token_timeout = first_token_timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.queue_timeout = queue_timeout
+        self.limiter_options = limiter_options or {}
+        self._limiters = {}
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.hedges = 0
+        self.failovers = 0
+
+    def limiter(self, provider: str) -> AdaptiveLimiter:
+        with self._lock:
+            limiter = self._limiters.get(provider)
+            if limiter is None:
+                limiter = self._limiters[provider] = AdaptiveLimiter(**self.limiter_options)
+            return limiter
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+    def _queue_timeout_error(self, provider: str) -> LLMError:
+        return LLMError(f"Error: timed out waiting for a {provider} request slot.", kind=RATE_LIMITED)
+
+    def _log_switch(self, action: str, source, target, reason: str, started: float):
+        log_tool_call(f"llm_{action}", {"from": "/".join(source), "to": "/".join(target)}, reason, time.monotonic() - started)
+
+    @staticmethod
+    def _release_once(limiter: AdaptiveLimiter, ticket: int, start: float):
+        # The slot is freed by whichever comes first: the call ending, or it
+        # being cancelled while still blocked in the provider.
+        lock = threading.Lock()
+        held = [True]
+
+        def release(outcome: str, first_token: float = None):
+            with lock:
+                if not held[0]:
+                    return
+                held[0] = False
+            limiter.release(ticket, outcome, first_token if first_token is not None else time.monotonic() - start)
+
+        return release
+
+    def _attempt(self, target, prompt: str, cancelled: Cancellation = None):
+        # One target, with retries. Yields its chunks.
+        provider_name, model = target
+        provider = get_provider(provider_name)
+        limiter = self.limiter(provider_name)
+        for attempt in range(self.max_retries + 1):
+            ticket = limiter.acquire(self.queue_timeout)
+            if ticket is None:
+                raise self._queue_timeout_error(provider_name)
+            start = time.monotonic()
+            first_token = None
+            outcome = "error"
+            release = self._release_once(limiter, ticket, start)
+            if cancelled is not None:
+                cancelled.add_callback(lambda release=release: release("cancelled"))
+                if cancelled.is_set():
+                    return
+            try:
+                for chunk in provider.stream(prompt, model):
+                    if first_token is None:
+                        first_token = time.monotonic() - start
+                    yield chunk
+                outcome = "success"
+                return
+            except LLMError as e:
+                outcome = e.kind or "error"
+                if first_token is not None or e.kind is None or attempt == self.max_retries:
+                    raise
+            except GeneratorExit:
+                outcome = "cancelled"
+                raise
+            finally:
+                release(outcome, first_token)
+            self._count("retries")
+            delay = self._backoff(attempt)
+            if cancelled is None:
+                time.sleep(delay)
+            elif cancelled.wait(delay):
+                return
+
+    async def _aattempt(self, target, prompt: str, bridge):
+        provider_name, model = target
+        provider = get_provider(provider_name)
+        limiter = self.limiter(provider_name)
+        for attempt in range(self.max_retries + 1):
+            ticket = await limiter.aacquire(self.queue_timeout)
+            if ticket is None:
+                raise self._queue_timeout_error(provider_name)
+            start = time.monotonic()
+            first_token = None
+            outcome = "error"
+            cancellation = None
+            if provider.has_async:
+                chunks = provider.astream(prompt, model)
+            else:
+                # Cancelling this task cannot interrupt the bridge thread, so
+                # the provider's response is closed through its on_cancel hook.
+                cancellation = Cancellation()
+                chunks = bridge(lambda: _scoped_stream(cancellation, provider.stream(prompt, model)))
+            try:
+                async for chunk in chunks:
+                    if first_token is None:
+                        first_token = time.monotonic() - start
+                    yield chunk
+                outcome = "success"
+                return
+            except LLMError as e:
+                outcome = e.kind or "error"
+                if first_token is not None or e.kind is None or attempt == self.max_retries:
+                    raise
+            except (GeneratorExit, asyncio.CancelledError):
+                outcome = "cancelled"
+                raise
+            finally:
+                limiter.release(ticket, outcome, first_token if first_token is not None else time.monotonic() - start)
+                if cancellation is not None and outcome == "cancelled":
+                    cancellation.set()
+                await chunks.aclose()
+            self._count("retries")
+            await asyncio.sleep(self._backoff(attempt))
+
+    def stream(self, prompt: str, targets):
+        """
+        Streams the completion of prompt from the first of targets that
+        answers. Raises LLMError if every target fails before its first
+        chunk, or if the chosen one fails after it.
+        """
+        if len(targets) > 1 and self.first_token_timeout > 0:
+            yield from self._hedged(prompt, targets)
+            return
+        started = time.monotonic()
+        for i, target in enumerate(targets):
+            sent = False
+            try:
+                for chunk in self._attempt(target, prompt):
+                    sent = True
+                    yield chunk
+                return
+            except LLMError as e:
+                if sent or i == len(targets) - 1:
+                    raise
+                self._count("failovers")
+                self._log_switch("failover", target, targets[i + 1], str(e), started)
+
+    def _hedged(self, prompt: str, targets):
+        events = queue.Queue()
+        cancel_events = []
+
+        def run(index, target, cancelled):
+            try:
+                with cancellation_scope(cancelled):
+                    for chunk in self._attempt(target, prompt, cancelled):
+                        if cancelled.is_set():
+                            break
+                        events.put((index, "chunk", chunk))
+                events.put((index, "done", None))
+            except LLMError as e:
+                events.put((index, "error", e))
+            except Exception as e:
+                events.put((index, "error", LLMError(f"Error summarizing with {target[0]}: {e}")))
+
+        def start(target):
+            cancelled = Cancellation()
+            cancel_events.append(cancelled)
+            context = contextvars.copy_context()  # keeps the trace ID in the logs
+            threading.Thread(target=context.run, args=(run, len(cancel_events) - 1, target, cancelled),
+                             name="llm-attempt", daemon=True).start()
+
+        started = time.monotonic()
+        start(targets[0])
+        next_target, running = 1, 1
+        deadline = started + self.first_token_timeout
+        try:
+            while True:
+                timeout = max(0.0, deadline - time.monotonic()) if next_target < len(targets) else None
+                try:
+                    index, kind, value = events.get(timeout=timeout)
+                except queue.Empty:
+                    # No first chunk by the deadline: race the next target.
+                    self._count("hedges")
+                    self._log_switch("hedge", targets[next_target - 1], targets[next_target],
+                                     f"No first token after {self.first_token_timeout}s", started)
+                    start(targets[next_target])
+                    next_target, running = next_target + 1, running + 1
+                    deadline = time.monotonic() + self.first_token_timeout
+                    continue
+                if kind == "error":
+                    running -= 1
+                    if running:
+                        continue
+                    if next_target == len(targets):
+                        raise value
+                    self._count("failovers")
+                    self._log_switch("failover", targets[index], targets[next_target], str(value), started)
+                    start(targets[next_target])
+                    next_target, running = next_target + 1, running + 1
+                    deadline = time.monotonic() + self.first_token_timeout
+                    continue
+                winner = index
+                break
+            for i, cancelled in enumerate(cancel_events):
+                if i != winner:
+                    cancelled.set()
+            while kind != "done":
+                if index == winner:
+                    if kind == "error":
+                        raise value
+                    yield value
+                index, kind, value = events.get()
+                while index != winner:
+                    index, kind, value = events.get()
+        finally:
+            for cancelled in cancel_events:
+                cancelled.set()
+
+    async def astream(self, prompt: str, targets, bridge):
+        """
+        Async variant of stream for the event loop. bridge(make_iterator)
+        streams providers without a native async client from a thread.
+        """
+        if len(targets) > 1 and self.first_token_timeout > 0:
+            async for chunk in self._ahedged(prompt, targets, bridge):
+                yield chunk
+            return
+        started = time.monotonic()
+        for i, target in enumerate(targets):
+            sent = False
+            try:
+                async for chunk in self._aattempt(target, prompt, bridge):
+                    sent = True
+                    yield chunk
+                return
+            except LLMError as e:
+                if sent or i == len(targets) - 1:
+                    raise
+                self._count("failovers")
+                self._log_switch("failover", target, targets[i + 1], str(e), started)
+
+    async def _ahedged(self, prompt: str, targets, bridge):
+        events = asyncio.Queue()
+        tasks = []
+
+        async def run(index, target):
+            try:
+                async for chunk in self._aattempt(target, prompt, bridge):
+                    events.put_nowait((index, "chunk", chunk))
+                events.put_nowait((index, "done", None))
+            except LLMError as e:
+                events.put_nowait((index, "error", e))
+            except Exception as e:
+                events.put_nowait((index, "error", LLMError(f"Error summarizing with {target[0]}: {e}")))
+
+        def start(target):
+            tasks.append(asyncio.ensure_future(run(len(tasks), target)))
+
+        started = time.monotonic()
+        start(targets[0])
+        next_target, running = 1, 1
+        deadline = started + self.first_token_timeout
+        try:
+            while True:
+                timeout = max(0.0, deadline - time.monotonic()) if next_target < len(targets) else None
+                try:
+                    index, kind, value = await asyncio.wait_for(events.get(), timeout)
+                except asyncio.TimeoutError:
+                    self._count("hedges")
+                    self._log_switch("hedge", targets[next_target - 1], targets[next_target],
+                                     f"No first token after {self.first_token_timeout}s", started)
+                    start(targets[next_target])
+                    next_target, running = next_target + 1, running + 1
+                    deadline = time.monotonic() + self.first_token_timeout
+                    continue
+                if kind == "error":
+                    running -= 1
+                    if running:
+                        continue
+                    if next_target == len(targets):
+                        raise value
+                    self._count("failovers")
+                    self._log_switch("failover", targets[index], targets[next_target], str(value), started)
+                    start(targets[next_target])
+                    next_target, running = next_target + 1, running + 1
+                    deadline = time.monotonic() + self.first_token_timeout
+                    continue
+                winner = index
+                break
+            for i, task in enumerate(tasks):
+                if i != winner:
+                    task.cancel()
+            while kind != "done":
+                if index == winner:
+                    if kind == "error":
+                        raise value
+                    yield value
+                index, kind, value = await events.get()
+                while index != winner:
+                    index, kind, value = await events.get()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            limiters = dict(self._limiters)
+            stats = {"retries": self.retries, "hedges": self.hedges, "failovers": self.failovers,
+                     "first_token_timeout": self.first_token_timeout}
+        stats["providers"] = {name: limiter.stats() for name, limiter in limiters.items()}
+        return stats
+
@@ -0,0 +1,598 @@
+import heapq
+import json
+import math
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from itertools import accumulate
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the hosts run as a single process
+    fcntl = None
+
+from summary_cache import normalize_arxiv_id
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with we our"
+    " can using use used based via into than these those their".split()
+)
+
+# Each paper can be indexed from several sources; a source is re-indexed as a
+# whole when it changes. Weights control how much each source counts.
+SOURCE_WEIGHTS = {"metadata": 1.0, "summary": 0.8, "fulltext": 0.5}
+INDEX_VERSION = 1
+
+
+def tokenize(text: str):
+    """
+    Lowercases text and splits it into alphanumeric tokens, dropping stopwords
+    and single characters.
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+def paper_key(pdf_url: str) -> str:
+    """
+    Returns the key a paper is indexed under: its version-less arXiv ID when
+    the URL points at arXiv, otherwise the URL itself.
+    """
+    arxiv_id = normalize_arxiv_id(pdf_url)
+    if arxiv_id:
+        return "arxiv:" + re.sub(r"v\d+$", "", arxiv_id)
+    return pdf_url
+
+
+def encode_varint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_postings(data) -> tuple:
+    """
+    Decodes a varint postings list of (doc id delta, term frequency) pairs into
+    parallel arrays of absolute doc ids and frequencies.
+    """
+    if not data:
+        return array("I"), array("I")
+    if max(data) < 0x80:
+        # Every value fits in one byte, which is typical for long lists of
+        # common terms: slice the pairs apart without a Python-level loop.
+        return array("I", accumulate(data[0::2])), array("I", iter(data[1::2]))
+    doc_ids = array("I")
+    freqs = array("I")
+    value = 0
+    shift = 0
+    doc_id = 0
+    expecting_delta = True
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        if expecting_delta:
+            doc_id += value
+            doc_ids.append(doc_id)
+        else:
+            freqs.append(value)
+        expecting_delta = not expecting_delta
+        value = 0
+        shift = 0
+    return doc_ids, freqs
+
+
+class LocalIndex:
+    """
+    Inverted index with BM25 ranking over papers we have seen: search result
+    metadata, extracted PDF text and LLM summaries.
+
+    Postings are varint-encoded (doc id deltas and term frequencies) in memory
+    and on disk. Updates are appended to a journal and folded into the
+    snapshot by compact(), so each ingest only writes the new document.
+
+    Queries use MaxScore pruning: terms are scored rarest first, and once no
+    paper outside the current candidates can reach the top results, common
+    terms only update those candidates instead of scanning their postings.
+    """
+
+    def __init__(self, index_dir: str = None, k1: float = 1.2, b: float = 0.75,
+                 compact_after: int = 1000, decoded_cache_postings: int = 4_000_000):
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+        self.compact_after = compact_after
+        self._decoded_cache_postings = decoded_cache_postings
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._reset()
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+            if fcntl is not None:
+                self._lock_file = open(os.path.join(index_dir, "lock"), "a")
+            with self._file_lock(exclusive=False):
+                self._load()
+
+    def _reset(self):
+        self._docs = []  # doc id -> (paper key, source) or None once replaced
+        self._doc_lengths = array("I")
+        self._doc_weights = array("d")  # source weight, 0 once replaced
+        self._norms = array("d")  # BM25 length normalization per doc
+        self._norm_averages = {}  # average lengths the norms were computed with
+        self._doc_ids = {}  # (paper key, source) -> live doc id
+        self._doc_papers = array("I")  # doc id -> paper number
+        self._paper_numbers = {}  # paper key -> paper number
+        self._paper_keys = []  # paper number -> paper key
+        self._source_lengths = Counter()  # source -> total tokens of live docs
+        self._source_counts = Counter()  # source -> number of live docs
+        self._postings = {}  # term -> bytearray
+        self._last_doc = {}  # term -> last doc id appended to its postings
+        self._df = Counter()
+        self.papers = {}  # paper key -> metadata dict
+        self._decoded = OrderedDict()  # term -> decoded postings, LRU
+        self._decoded_postings_count = 0
+        self._journal_entries = 0
+        self._journal_generation = 0  # compactions the journal has been through
+        self._journal_offset = 0  # bytes of the journal applied so far
+        self._journal_stat = None
+
+    def _journal_path(self):
+        return os.path.join(self.index_dir, "journal.ndjson")
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        # Worker processes of a multi-process deployment share index_dir:
+        # appends and compaction take the lock exclusively, reads share it.
+        if self._lock_file is None:
+            yield
+            return
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _sync(self):
+        """
+        Applies journal entries appended by other processes since the last
+        sync, reloading everything if one of them compacted the journal in
+        the meantime. The caller holds both locks.
+        """
+        try:
+            with open(self._journal_path(), "rb") as f:
+                if self._read_journal_header(f) != self._journal_generation:
+                    self._reset()
+                    self._load()
+                    return
+                f.seek(self._journal_offset)
+                self._read_journal(f)
+        except OSError:
+            pass
+
+    def _journal_changed(self) -> bool:
+        # A stat is enough to tell whether another process wrote to the journal.
+        if not self.index_dir:
+            return False
+        try:
+            return self._stat_journal() != self._journal_stat
+        except OSError:
+            return False
+
+    @staticmethod
+    def _read_journal_header(f) -> int:
+        # Returns the generation in the journal's first line and leaves f at
+        # the first entry. Journals written before the header existed, and
+        # the journal of an index never compacted, are generation 0.
+        line = f.readline()
+        try:
+            header = json.loads(line)
+        except ValueError:
+            header = None
+        if isinstance(header, dict) and "generation" in header:
+            return header["generation"]
+        f.seek(0)
+        return 0
+
+    def _read_journal(self, f):
+        # Applies complete entries from the current position of f.
+        offset = f.tell()
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # torn write at the end of the journal, or one in progress
+            offset += len(line)
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            self._apply(entry["key"], entry["source"], Counter(entry["terms"]), entry["paper"])
+            self._journal_entries += 1
+        self._journal_offset = offset
+        self._journal_stat = self._stat_journal()
+
+    def _stat_journal(self):
+        stat = os.stat(self._journal_path())
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def add(self, pdf_url: str, source: str, text: str, metadata: dict = None):
+        """
+        Indexes text for a paper from one source ("metadata", "summary" or
+        "fulltext"), replacing what that source previously contributed.
+        """
+        if source not in SOURCE_WEIGHTS:
+            raise ValueError(f"Unknown index source: {source}")
+        key = paper_key(pdf_url)
+        term_freqs = Counter(tokenize(text))
+        if source == "metadata":
+            # Title words are the best signal we have; count them twice.
+            term_freqs.update(tokenize((metadata or {}).get("title", "")))
+        paper = dict(metadata or {})
+        paper.setdefault("pdf_url", pdf_url)
+        with self._lock, self._file_lock(exclusive=True):
+            if self._journal_changed():
+                # Entries of other processes go first, so replacements apply in journal order.
+                self._sync()
+            self._apply(key, source, term_freqs, paper)
+            if not self.index_dir:
+                return
+            line = (json.dumps({"key": key, "source": source, "terms": term_freqs, "paper": paper}) + "\n").encode("utf-8")
+            try:
+                with open(self._journal_path(), "ab") as f:
+                    f.write(line)
+                self._journal_offset += len(line)
+                self._journal_entries += 1
+                self._journal_stat = self._stat_journal()
+                if self._journal_entries >= self.compact_after:
+                    self.compact()
+            except OSError as e:
+                # The document stays searchable in memory until the next restart.
+                print(f"Error writing local index to {self.index_dir}: {e}")
+
+    def add_paper(self, paper: dict):
+        """
+        Indexes the metadata of a search result (title, authors, summary).
+        """
+        if not paper.get("pdf_url"):
+            return
+        indexed = self.papers.get(paper_key(paper["pdf_url"]))
+        if indexed and "metadata" in indexed["sources"] and all(
+                indexed.get(field) == paper.get(field) for field in ("title", "authors", "summary")):
+            return  # repeated search result
+        text = " ".join(str(paper.get(field) or "") for field in ("title", "authors", "summary"))
+        metadata = {field: paper.get(field) for field in ("title", "authors", "summary", "pdf_url")}
+        self.add(paper["pdf_url"], "metadata", text, metadata)
+
+    def _apply(self, key, source, term_freqs, paper):
+        old_doc = self._doc_ids.get((key, source))
+        if old_doc is not None:
+            # Postings are append-only; the old document is skipped at query
+            # time, and the document frequencies of its terms are recounted
+            # when their postings are next decoded. Decoded postings that
+            # include its paper may include its score, so they are dropped.
+            self._docs[old_doc] = None
+            self._doc_weights[old_doc] = 0.0
+            self._drop_decoded_paper(self._doc_papers[old_doc])
+            self._source_lengths[source] -= self._doc_lengths[old_doc]
+            self._source_counts[source] -= 1
+
+        doc_id = len(self._docs)
+        length = sum(term_freqs.values())
+        self._docs.append((key, source))
+        self._doc_papers.append(self._paper_number(key))
+        self._doc_lengths.append(length)
+        self._doc_weights.append(SOURCE_WEIGHTS[source])
+        self._doc_ids[(key, source)] = doc_id
+        self._source_lengths[source] += length
+        self._source_counts[source] += 1
+        for term, freq in term_freqs.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = bytearray()
+            encode_varint(doc_id - self._last_doc.get(term, 0), postings)
+            encode_varint(freq, postings)
+            self._last_doc[term] = doc_id
+            self._df[term] += 1
+            self._drop_decoded(term)
+
+        existing = self.papers.get(key, {})
+        existing.update({k: v for k, v in paper.items() if v})
+        existing.setdefault("sources", [])
+        if source not in existing["sources"]:
+            existing["sources"].append(source)
+        self.papers[key] = existing
+
+    def _paper_number(self, key):
+        number = self._paper_numbers.get(key)
+        if number is None:
+            number = self._paper_numbers[key] = len(self._paper_keys)
+            self._paper_keys.append(key)
+        return number
+
+    def _drop_decoded(self, term):
+        decoded = self._decoded.pop(term, None)
+        if decoded is not None:
+            self._decoded_postings_count -= len(decoded[0])
+
+    def _drop_decoded_paper(self, paper):
+        stale = []
+        for term, (papers, _, _, _) in self._decoded.items():
+            i = bisect_left(papers, paper)
+            if i < len(papers) and papers[i] == paper:
+                stale.append(term)
+        for term in stale:
+            self._drop_decoded(term)
+
+    def _decoded_postings(self, term):
+        """
+        Returns (paper numbers, contributions, bound, sources) for a term:
+        each paper's BM25 term score before idf, summed over its weighted
+        sources and sorted by paper number, the largest of them, and the
+        sources whose norms they used. Decoded lists are kept in an LRU
+        capped by total postings. The term's document frequency is recounted
+        over live documents on the way.
+        """
+        cached = self._decoded.get(term)
+        if cached is not None:
+            self._decoded.move_to_end(term)
+            return cached
+        postings = self._postings.get(term)
+        if postings is None:
+            return None
+        k1_plus_1 = self.k1 + 1
+        weights, norms, doc_papers = self._doc_weights, self._norms, self._doc_papers
+        contributions = {}
+        source_weights = set()
+        live_docs = 0
+        for doc_id, freq in zip(*decode_postings(postings)):
+            weight = weights[doc_id]
+            if weight:
+                live_docs += 1
+                source_weights.add(weight)
+                paper = doc_papers[doc_id]
+                contributions[paper] = contributions.get(paper, 0.0) + weight * freq * k1_plus_1 / (freq + norms[doc_id])
+        self._df[term] = live_docs
+        papers = array("I", sorted(contributions))
+        # Sources are told apart by weight; any sharing one are all listed.
+        sources = frozenset(source for source, weight in SOURCE_WEIGHTS.items() if weight in source_weights)
+        decoded = (papers, array("d", map(contributions.__getitem__, papers)), max(contributions.values(), default=0.0), sources)
+        self._decoded[term] = decoded
+        self._decoded_postings_count += len(papers)
+        while self._decoded_postings_count > self._decoded_cache_postings and len(self._decoded) > 1:
+            _, evicted = self._decoded.popitem(last=False)
+            self._decoded_postings_count -= len(evicted[0])
+        return decoded
+
+    def _refresh_norms(self):
+        # Norms depend on the average document length of each source. New
+        # documents use the averages of the last full pass; a source's norms
+        # are recomputed once its average drifts by more than 10%, and
+        # decoded postings that used them are dropped.
+        averages = {source: self._source_lengths[source] / count
+                    for source, count in self._source_counts.items() if count}
+        drifted = {source for source, average in averages.items()
+                   if abs(average - self._norm_averages.get(source, 0)) > 0.1 * average}
+        k1, b = self.k1, self.b
+
+        def norm(doc_id):
+            doc = self._docs[doc_id]
+            average = self._norm_averages.get(doc[1], 1) if doc else 1
+            return k1 * (1 - b + b * self._doc_lengths[doc_id] / (average or 1))
+
+        if drifted:
+            self._norm_averages.update((source, averages[source]) for source in drifted)
+            for doc_id, doc in enumerate(self._docs[:len(self._norms)]):
+                if doc and doc[1] in drifted:
+                    self._norms[doc_id] = norm(doc_id)
+            for term in [term for term, (_, _, _, sources) in self._decoded.items() if sources & drifted]:
+                self._drop_decoded(term)
+        for doc_id in range(len(self._norms), len(self._docs)):
+            self._norms.append(norm(doc_id))
+
+    def search(self, query: str, limit: int = 10):
+        """
+        Returns up to limit papers ranked by BM25, each a metadata dict with a
+        "score" field. Scores from a paper's sources are weighted and summed.
+        """
+        terms = set(tokenize(query))
+        if not terms or limit <= 0:
+            return []
+        with self._lock:
+            if self._journal_changed():
+                with self._file_lock(exclusive=False):
+                    self._sync()
+            if not self._doc_ids:
+                return []
+            self._refresh_norms()
+            total_docs = len(self._doc_ids)
+            scored_terms = []
+            for term in terms:
+                postings = self._decoded_postings(term)
+                if postings is not None:
+                    df = self._df[term]
+                    idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+                    scored_terms.append((idf * postings[2], idf, term, postings))
+            scored_terms.sort(key=lambda item: item[0], reverse=True)
+
+            remaining = sum(bound for bound, _, _, _ in scored_terms)
+            scores = {}
+            for bound, idf, _, (papers, contributions, _, _) in scored_terms:
+                threshold = heapq.nlargest(limit, scores.values())[-1] if len(scores) >= limit else None
+                if not scores:
+                    scores = dict(zip(papers, map(idf.__mul__, contributions)))
+                elif threshold is None or remaining > threshold:
+                    get = scores.get
+                    for paper, contribution in zip(papers, contributions):
+                        scores[paper] = get(paper, 0.0) + idf * contribution
+                else:
+                    # Papers not scored yet cannot reach the top results any
+                    # more: drop candidates that cannot either, then add this
+                    # term to the rest only.
+                    for paper in [paper for paper, score in scores.items() if score + remaining < threshold]:
+                        del scores[paper]
+                    if len(scores) * 16 < len(papers):
+                        for paper in scores:
+                            i = bisect_left(papers, paper)
+                            if i < len(papers) and papers[i] == paper:
+                                scores[paper] += idf * contributions[i]
+                    else:
+                        for paper, contribution in zip(papers, contributions):
+                            if paper in scores:
+                                scores[paper] += idf * contribution
+                remaining -= bound
+
+            ranked = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            results = []
+            for number, score in ranked:
+                paper = dict(self.papers.get(self._paper_keys[number], {}))
+                paper["score"] = round(score, 4)
+                results.append(paper)
+            return results
+
+    def compact(self, purge_ratio: float = 0.2):
+        """
+        Writes the index to the on-disk snapshot and starts a new journal.
+        Entries other processes appended are applied first, so the snapshot
+        holds every process's documents. Postings are rewritten without
+        replaced documents only once they make up more than purge_ratio of
+        all documents.
+        """
+        if not self.index_dir:
+            return
+        with self._lock, self._file_lock(exclusive=True):
+            self._sync()
+            replaced = len(self._docs) - len(self._doc_ids)
+            if replaced and replaced > purge_ratio * len(self._docs):
+                self._purge()
+
+            lexicon = {}
+            blob = bytearray()
+            for term, data in self._postings.items():
+                lexicon[term] = [len(blob), len(data), self._last_doc[term], self._df[term]]
+                blob += data
+            meta = {
+                "version": INDEX_VERSION,
+                "docs": [list(doc) if doc else None for doc in self._docs],
+                "doc_lengths": list(self._doc_lengths),
+                "papers": self.papers,
+                "lexicon": lexicon,
+            }
+            self._write_atomic("postings.bin", bytes(blob))
+            self._write_atomic("index.json", json.dumps(meta).encode("utf-8"))
+            # Other processes see the new generation and reload the snapshot.
+            header = (json.dumps({"generation": self._journal_generation + 1}) + "\n").encode("utf-8")
+            self._write_atomic("journal.ndjson", header)
+            self._journal_generation += 1
+            self._journal_offset = len(header)
+            self._journal_entries = 0
+            self._journal_stat = self._stat_journal()
+
+    def _purge(self):
+        # Renumbers the live documents and re-encodes every postings list.
+        live = [(doc_id, doc) for doc_id, doc in enumerate(self._docs) if doc is not None]
+        remap = {old: new for new, (old, _) in enumerate(live)}
+        postings = {}
+        last_doc = {}
+        df = Counter()
+        for term in self._postings:
+            doc_ids, freqs = decode_postings(self._postings[term])
+            out = bytearray()
+            previous = 0
+            for doc_id, freq in zip(doc_ids, freqs):
+                new_id = remap.get(doc_id)
+                if new_id is None:
+                    continue
+                encode_varint(new_id - previous, out)
+                encode_varint(freq, out)
+                previous = new_id
+                df[term] += 1
+            if out:
+                postings[term] = out
+                last_doc[term] = previous
+
+        self._docs = [doc for _, doc in live]
+        self._doc_lengths = array("I", (self._doc_lengths[old] for old, _ in live))
+        self._set_doc_arrays()
+        self._postings = postings
+        self._last_doc = last_doc
+        self._df = df
+
+    def _set_doc_arrays(self):
+        # Rebuilds the per-document lookups derived from self._docs.
+        self._doc_weights = array("d", (SOURCE_WEIGHTS[doc[1]] if doc else 0.0 for doc in self._docs))
+        self._doc_papers = array("I", (self._paper_number(doc[0]) if doc else 0 for doc in self._docs))
+        self._doc_ids = {doc: doc_id for doc_id, doc in enumerate(self._docs) if doc}
+        self._norms = array("d")
+        self._norm_averages = {}
+        self._decoded.clear()
+        self._decoded_postings_count = 0
+
+    def _write_atomic(self, name: str, data: bytes):
+        path = os.path.join(self.index_dir, name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _load(self):
+        meta_path = os.path.join(self.index_dir, "index.json")
+        if os.path.exists(meta_path):
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                with open(os.path.join(self.index_dir, "postings.bin"), "rb") as f:
+                    blob = f.read()
+            except (OSError, ValueError) as e:
+                print(f"Error loading local index from {self.index_dir}: {e}")
+                meta = None
+            if meta and meta.get("version") == INDEX_VERSION:
+                self._docs = [tuple(doc) if doc else None for doc in meta["docs"]]
+                self._doc_lengths = array("I", meta["doc_lengths"])
+                self._set_doc_arrays()
+                for (_, source), doc_id in self._doc_ids.items():
+                    self._source_lengths[source] += self._doc_lengths[doc_id]
+                    self._source_counts[source] += 1
+                self.papers = meta["papers"]
+                for term, (offset, length, last_doc, df) in meta["lexicon"].items():
+                    self._postings[term] = bytearray(blob[offset:offset + length])
+                    self._last_doc[term] = last_doc
+                    self._df[term] = df
+
+        try:
+            with open(self._journal_path(), "rb") as f:
+                self._journal_generation = self._read_journal_header(f)
+                self._read_journal(f)
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "papers": len(self.papers),
+                "documents": len(self._doc_ids),
+                "terms": len(self._postings),
+                "postings_bytes": sum(len(p) for p in self._postings.values()),
+                "journal_entries": self._journal_entries,
+            }
+
+
+def merge_results(local_results, remote_results, limit: int):
+    """
+    Merges local index hits with arXiv results, local first, dropping
+    duplicates of the same paper.
+    """
+    merged = []
+    seen = set()
+    for paper in list(local_results) + list(remote_results):
+        key = paper_key(paper.get("pdf_url") or "") if paper.get("pdf_url") else paper.get("title")
+        if key in seen:
+            continue
+        seen.add(key)
+        merged.append(paper)
+        if len(merged) >= limit:
+            break
+    return merged
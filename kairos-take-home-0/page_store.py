@@ -0,0 +1,220 @@
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+
+from pdf_extraction import EXTRACTOR_VERSION
+from prompt_compaction import find_sections, section_kind
+
+PAGE_FILE_MAGIC = b"KPG1"
+# Magic, page count, metadata length.
+_HEADER = struct.Struct("<4sII")
+# Offset and compressed length of one page frame.
+_INDEX_ENTRY = struct.Struct("<QI")
+_PAGE_RANGE_RE = re.compile(r"^(\d+)(?:\s*-\s*(\d+))?$")
+
+
+class PageSelection:
+    """
+    The pages of a document a summary is limited to: 1-based page numbers
+    and ranges ("1-3,7" or a list of ints), section kinds (e.g.
+    "introduction", "conclusion"; see prompt_compaction.find_sections), or
+    both. key is a canonical string for cache and run keys.
+    """
+
+    def __init__(self, pages=(), sections=()):
+        self.pages = tuple(sorted(set(pages)))  # 0-based
+        self.sections = tuple(sorted({section_kind(name) for name in sections}))
+        parts = []
+        if self.pages:
+            parts.append("pages=" + ",".join(str(page + 1) for page in self.pages))
+        if self.sections:
+            parts.append("sections=" + ",".join(self.sections))
+        self.key = ";".join(parts)
+
+    @classmethod
+    def parse(cls, pages=None, sections=None):
+        """
+        Builds a selection from request fields, or returns None if both are
+        empty. Raises ValueError if either is malformed.
+        """
+        page_numbers = []
+        if isinstance(pages, str):
+            pages = [part for part in pages.split(",") if part.strip()]
+        for part in pages or ():
+            if isinstance(part, int) and not isinstance(part, bool):
+                first = last = part
+            else:
+                match = _PAGE_RANGE_RE.match(str(part).strip())
+                if match is None:
+                    raise ValueError("pages must be page numbers and ranges, e.g. \"1-3,7\"")
+                first = int(match.group(1))
+                last = int(match.group(2) or first)
+            if first < 1 or last < first:
+                raise ValueError("pages must be page numbers and ranges, e.g. \"1-3,7\"")
+            if last - first >= 10000:
+                raise ValueError("page ranges are limited to 10000 pages")
+            page_numbers.extend(range(first - 1, last))
+        if isinstance(sections, str):
+            sections = sections.split(",")
+        if sections is not None and not all(isinstance(name, str) for name in sections):
+            raise ValueError("sections must be a list of section names, e.g. [\"introduction\", \"conclusion\"]")
+        sections = [name for name in sections or () if name.strip()]
+        if not page_numbers and not sections:
+            return None
+        return cls(page_numbers, sections)
+
+    def resolve(self, page_count: int, sections) -> list:
+        """
+        Returns the 0-based page indexes the selection covers in a document
+        with page_count pages and the given find_sections() headings. A
+        section runs from the page of its heading to the page of the next
+        heading.
+        """
+        selected = {page for page in self.pages if page < page_count}
+        wanted = {kind.rstrip("s") for kind in self.sections}
+        for i, section in enumerate(sections):
+            if section["kind"].rstrip("s") in wanted:
+                end = sections[i + 1]["page"] if i + 1 < len(sections) else page_count - 1
+                selected.update(range(section["page"], min(end, page_count - 1) + 1))
+        return sorted(selected)
+
+    def apply(self, pages) -> list:
+        """
+        Returns the selected pages of a fully extracted document.
+        """
+        return [pages[i] for i in self.resolve(len(pages), find_sections(pages))]
+
+
+class PageStore:
+    """
+    On-disk store of the extracted text of PDFs, one file per PDF SHA-256 and
+    extractor version, so a new model or prompt does not mean parsing the
+    PDF again.
+
+    Each file holds a header, JSON metadata (page count and the section
+    headings from find_sections), an index of the offset and length of each
+    page, then every page as its own zlib frame. Reads map the file and
+    decompress only the pages asked for. Files are written to a temp path
+    and renamed into place, and the least recently used are evicted past
+    max_bytes.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 1024 * 1024 * 1024, compression_level: int = 6):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.pages_read = 0
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], f"{sha256}-{EXTRACTOR_VERSION}.pages")
+
+    def read(self, sha256: str, selection: PageSelection = None):
+        """
+        Returns the text of the pages of a stored PDF (only the selected
+        ones, if a selection is given), or None if it is not stored.
+        """
+        path = self._path(sha256)
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                magic, page_count, meta_length = _HEADER.unpack_from(data, 0)
+                if magic != PAGE_FILE_MAGIC:
+                    raise ValueError(f"not a page file: {path}")
+                meta = json.loads(bytes(data[_HEADER.size:_HEADER.size + meta_length]))
+                index_offset = _HEADER.size + meta_length
+                indexes = selection.resolve(page_count, meta["sections"]) if selection else range(page_count)
+                pages = []
+                for i in indexes:
+                    offset, length = _INDEX_ENTRY.unpack_from(data, index_offset + i * _INDEX_ENTRY.size)
+                    pages.append(zlib.decompress(data[offset:offset + length]).decode("utf-8"))
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except (OSError, ValueError, KeyError, struct.error, zlib.error) as e:
+            print(f"Error reading extracted pages from {path}: {e}")
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path, None)  # marks it as recently used
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            self.pages_read += len(pages)
+        return pages
+
+    def put(self, sha256: str, pages):
+        """
+        Stores the text of every page of a PDF.
+        """
+        frames = [zlib.compress(page.encode("utf-8"), self.compression_level) for page in pages]
+        meta = json.dumps({"extractor": EXTRACTOR_VERSION, "sections": find_sections(pages)}).encode("utf-8")
+        offset = _HEADER.size + len(meta) + _INDEX_ENTRY.size * len(frames)
+        index = bytearray()
+        for frame in frames:
+            index += _INDEX_ENTRY.pack(offset, len(frame))
+            offset += len(frame)
+
+        path = self._path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(PAGE_FILE_MAGIC, len(frames), len(meta)))
+            f.write(meta)
+            f.write(index)
+            for frame in frames:
+                f.write(frame)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.stored += 1
+        self._evict()
+
+    def _files(self):
+        files = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".pages"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _evict(self):
+        with self._lock:
+            files = self._files()
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        files = self._files()
+        with self._lock:
+            return {
+                "documents": len(files),
+                "bytes": sum(size for _, size, _ in files),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stored": self.stored,
+                "pages_read": self.pages_read,
+            }
@@ -1,65 +1,288 @@
+import os
 import requests
 import xml.etree.ElementTree as ET
 
-def search_arxiv(query: str, max_results: int = 10):
+from local_index import merge_results
+from search_cache import RateLimitTimeout, SearchCache, TokenBucket
+from semantic_search import EmbeddingError
+from shared_store import SharedTokenBucket, shared_store
+from tracing import span
+
+ARXIV_API_URL = os.getenv("ARXIV_API_URL", "http://export.arxiv.org/api/query")
+ARXIV_MIN_INTERVAL = float(os.getenv("ARXIV_MIN_INTERVAL", "3"))
+# Longest a search may queue behind the rate limiter before giving up.
+ARXIV_MAX_QUEUE_WAIT = float(os.getenv("ARXIV_MAX_QUEUE_WAIT", "60"))
+# Seconds to connect to arXiv, and to wait for each read of a search response.
+ARXIV_CONNECT_TIMEOUT = float(os.getenv("ARXIV_CONNECT_TIMEOUT", "5"))
+ARXIV_TIMEOUT = float(os.getenv("ARXIV_TIMEOUT", "30"))
+# Results per request when harvesting; arXiv allows up to 2000.
+ARXIV_HARVEST_PAGE_SIZE = int(os.getenv("ARXIV_HARVEST_PAGE_SIZE", "200"))
+ARXIV_HARVEST_TIMEOUT = float(os.getenv("ARXIV_HARVEST_TIMEOUT", "60"))
+# arXiv results fetched for semantic re-ranking, so better matches from
+# further down its keyword ranking can reach the first page.
+SEARCH_RERANK_CANDIDATES = int(os.getenv("SEARCH_RERANK_CANDIDATES", "50"))
+
+# arXiv API uses Atom XML format, namespace needs to be handled
+# Atom namespace: http://www.w3.org/2005/Atom
+# arXiv namespace: http://arxiv.org/schemas/atom
+ARXIV_NS = {'atom': 'http://www.w3.org/2005/Atom', 'arxiv': 'http://arxiv.org/schemas/atom'}
+ATOM = '{http://www.w3.org/2005/Atom}'
+ARXIV = '{http://arxiv.org/schemas/atom}'
+OPENSEARCH = '{http://a9.com/-/spec/opensearch/1.1/}'
+ARXIV_SORT_FIELDS = ("relevance", "lastUpdatedDate", "submittedDate")
+
+# Where /search looks: arXiv only, the local index only, or the local index
+# topped up with arXiv results.
+SEARCH_SOURCES = ("arxiv", "local", "hybrid")
+
+# Shared by searches and harvests so connections to arXiv are reused.
+arxiv_session = requests.Session()
+
+
+def build_search_params(query: str, max_results: int = 10, start: int = 0, sort_by: str = None, sort_order: str = "descending") -> dict:
+    """
+    Returns the arXiv API query parameters for a search.
+    """
+    params = {
+        "search_query": f"all:{query}",
+        "start": start,
+        "max_results": max_results
+    }
+    if sort_by:
+        params["sortBy"] = sort_by
+        params["sortOrder"] = sort_order
+    return params
+
+
+def parse_arxiv_feed(content: bytes):
+    """
+    Parses an arXiv Atom response into the list of paper dictionaries returned
+    by search_arxiv. Raises ET.ParseError on malformed XML.
+    """
+    root = ET.fromstring(content)
+    ns = ARXIV_NS
+
+    papers = []
+    for entry in root.findall('atom:entry', ns):
+        title = entry.find('atom:title', ns).text.strip() if entry.find('atom:title', ns) is not None else 'N/A'
+        summary = entry.find('atom:summary', ns).text.strip() if entry.find('atom:summary', ns) is not None else 'N/A'
+        pdf_url = None
+        for link in entry.findall('atom:link', ns):
+            if link.get('title') == 'pdf':
+                pdf_url = link.get('href')
+                break
+
+        authors = []
+        for author_elem in entry.findall('atom:author', ns):
+            name_elem = author_elem.find('atom:name', ns)
+            if name_elem is not None:
+                authors.append(name_elem.text.strip())
+
+        papers.append({
+            "title": title,
+            "authors": ", ".join(authors),
+            "summary": summary,
+            "pdf_url": pdf_url
+        })
+    return papers
+
+
+def fetch_arxiv(query: str, max_results: int = 10, start: int = 0):
+    """
+    Sends one search request to the arXiv API, waiting for a rate limiter
+    token first. Raises requests or XML parse errors instead of swallowing them.
+    """
+    arxiv_rate_limiter.acquire(max_wait=ARXIV_MAX_QUEUE_WAIT)
+    response = arxiv_session.get(ARXIV_API_URL, params=build_search_params(query, max_results, start),
+                                 timeout=(ARXIV_CONNECT_TIMEOUT, ARXIV_TIMEOUT))
+    response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
+    return parse_arxiv_feed(response.content)
+
+
+def _entry_record(entry) -> dict:
+    """
+    Builds a full paper record from a parsed Atom <entry> element.
+    """
+    def text(tag):
+        elem = entry.find(tag)
+        return " ".join(elem.text.split()) if elem is not None and elem.text else None
+
+    entry_id = text(f'{ATOM}id') or ''
+    pdf_url = None
+    for link in entry.findall(f'{ATOM}link'):
+        if link.get('title') == 'pdf':
+            pdf_url = link.get('href')
+            break
+    primary = entry.find(f'{ARXIV}primary_category')
+    return {
+        "id": entry_id.rsplit('/abs/', 1)[-1],
+        "title": text(f'{ATOM}title'),
+        "authors": [" ".join(name.text.split()) for name in entry.iterfind(f'{ATOM}author/{ATOM}name') if name.text],
+        "summary": text(f'{ATOM}summary'),
+        "published": text(f'{ATOM}published'),
+        "updated": text(f'{ATOM}updated'),
+        "primary_category": primary.get('term') if primary is not None else None,
+        "categories": [category.get('term') for category in entry.findall(f'{ATOM}category')],
+        "doi": text(f'{ARXIV}doi'),
+        "journal_ref": text(f'{ARXIV}journal_ref'),
+        "comment": text(f'{ARXIV}comment'),
+        "pdf_url": pdf_url,
+    }
+
+
+def iter_arxiv_records(stream, page_info: dict = None):
+    """
+    Incrementally parses an arXiv Atom response from a file-like object and
+    yields one record per entry. Each entry is discarded once yielded, so
+    memory does not grow with the page size. If page_info is given, it is
+    filled with the feed's totalResults.
+    """
+    root = None
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if root is None:
+            root = elem
+            continue
+        if event != "end":
+            continue
+        if elem.tag == f'{OPENSEARCH}totalResults' and page_info is not None and elem.text:
+            page_info["total_results"] = int(elem.text)
+        elif elem.tag == f'{ATOM}entry':
+            yield _entry_record(elem)
+            root.clear()
+
+
+def harvest_arxiv(query: str, max_results: int = None, start: int = 0, page_size: int = None,
+                  sort_by: str = "submittedDate", sort_order: str = "descending"):
+    """
+    Generator that walks arXiv search results page by page, under the shared
+    rate limit, yielding full paper records (see _entry_record) until
+    max_results records (default: all) have been produced or the results
+    run out. Raises requests or XML parse errors.
+    """
+    page_size = page_size or ARXIV_HARVEST_PAGE_SIZE
+    produced = 0
+    empty_pages = 0
+    while max_results is None or produced < max_results:
+        count = page_size if max_results is None else min(page_size, max_results - produced)
+        page_info = {}
+        arxiv_rate_limiter.acquire()
+        params = build_search_params(query, count, start, sort_by=sort_by, sort_order=sort_order)
+        with arxiv_session.get(ARXIV_API_URL, params=params, stream=True,
+                               timeout=(ARXIV_CONNECT_TIMEOUT, ARXIV_HARVEST_TIMEOUT)) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            page_count = 0
+            for record in iter_arxiv_records(response.raw, page_info):
+                page_count += 1
+                yield record
+        produced += page_count
+        start += page_count
+        total = page_info.get("total_results")
+        if total is not None and start >= total:
+            return
+        if page_count == 0:
+            # arXiv occasionally returns an empty page mid-way; retry it
+            # a couple of times before treating it as the end.
+            empty_pages += 1
+            if empty_pages > 2:
+                return
+        else:
+            empty_pages = 0
+
+
+# arXiv asks clients to send no more than one request every three seconds;
+# with several worker processes the bucket is shared between them.
+if shared_store is not None:
+    arxiv_rate_limiter = SharedTokenBucket(
+        shared_store,
+        "arxiv",
+        rate=1 / ARXIV_MIN_INTERVAL if ARXIV_MIN_INTERVAL > 0 else 0,
+        capacity=int(os.getenv("ARXIV_BURST", "1")),
+    )
+else:
+    arxiv_rate_limiter = TokenBucket(
+        rate=1 / ARXIV_MIN_INTERVAL if ARXIV_MIN_INTERVAL > 0 else 0,
+        capacity=int(os.getenv("ARXIV_BURST", "1")),
+    )
+
+search_cache = SearchCache(
+    fetch_arxiv,
+    max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "512")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "600")),
+    stale_ttl=float(os.getenv("SEARCH_CACHE_STALE_TTL", "3600")),
+    shared=shared_store,
+)
+
+
+def search_arxiv(query: str, max_results: int = 10, start: int = 0, use_cache: bool = True):
     """
     Queries the arXiv API for scientific papers.
 
+    Results are served from an in-process cache; identical concurrent queries
+    share one upstream request and upstream requests are rate limited.
+
     Args:
         query (str): The search query.
         max_results (int): The maximum number of results to return.
+        start (int): Offset of the first result.
+        use_cache (bool): Set to False to always query arXiv.
 
     Returns:
         list: A list of dictionaries, each representing a paper with title, authors, summary, and URL.
     """
-    base_url = "http://export.arxiv.org/api/query?"
-    params = {
-        "search_query": f"all:{query}",
-        "start": 0,
-        "max_results": max_results
-    }
-
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
-        root = ET.fromstring(response.content)
-
-        papers = []
-        # arXiv API uses Atom XML format, namespace needs to be handled
-        # Atom namespace: http://www.w3.org/2005/Atom
-        # arXiv namespace: http://arxiv.org/schemas/atom
-        ns = {'atom': 'http://www.w3.org/2005/Atom', 'arxiv': 'http://arxiv.org/schemas/atom'}
-
-        for entry in root.findall('atom:entry', ns):
-            title = entry.find('atom:title', ns).text.strip() if entry.find('atom:title', ns) is not None else 'N/A'
-            summary = entry.find('atom:summary', ns).text.strip() if entry.find('atom:summary', ns) is not None else 'N/A'
-            pdf_url = None
-            for link in entry.findall('atom:link', ns):
-                if link.get('title') == 'pdf':
-                    pdf_url = link.get('href')
-                    break
-            
-            authors = []
-            for author_elem in entry.findall('atom:author', ns):
-                name_elem = author_elem.find('atom:name', ns)
-                if name_elem is not None:
-                    authors.append(name_elem.text.strip())
-
-            papers.append({
-                "title": title,
-                "authors": ", ".join(authors),
-                "summary": summary,
-                "pdf_url": pdf_url
-            })
-        return papers
+        if use_cache:
+            return search_cache.get(query, max_results, start)
+        return fetch_arxiv(query, max_results, start)
 
     except requests.exceptions.RequestException as e:
         print(f"Error querying arXiv API: {e}")
         return []
+    except RateLimitTimeout as e:
+        print(f"Error querying arXiv API: {e}")
+        return []
     except ET.ParseError as e:
         print(f"Error parsing XML response from arXiv: {e}")
         return []
 
+
+def search_papers(query: str, max_results: int = 10, start: int = 0, source: str = "arxiv", index=None, reranker=None):
+    """
+    Searches arXiv, the local index, or both ("hybrid": local hits first,
+    topped up with arXiv results when there are fewer than max_results).
+    arXiv results are added to the local index as they come in.
+
+    With a reranker (a semantic_search.SemanticIndex), the first
+    SEARCH_RERANK_CANDIDATES arXiv results (or up to the requested page, if
+    further) are re-ordered by similarity to the query before the page is
+    cut from them. If re-ranking fails, arXiv's order is kept.
+    """
+    if source not in SEARCH_SOURCES:
+        raise ValueError(f"source must be one of: {', '.join(SEARCH_SOURCES)}")
+
+    local_results = []
+    if index is not None and source in ("local", "hybrid"):
+        local_results = index.search(query, limit=start + max_results)[start:]
+        if source == "local" or len(local_results) >= max_results:
+            return local_results
+
+    if reranker is None:
+        remote_results = search_arxiv(query, max_results=max_results, start=start)
+    else:
+        remote_results = search_arxiv(query, max_results=max(start + max_results, SEARCH_RERANK_CANDIDATES), start=0)
+    if index is not None:
+        for paper in remote_results:
+            index.add_paper(paper)
+    if reranker is not None:
+        with span("rerank", candidates=len(remote_results)) as rerank_span:
+            try:
+                remote_results = reranker.rerank(query, remote_results)
+            except EmbeddingError as e:
+                rerank_span.fail(str(e))
+                print(f"Error re-ranking search results: {e}")
+        remote_results = remote_results[start:start + max_results]
+    return merge_results(local_results, remote_results, max_results)
+
 if __name__ == "__main__":
     # Example usage:
     print("Searching for 'large language models'...")
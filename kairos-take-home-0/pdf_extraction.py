@@ -0,0 +1,387 @@
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from multiprocessing.connection import wait
+
+# Bump when extraction output changes so anything keyed on extracted text is rebuilt.
+EXTRACTOR_VERSION = "pypdf2-1"
+
+DEFAULT_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "500"))
+DEFAULT_TIMEOUT = float(os.getenv("PDF_EXTRACT_TIMEOUT", "120"))
+# 0 parses in-process, where the timeout is only checked between pages.
+DEFAULT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Pages handed to a worker per task.
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _start_method() -> str:
+    # Forking a multi-threaded host can copy a lock some other thread holds;
+    # the fork server is forked before any of them exist. Windows only spawns.
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _worker_loop(conn):
+    """
+    Worker process entry point: runs (func, args) tasks received on conn and
+    sends back ("ok", result) or ("error", exception) until conn is closed.
+    """
+    while True:
+        try:
+            func, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            reply = ("ok", func(*args))
+        except Exception as e:
+            reply = ("error", e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # The exception could not be pickled.
+            conn.send(("error", RuntimeError(repr(e))))
+
+
+class _Worker:
+    """
+    An extraction worker process and the parent's end of its pipe.
+    """
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_loop, args=(child_conn,), name="pdf-extract", daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def close(self):
+        # The worker exits when it reads EOF.
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class _WorkerPool:
+    """
+    Up to size worker processes, each leased to one document at a time, so
+    a worker stuck on a pathological PDF is killed without failing other
+    documents' tasks. Workers are started on demand and reused.
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._context = multiprocessing.get_context(_start_method())
+        self._idle = []
+        self._leased = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def lease(self, block: bool = True, timeout: float = None):
+        """
+        Returns an idle or new worker, or None if none became available
+        (immediately, unless block, or within timeout seconds).
+        """
+        with self._cond:
+            available = lambda: self._idle or len(self._idle) + self._leased < self.size
+            if not available() and not (block and self._cond.wait_for(available, timeout)):
+                return None
+            self._leased += 1
+            if self._idle:
+                return self._idle.pop()
+        try:
+            return _Worker(self._context)
+        except BaseException:
+            self._forget()
+            raise
+
+    def release(self, worker: _Worker):
+        """
+        Returns an idle worker (one not running a task) to the pool.
+        """
+        with self._cond:
+            if not self._closed and worker.process.is_alive():
+                self._idle.append(worker)
+                worker = None
+            self._leased -= 1
+            self._cond.notify()
+        if worker is not None:
+            worker.close()
+
+    def discard(self, worker: _Worker):
+        """
+        Kills a worker, e.g. one still parsing a PDF whose time ran out.
+        """
+        worker.kill()
+        self._forget()
+
+    def _forget(self):
+        with self._cond:
+            self._leased -= 1
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
+
+
+def _get_pool(workers: int) -> _WorkerPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = _WorkerPool(workers)
+        return _pool
+
+
+def shutdown_pool():
+    """
+    Stops the shared extraction worker processes (they are restarted on next
+    use). Workers busy with a document exit once it is done with them.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def _read_source(pdf_content):
+    """
+    Returns the PDF as bytes or as a filesystem path, whichever is cheaper to
+    hand to a worker process.
+    """
+    if isinstance(pdf_content, (bytes, bytearray)):
+        return bytes(pdf_content)
+    if isinstance(pdf_content, str):
+        return pdf_content
+    if isinstance(pdf_content, io.BytesIO):
+        return pdf_content.getvalue()
+    name = getattr(pdf_content, "name", None)
+    if isinstance(name, str) and os.path.exists(name):
+        return name
+    pdf_content.seek(0)
+    data = pdf_content.read()
+    pdf_content.seek(0)
+    return data
+
+
+def _open_reader(source):
+    # PyPDF2 is imported on first use, so processes that never parse a PDF
+    # (e.g. a host that only serves searches) skip loading it.
+    import PyPDF2
+
+    if isinstance(source, (bytes, bytearray)):
+        return PyPDF2.PdfReader(io.BytesIO(source))
+    return PyPDF2.PdfReader(source)
+
+
+def _extract_page(reader, page_num: int) -> str:
+    try:
+        return reader.pages[page_num].extract_text() or ""
+    except Exception as e:
+        print(f"Error extracting text from PDF page {page_num + 1}: {e}")
+        return ""
+
+
+def _extract_range(source, start: int, stop: int):
+    """
+    Worker entry point: extracts pages [start, stop) and returns their texts.
+    """
+    reader = _open_reader(source)
+    return [_extract_page(reader, page_num) for page_num in range(start, stop)]
+
+
+def _extract_head(source, stop: int):
+    """
+    Worker entry point: returns the page count of the PDF and the texts of
+    its pages before stop, so opening the PDF is also bounded by the timeout.
+    """
+    reader = _open_reader(source)
+    page_count = len(reader.pages)
+    return page_count, [_extract_page(reader, page_num) for page_num in range(min(stop, page_count))]
+
+
+@contextmanager
+def _worker_source(pdf_content):
+    """
+    Yields a path to the PDF for the worker processes, spilling it to a temp
+    file first if it is not already on disk, so each task receives a path
+    rather than a copy of the bytes.
+    """
+    source = _read_source(pdf_content)
+    if isinstance(source, str):
+        yield source
+        return
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(source)
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def iter_page_texts(pdf_content, max_pages: int = None, timeout: float = None, workers: int = None, stats: dict = None):
+    """
+    Yields the text of each page of a PDF in order. Page ranges are extracted
+    in a process pool, so callers can start consuming early pages while later
+    ones are still being parsed, and a worker stuck on a pathological PDF is
+    killed when the timeout expires.
+
+    Args:
+        pdf_content: PDFDownload, BytesIO, bytes, an open binary file, or a
+            path to the PDF.
+        max_pages (int): Stop after this many pages (PDF_MAX_PAGES by default).
+        timeout (float): Give up on the remaining pages after this many seconds
+            (PDF_EXTRACT_TIMEOUT by default), counted from before the PDF is
+            opened.
+        workers (int): Process pool size (PDF_EXTRACT_WORKERS by default); 0
+            parses in-process.
+        stats (dict): If given, "complete" is set to True once every page
+            (up to max_pages) has been yielded, and False if extraction
+            timed out.
+
+    Yields:
+        str: The text of each page ("" for pages without extractable text).
+    """
+    max_pages = DEFAULT_MAX_PAGES if max_pages is None else max_pages
+    timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout if timeout else None
+    workers = DEFAULT_WORKERS if workers is None else workers
+    if stats is None:
+        stats = {}
+    stats["complete"] = False
+
+    if workers <= 0:
+        yield from _iter_in_process(pdf_content, max_pages, deadline, stats)
+        return
+    with _worker_source(pdf_content) as source:
+        yield from _iter_in_pool(source, max_pages, deadline, timeout, workers, stats)
+
+
+def _iter_in_process(pdf_content, max_pages: int, deadline: float, stats: dict):
+    reader = _open_reader(pdf_content)
+    page_count = len(reader.pages)
+    if max_pages and page_count > max_pages:
+        print(f"PDF has {page_count} pages; extracting the first {max_pages}.")
+        page_count = max_pages
+    for page_num in range(page_count):
+        if deadline and time.monotonic() > deadline:
+            print(f"Timed out extracting PDF text after {page_num} pages.")
+            return
+        yield _extract_page(reader, page_num)
+    stats["complete"] = True
+
+
+def _iter_in_pool(source: str, max_pages: int, deadline: float, timeout: float, workers: int, stats: dict):
+    # The first task also opens the PDF and counts its pages; the remaining
+    # ranges are queued once the page count is known. Workers are leased
+    # from the shared pool while this document has tasks left to hand out.
+    head_stop = min(PAGES_PER_TASK, max_pages) if max_pages else PAGES_PER_TASK
+    tasks = [(_extract_head, (source, head_stop))]
+    pending = deque([0])
+    results = {}  # task index -> page texts
+    running = {}  # worker -> task index
+    held = []
+    retried = set()
+    pool = _get_pool(workers)
+    index = 0
+    try:
+        while index < len(tasks):
+            while pending:
+                idle = [worker for worker in held if worker not in running]
+                worker = idle[0] if idle else pool.lease(block=False)
+                if worker is None and not held:
+                    remaining = deadline - time.monotonic() if deadline else None
+                    worker = pool.lease(timeout=max(remaining, 0) if remaining is not None else None)
+                    if worker is None:
+                        print(f"Timed out extracting PDF text after {timeout}s.")
+                        return
+                if worker is None:
+                    break
+                if worker not in held:
+                    held.append(worker)
+                task = pending.popleft()
+                try:
+                    worker.conn.send(tasks[task])
+                except OSError:
+                    # The worker died while idle; the task goes to another.
+                    held.remove(worker)
+                    pool.discard(worker)
+                    pending.appendleft(task)
+                    continue
+                running[worker] = task
+            if not pending:
+                # Nothing left to hand out: let other documents use the spare workers.
+                for worker in [worker for worker in held if worker not in running]:
+                    held.remove(worker)
+                    pool.release(worker)
+
+            if index in results:
+                pages = results.pop(index)
+                index += 1
+                yield from pages
+                continue
+
+            remaining = deadline - time.monotonic() if deadline else None
+            ready = wait([worker.conn for worker in running], timeout=max(remaining, 0) if remaining is not None else None)
+            if not ready:
+                # The workers still running this document's tasks are killed
+                # in the finally clause below.
+                print(f"Timed out extracting PDF text after {timeout}s.")
+                return
+            for worker in [worker for worker in running if worker.conn in ready]:
+                task = running.pop(worker)
+                try:
+                    kind, result = worker.conn.recv()
+                except (EOFError, OSError):
+                    held.remove(worker)
+                    pool.discard(worker)
+                    if task in retried:
+                        print("Error extracting PDF text: a worker process died twice on this PDF.")
+                        return
+                    retried.add(task)
+                    pending.appendleft(task)
+                    continue
+                if kind == "error":
+                    raise result
+                if task == 0:
+                    page_count, result = result
+                    if max_pages and page_count > max_pages:
+                        print(f"PDF has {page_count} pages; extracting the first {max_pages}.")
+                        page_count = max_pages
+                    for start in range(len(result), page_count, PAGES_PER_TASK):
+                        pending.append(len(tasks))
+                        tasks.append((_extract_range, (source, start, min(start + PAGES_PER_TASK, page_count))))
+                results[task] = result
+        stats["complete"] = True
+    finally:
+        # Workers still busy here are stuck past the deadline, or were
+        # abandoned by a consumer that stopped early; either way they are
+        # killed rather than waited for.
+        for worker in held:
+            if worker in running:
+                pool.discard(worker)
+            else:
+                pool.release(worker)
+
+
+def extract_pages(pdf_content, **kwargs):
+    """
+    Returns the list of page texts of a PDF. See iter_page_texts for options.
+    """
+    return list(iter_page_texts(pdf_content, **kwargs))
@@ -1,102 +1,248 @@
 import requests
-import PyPDF2
-import io
+import hashlib
 import os
+import tempfile
+import threading
+import time
 from dotenv import load_dotenv
-import google.generativeai as genai
-import anthropic # Add this import
+
+from blob_store import BlobStore
+from llm_providers import LLMError
+from llm_routing import LLMRouter, llm_targets
+from pdf_extraction import iter_page_texts
 
 # Load environment variables from .env file
 load_dotenv()
 
-def download_pdf(pdf_url: str) -> io.BytesIO or None:
+# Bump PROMPT_VERSION whenever SUMMARY_PROMPT changes so cached summaries
+# produced with the old prompt are not replayed.
+PROMPT_VERSION = "1"
+SUMMARY_PROMPT = "Summarize the following text:\n\n{text}"
+
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", 100 * 1024 * 1024))
+PDF_DOWNLOAD_TIMEOUT = float(os.getenv("PDF_DOWNLOAD_TIMEOUT", "60"))
+PDF_CONNECT_TIMEOUT = float(os.getenv("PDF_CONNECT_TIMEOUT", "10"))
+# Downloads larger than this are spooled to a temp file instead of kept in RAM.
+PDF_SPOOL_MAX_MEMORY = int(os.getenv("PDF_SPOOL_MAX_MEMORY", 8 * 1024 * 1024))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+blob_store = BlobStore(
+    os.getenv("PDF_BLOB_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".pdf_blobs")),
+    max_bytes=int(os.getenv("PDF_BLOB_STORE_MAX_BYTES", 2 * 1024 * 1024 * 1024)),
+)
+
+# Every LLM call in the process goes through this router. Its adaptive
+# concurrency limits are kept per process; with LLM_CONCURRENCY_PROCESSES
+# workers (set by gunicorn.conf.py) each takes an equal share of the
+# configured initial and maximum limits, so they bound the whole deployment.
+_llm_processes = max(1, int(os.getenv("LLM_CONCURRENCY_PROCESSES", "1")))
+llm_router = LLMRouter(
+    first_token_timeout=float(os.getenv("LLM_FIRST_TOKEN_TIMEOUT", "30")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+    retry_base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5")),
+    retry_max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "8")),
+    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "60")),
+    limiter_options={
+        "initial": float(os.getenv("LLM_CONCURRENCY_INITIAL", "8")) / _llm_processes,
+        "min_limit": int(os.getenv("LLM_CONCURRENCY_MIN", "1")),
+        "max_limit": int(os.getenv("LLM_CONCURRENCY_MAX", "64")) // _llm_processes,
+        "latency_target": float(os.getenv("LLM_LATENCY_TARGET", "10")),
+    },
+)
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """
+    Returns the process-wide keep-alive session used for PDF downloads.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=int(os.getenv("PDF_HTTP_POOL_SIZE", "32")))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+        return _http_session
+
+
+class PDFDownload:
+    """
+    A downloaded PDF: a seekable binary file plus its size and SHA-256.
+
+    path is set when the bytes live in the blob store on disk; otherwise the
+    content is in a spooled temp file (in memory below PDF_SPOOL_MAX_MEMORY).
+    """
+
+    def __init__(self, fileobj, size: int, sha256: str, path: str = None, not_modified: bool = False):
+        self.file = fileobj
+        self.size = size
+        self.sha256 = sha256
+        self.path = path
+        self.name = path
+        self.not_modified = not_modified
+
+    def read(self, *args):
+        return self.file.read(*args)
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DownloadLimitError(Exception):
+    pass
+
+
+def _iter_within(response, deadline: float, timeout: float):
     """
-    Downloads a PDF from the given URL and returns its content as a BytesIO object.
+    Yields the chunks of a streamed response, shutting its socket down if
+    the body has not all arrived by deadline. requests only bounds each
+    read, so without this a server trickling bytes could hold a download
+    open far past its total time limit.
     """
+    expired = threading.Event()
+
+    def expire():
+        expired.set()
+        try:
+            response.raw.shutdown()
+        except (RuntimeError, ValueError, OSError):
+            pass  # the body was read and the connection released meanwhile
+
+    timer = threading.Timer(max(deadline - time.monotonic(), 0), expire)
+    timer.daemon = True
+    timer.start()
     try:
-        response = requests.get(pdf_url, stream=True)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        pdf_content = io.BytesIO(response.content)
-        return pdf_content
-    except requests.exceptions.RequestException as e:
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+            if expired.is_set():
+                break
+            yield chunk
+    except requests.exceptions.RequestException:
+        if not expired.is_set():
+            raise
+    finally:
+        timer.cancel()
+    # A shut down socket reads as the end of the body.
+    if expired.is_set():
+        raise DownloadLimitError(f"PDF download exceeded {timeout}s")
+
+
+def download_pdf(pdf_url: str, max_bytes: int = None, timeout: float = None) -> PDFDownload or None:
+    """
+    Streams a PDF from the given URL into a spooled temp file, enforcing a size
+    and total time limit. Re-downloads of a URL already in the blob store are
+    conditional requests, so an unchanged PDF is served from disk.
+
+    Args:
+        pdf_url (str): The URL to download.
+        max_bytes (int): Maximum PDF size (PDF_MAX_BYTES by default).
+        timeout (float): Maximum total download time in seconds (PDF_DOWNLOAD_TIMEOUT by default).
+
+    Returns:
+        PDFDownload or None: The PDF, or None if the download failed.
+    """
+    max_bytes = PDF_MAX_BYTES if max_bytes is None else max_bytes
+    timeout = PDF_DOWNLOAD_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    stored = blob_store.lookup(pdf_url)
+
+    try:
+        with get_http_session().get(pdf_url, stream=True, timeout=(PDF_CONNECT_TIMEOUT, timeout),
+                                    headers=blob_store.conditional_headers(stored)) as response:
+            if response.status_code == 304 and stored:
+                return PDFDownload(blob_store.open(stored), stored["size"], stored["sha256"], path=stored["path"], not_modified=True)
+            response.raise_for_status()  # Raise an exception for HTTP errors
+
+            content_length = response.headers.get("Content-Length")
+            if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                raise DownloadLimitError(f"PDF is {content_length} bytes, over the {max_bytes} byte limit")
+
+            spool = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_MEMORY)
+            digest = hashlib.sha256()
+            size = 0
+            chunks = _iter_within(response, deadline, timeout)
+            try:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise DownloadLimitError(f"PDF exceeds the {max_bytes} byte limit")
+                    digest.update(chunk)
+                    spool.write(chunk)
+                spool.seek(0)
+            except BaseException:
+                chunks.close()
+                spool.close()
+                raise
+
+            sha256 = digest.hexdigest()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                try:
+                    path = blob_store.put(pdf_url, spool, sha256, size, etag=etag, last_modified=last_modified)
+                    spool.close()
+                    return PDFDownload(open(path, "rb"), size, sha256, path=path)
+                except OSError as e:
+                    print(f"Error storing PDF from {pdf_url} in blob store: {e}")
+            return PDFDownload(spool, size, sha256)
+    except (requests.exceptions.RequestException, DownloadLimitError) as e:
         print(f"Error downloading PDF from {pdf_url}: {e}")
         return None
 
-def extract_text_from_pdf(pdf_content: io.BytesIO) -> str:
+def extract_pages_from_pdf(pdf_content, stats: dict = None) -> list:
     """
-    Extracts text from a PDF BytesIO object.
+    Extracts the text of each page of a downloaded PDF (PDFDownload, BytesIO or path). Pages are parsed
+    in parallel; see pdf_extraction.iter_page_texts to consume them one at a time, and for stats.
     """
-    text = ""
+    pages = []
     try:
-        reader = PyPDF2.PdfReader(pdf_content)
-        for page_num in range(len(reader.pages)):
-            page = reader.pages[page_num]
-            text += page.extract_text() or ""
+        for page_text in iter_page_texts(pdf_content, stats=stats):
+            pages.append(page_text)
     except Exception as e:
         print(f"Error extracting text from PDF: {e}")
-    return text
+    return pages
 
-def summarize_text_with_llm(text: str):
+def extract_text_from_pdf(pdf_content) -> str:
     """
-    Summarizes the given text using an LLM based on environment variables,
-    streaming the response.
+    Extracts text from a downloaded PDF (PDFDownload, BytesIO or path) as one string.
     """
-    llm_provider = os.getenv("LLM_PROVIDER")
-    llm_model = os.getenv("LLM_MODEL")
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    anthropic_api_key = os.getenv("ANTHROPIC_API_KEY")
+    return "".join(extract_pages_from_pdf(pdf_content))
 
-    if not llm_provider or not llm_model:
-        yield "Error: LLM configuration missing (LLM_PROVIDER or LLM_MODEL)."
-        return
+def stream_llm(prompt: str):
+    """
+    Streams the completion of a raw prompt from the LLM configured through
+    environment variables, using the provider's shared client (see
+    llm_providers). Calls go through llm_router, which limits concurrency per
+    provider, retries and fails over to LLM_FALLBACK. Raises LLMError on
+    configuration or provider errors.
+    """
+    yield from llm_router.stream(prompt, llm_targets())
 
-    if llm_provider == "gemini":
-        if not google_api_key:
-            yield "Error: GOOGLE_API_KEY not set for Gemini provider."
-            return
-        try:
-            genai.configure(api_key=google_api_key)
-            model = genai.GenerativeModel(llm_model)
-            response_stream = model.generate_content(f"Summarize the following text:\n\n{text}", stream=True)
-            for chunk in response_stream:
-                yield chunk.text
-        except Exception as e:
-            if "404 models" in str(e) and "is not found" in str(e):
-                error_message = f"Error summarizing with Gemini: {e}\nPlease update LLM_MODEL in your .env file with one of the available models listed above."
-                yield error_message
-                print("\n--- Available Gemini Models ---")
-                try:
-                    for m in genai.list_models():
-                        if 'generateContent' in m.supported_generation_methods:
-                            print(m.name)
-                except Exception as list_error:
-                    print(f"Error listing models: {list_error}")
-                print("-----------------------------")
-            else:
-                yield f"Error summarizing with Gemini: {e}"
-    elif llm_provider == "openai":
-        # TODO: Implement OpenAI streaming integration here
-        yield "OpenAI streaming integration not yet implemented."
-    elif llm_provider == "anthropic":
-        if not anthropic_api_key:
-            yield "Error: ANTHROPIC_API_KEY not set for Anthropic provider."
-            return
-        try:
-            client = anthropic.Anthropic(api_key=anthropic_api_key)
-            with client.messages.stream(
-                model=llm_model,
-                max_tokens=1024,
-                messages=[
-                    {"role": "user", "content": f"Summarize the following text:\n\n{text}"}
-                ]
-            ) as stream:
-                for text_chunk in stream.text_stream:
-                    yield text_chunk
-        except Exception as e:
-            yield f"Error summarizing with Anthropic: {e}"
-    else:
-        yield f"Unsupported LLM provider: {llm_provider}"
 
+def summarize_text_with_llm(text: str):
+    """
+    Summarizes the given text using an LLM based on environment variables,
+    streaming the response.
+    """
+    try:
+        yield from stream_llm(SUMMARY_PROMPT.format(text=text))
+    except LLMError as e:
+        yield str(e)
 
 if __name__ == "__main__":
     # Example usage:
@@ -0,0 +1,252 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class PrefetchedPDF:
+    """
+    The extracted text of a prefetched PDF: one string per page, plus the
+    size and SHA-256 of the downloaded file. complete is False if extraction
+    timed out before the last page.
+    """
+
+    __slots__ = ("pages", "size", "sha256", "complete", "text_bytes")
+
+    def __init__(self, pages, size: int, sha256: str, complete: bool = True):
+        self.pages = pages
+        self.size = size
+        self.sha256 = sha256
+        self.complete = complete
+        # Characters rather than encoded bytes; close enough for the memory cap.
+        self.text_bytes = sum(len(page) for page in pages)
+
+
+class _Entry:
+    __slots__ = ("pdf_url", "state", "future", "cancelled", "done", "result", "created_at", "claimed")
+
+    def __init__(self, pdf_url: str):
+        self.pdf_url = pdf_url
+        self.state = "queued"  # then "running" and "ready"
+        self.future = None
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self.result = None
+        self.created_at = time.monotonic()
+        self.claimed = False
+
+
+class Prefetcher:
+    """
+    Downloads and extracts PDFs in the background ahead of the summarize
+    request that is likely to follow a search, keeping their text in a
+    bounded in-memory cache.
+
+    Each PDF is fetched with fetch(pdf_url, cancelled), which returns a
+    PrefetchedPDF, or None if the cancelled event was set part-way. At most
+    `workers` fetches run at once and at most max_pending wait for a worker;
+    the oldest waiting ones are cancelled to make room for new searches.
+    Ready entries are evicted oldest first to keep their text under
+    max_bytes, and entries not taken within ttl_seconds are cancelled.
+
+    If summarize(pdf_url, prefetched) is given, ready entries are also
+    summarized in the background, one at a time and only while no foreground
+    request is running, so the summarize request itself is a cache hit. The
+    entries stay in the cache, since for PDFs without an arXiv ID the
+    summary is found by the SHA-256 of the file.
+    """
+
+    def __init__(self, fetch, workers: int = 2, max_bytes: int = 64 * 1024 * 1024, max_pending: int = 8,
+                 ttl_seconds: float = 300, summarize=None):
+        self.fetch = fetch
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self.summarize = summarize
+        self._entries = OrderedDict()  # pdf_url -> _Entry, oldest first
+        self._bytes = 0
+        self._lock = threading.Lock()  # guards everything below
+        self._idle = threading.Condition(self._lock)
+        self._foreground = 0
+        self._to_summarize = deque()
+        self._executor = None
+        self._counts = {"queued": 0, "hits": 0, "waits": 0, "misses": 0, "failed": 0,
+                        "cancelled": 0, "expired": 0, "evicted": 0, "presummarized": 0}
+
+    def _start(self):
+        # Caller holds the lock.
+        if self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prefetch")
+        if self.summarize is not None:
+            threading.Thread(target=self._summarize_loop, name="presummarize", daemon=True).start()
+
+    def prefetch(self, pdf_urls) -> int:
+        """
+        Queues the PDFs that are not already prefetched or in flight, and
+        restarts the expiry clock of those that are. Returns how many were
+        queued.
+        """
+        queued = 0
+        with self._lock:
+            self._start()
+            self._expire()
+            for pdf_url in pdf_urls:
+                if not pdf_url:
+                    continue
+                entry = self._entries.get(pdf_url)
+                if entry is not None:
+                    entry.created_at = time.monotonic()
+                    self._entries.move_to_end(pdf_url)
+                    continue
+                entry = self._entries[pdf_url] = _Entry(pdf_url)
+                entry.future = self._executor.submit(self._run, entry)
+                queued += 1
+            self._counts["queued"] += queued
+            pending = [entry for entry in self._entries.values() if entry.state == "queued"]
+            excess = len(pending) - self.max_pending
+            if excess > 0:
+                # Earlier searches make room first, then this one's lowest-ranked results.
+                current = set(pdf_urls)
+                victims = [entry for entry in pending if entry.pdf_url not in current]
+                victims += [entry for entry in reversed(pending) if entry.pdf_url in current]
+                for entry in victims[:excess]:
+                    self._cancel(entry, "cancelled")
+        return queued
+
+    def take(self, pdf_url: str, timeout: float = None):
+        """
+        Removes and returns the PrefetchedPDF for pdf_url, or None. A fetch
+        already running is waited for (up to timeout seconds); one still
+        waiting for a worker is cancelled, as the caller is about to do the
+        same work itself.
+        """
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(pdf_url)
+            if entry is None or entry.state == "queued":
+                if entry is not None:
+                    self._cancel(entry, "cancelled")
+                self._counts["misses"] += 1
+                return None
+            del self._entries[pdf_url]
+            if entry.state == "ready":
+                self._bytes -= entry.result.text_bytes
+                self._counts["hits"] += 1
+                return entry.result
+            entry.claimed = True
+            self._counts["waits"] += 1
+        if not entry.done.wait(timeout):
+            entry.cancelled.set()
+            return None
+        return entry.result
+
+    @contextmanager
+    def foreground(self):
+        """
+        Marks a user request as running; background summarization waits until
+        none are.
+        """
+        with self._lock:
+            self._foreground += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._foreground -= 1
+                if not self._foreground:
+                    self._idle.notify_all()
+
+    def _run(self, entry: _Entry):
+        with self._lock:
+            if entry.cancelled.is_set():
+                return
+            entry.state = "running"
+        result = None
+        try:
+            result = self.fetch(entry.pdf_url, entry.cancelled)
+        except Exception as e:
+            print(f"Error prefetching {entry.pdf_url}: {e}")
+        with self._lock:
+            entry.result = result
+            entry.done.set()
+            if entry.claimed or self._entries.get(entry.pdf_url) is not entry:
+                # Taken by a waiting request, or cancelled while running.
+                return
+            if result is None:
+                del self._entries[entry.pdf_url]
+                self._counts["failed"] += 1
+                return
+            entry.state = "ready"
+            self._bytes += result.text_bytes
+            self._evict()
+            if self.summarize is not None and self._entries.get(entry.pdf_url) is entry:
+                self._to_summarize.append(entry.pdf_url)
+                self._idle.notify_all()
+
+    def _summarize_loop(self):
+        while True:
+            with self._idle:
+                while not self._to_summarize or self._foreground:
+                    self._idle.wait()
+                pdf_url = self._to_summarize.popleft()
+                entry = self._entries.get(pdf_url)
+                if entry is None or entry.state != "ready":
+                    continue
+            try:
+                self.summarize(pdf_url, entry.result)
+            except Exception as e:
+                print(f"Error presummarizing {pdf_url}: {e}")
+                continue
+            with self._lock:
+                self._counts["presummarized"] += 1
+
+    def _drop(self, entry: _Entry):
+        # Caller holds the lock.
+        if self._entries.get(entry.pdf_url) is entry:
+            del self._entries[entry.pdf_url]
+            if entry.state == "ready":
+                self._bytes -= entry.result.text_bytes
+
+    def _cancel(self, entry: _Entry, reason: str):
+        # Caller holds the lock. A fetch that has started stops at its next
+        # check of the cancelled event.
+        entry.cancelled.set()
+        if entry.future is not None:
+            entry.future.cancel()
+        self._drop(entry)
+        self._counts[reason] += 1
+
+    def _expire(self):
+        # Caller holds the lock; entries are in prefetch order.
+        deadline = time.monotonic() - self.ttl_seconds
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.created_at > deadline:
+                break
+            self._cancel(entry, "expired")
+
+    def _evict(self):
+        # Caller holds the lock.
+        for entry in list(self._entries.values()):
+            if self._bytes <= self.max_bytes:
+                break
+            if entry.state == "ready":
+                self._drop(entry)
+                self._counts["evicted"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire()
+            states = [entry.state for entry in self._entries.values()]
+            return {
+                "entries": len(states),
+                "ready": states.count("ready"),
+                "running": states.count("running"),
+                "pending": states.count("queued"),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                **self._counts,
+            }
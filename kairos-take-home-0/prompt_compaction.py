@@ -0,0 +1,434 @@
+import os
+import re
+from collections import Counter
+
+from chunked_summarizer import DEFAULT_MAX_INPUT_TOKENS, estimate_tokens
+
+# Bump whenever compaction output changes so cached summaries of the old
+# prompt text are not replayed.
+COMPACTION_VERSION = "2"
+COMPACTION_ENABLED = os.getenv("SUMMARY_COMPACTION", "1").lower() not in ("0", "false", "no", "off")
+
+# Single-prompt token budgets by model name prefix (first match wins);
+# SUMMARY_TOKEN_BUDGET overrides them for every model.
+MODEL_TOKEN_BUDGETS = (
+    ("gpt-3.5", 12_000),
+    ("gpt-4o", 100_000),
+    ("gpt-4", 100_000),
+    ("claude", 150_000),
+    ("gemini", 200_000),
+)
+DEFAULT_TOKEN_BUDGET = DEFAULT_MAX_INPUT_TOKENS
+
+# Lines this close to the top or bottom of a page are checked for running
+# headers and footers, which must repeat on this share of pages (and on at
+# least MIN_BOILERPLATE_PAGES pages) to be dropped.
+EDGE_LINES = 3
+BOILERPLATE_PAGE_RATIO = 0.5
+MIN_BOILERPLATE_PAGES = 3
+# Pages buffered before a page stream starts emitting, to learn its
+# boilerplate. A references or acknowledgments heading on them is a table of
+# contents entry unless the document ends within them.
+STREAM_WARMUP_PAGES = 6
+# Rows of a numeric table that are kept before the rest is elided.
+TABLE_KEEP_ROWS = 3
+# Sections that do not fit the budget are cut, if at least this many tokens
+# of them fit, or dropped otherwise.
+MIN_PARTIAL_SECTION_TOKENS = 200
+
+_SPACE_RE = re.compile(r"[ \t\r\f\v\u00a0]+")
+_DIGITS_RE = re.compile(r"\d+")
+_PAGE_NUMBER_RE = re.compile(r"^(?:page\s*)?\d{1,4}(?:\s*(?:of|/)\s*\d{1,4})?$", re.IGNORECASE)
+_HYPHEN_BREAK_RE = re.compile(r"(?<=[^\W\d_])-\n(?=[a-z])")
+_NUMERIC_TOKEN_RE = re.compile(r"[-+±(]?[\d.,]*\d[\d.,]*%?[)*]?")
+_HEADING_RE = re.compile(
+    r"^(?:(?:\d+(?:\.\d+)*|[IVX]+|[A-H])[.)]?\s+)?"
+    r"(abstract|introduction|background|related work|preliminaries|methods?|methodology|approach|"
+    r"experiments?|experimental setup|evaluation|results?|discussion|limitations|conclusions?|"
+    r"concluding remarks|summary|future work|acknowledge?ments?|references|bibliography|"
+    r"works cited|literature cited|appendix|appendices|supplementary material)"
+    r"(?:\s+(?:and|&)\s+[a-z ]{1,30})?\s*[:.]?$",
+    re.IGNORECASE,
+)
+_INLINE_ABSTRACT_RE = re.compile(r"^abstract\b", re.IGNORECASE)
+MAX_HEADING_CHARS = 60
+
+# Lower keeps first when the document is over budget; None drops the section.
+SECTION_PRIORITIES = {
+    "preamble": 0,
+    "abstract": 0,
+    "introduction": 1,
+    "conclusion": 1,
+    "discussion": 2,
+    "limitations": 2,
+    "future work": 2,
+    "results": 3,
+    "evaluation": 3,
+    "experiments": 3,
+    "appendix": 5,
+    "acknowledgments": None,
+    "references": None,
+}
+DEFAULT_SECTION_PRIORITY = 4
+_SECTION_KINDS = {
+    "conclusions": "conclusion", "concluding remarks": "conclusion", "summary": "conclusion",
+    "result": "results", "experiment": "experiments", "experimental setup": "experiments",
+    "acknowledgements": "acknowledgments", "acknowledgement": "acknowledgments", "acknowledgment": "acknowledgments",
+    "bibliography": "references", "works cited": "references", "literature cited": "references",
+    "appendices": "appendix", "supplementary material": "appendix",
+}
+
+
+def token_budget_for_model(model: str) -> int:
+    """
+    Returns the single-prompt token budget for an LLM model name.
+    """
+    override = os.getenv("SUMMARY_TOKEN_BUDGET")
+    if override:
+        return int(override)
+    model = (model or "").lower()
+    for prefix, budget in MODEL_TOKEN_BUDGETS:
+        if model.startswith(prefix):
+            return budget
+    return DEFAULT_TOKEN_BUDGET
+
+
+def auto_chunk_tokens(model: str) -> int:
+    """
+    Returns the size above which "auto" mode chunks a document for an LLM
+    model: SUMMARY_MAX_INPUT_TOKENS, or the model's budget if smaller, so
+    that a document is chunked rather than cut to fit a single prompt.
+    """
+    return min(DEFAULT_MAX_INPUT_TOKENS, token_budget_for_model(model))
+
+
+def _new_stats() -> dict:
+    return {"tokens_before": 0, "tokens_after": 0, "tokens_saved": 0, "boilerplate_lines": 0,
+            "reference_lines": 0, "table_rows": 0, "truncated_sections": 0, "dropped_sections": 0}
+
+
+def _normalize_lines(page: str):
+    lines = []
+    for line in page.split("\n"):
+        line = _SPACE_RE.sub(" ", line).strip()
+        if line:
+            lines.append(line)
+    return lines
+
+
+def _boilerplate_key(line: str) -> str:
+    # Page numbers inside running headers ("Preprint. 7") vary per page.
+    return _DIGITS_RE.sub("#", line.lower())
+
+
+def _edge_keys(lines):
+    edges = lines if len(lines) <= 2 * EDGE_LINES else lines[:EDGE_LINES] + lines[-EDGE_LINES:]
+    return {_boilerplate_key(line) for line in edges}
+
+
+def _strip_edges(lines, boilerplate: set, stats: dict):
+    # Drops boilerplate and bare page numbers from the top and bottom of a page.
+    def removable(line):
+        return _PAGE_NUMBER_RE.match(line) is not None or _boilerplate_key(line) in boilerplate
+
+    start, end = 0, len(lines)
+    while start < end and start < EDGE_LINES and removable(lines[start]):
+        start += 1
+    while end > start and len(lines) - end < EDGE_LINES and removable(lines[end - 1]):
+        end -= 1
+    stats["boilerplate_lines"] += len(lines) - (end - start)
+    return lines[start:end]
+
+
+def _is_table_row(line: str) -> bool:
+    if _DIGITS_RE.search(line) is None:
+        return False
+    tokens = line.split()
+    if len(tokens) < 3:
+        return False
+    numeric = sum(1 for token in tokens if _NUMERIC_TOKEN_RE.fullmatch(token))
+    return numeric * 2 >= len(tokens)
+
+
+def _heading_kind(line: str):
+    if len(line) <= MAX_HEADING_CHARS:
+        match = _HEADING_RE.match(line)
+        if match:
+            kind = match.group(1).lower()
+            return _SECTION_KINDS.get(kind, kind)
+    if _INLINE_ABSTRACT_RE.match(line):
+        return "abstract"
+    return None
+
+
+def section_kind(name: str) -> str:
+    """
+    Returns the normalized kind of a section name ("Conclusions" ->
+    "conclusion"), as find_sections reports it.
+    """
+    name = _SPACE_RE.sub(" ", name).strip().lower()
+    return _SECTION_KINDS.get(name, name)
+
+
+def _is_dropped(kind: str) -> bool:
+    return SECTION_PRIORITIES.get(kind, DEFAULT_SECTION_PRIORITY) is None
+
+
+def _last_dropped_headings(page_lines) -> set:
+    # (page, line) of the last references and acknowledgments heading. An
+    # earlier one is a table of contents entry or a mention in the text.
+    last = {}
+    for page, lines in enumerate(page_lines):
+        for i, line in enumerate(lines):
+            kind = _heading_kind(line)
+            if kind is not None and _is_dropped(kind):
+                last[kind] = (page, i)
+    return set(last.values())
+
+
+def find_sections(pages):
+    """
+    Returns the section headings of a document in order, as dicts with
+    "kind" (see section_kind), "heading" and the 0-based "page" they are on.
+    A heading of the same kind as the one before it is not repeated.
+    """
+    sections = []
+    for page_num, page in enumerate(pages):
+        for line in _normalize_lines(page):
+            kind = _heading_kind(line)
+            if kind is not None and not (sections and sections[-1]["kind"] == kind):
+                sections.append({"kind": kind, "heading": line[:MAX_HEADING_CHARS], "page": page_num})
+    return sections
+
+
+class CompactedDocument:
+    """
+    A compacted document as a list of sections, each a dict with "kind",
+    "heading" and "lines", in document order. render() joins them, fitting
+    the text to a token budget if one is given. stats counts what was removed.
+    """
+
+    def __init__(self, sections, stats: dict):
+        self.sections = sections
+        self.stats = stats
+        self.tokens = sum(section["tokens"] for section in sections)
+
+    def render(self, token_budget: int = None) -> str:
+        sections = self.sections
+        if token_budget is not None and self.tokens > token_budget:
+            sections = self._fit(token_budget)
+        text = _HYPHEN_BREAK_RE.sub("", "\n".join("\n".join(section["lines"]) for section in sections if section["lines"]))
+        self.stats["tokens_after"] = estimate_tokens(text)
+        self.stats["tokens_saved"] = max(0, self.stats["tokens_before"] - self.stats["tokens_after"])
+        return text
+
+    def _fit(self, token_budget: int):
+        # Keeps whole sections in priority order (then document order) while
+        # they fit; the first one that does not is cut at a line boundary.
+        def priority(i):
+            # Dropped sections are down to their marker, which always stays.
+            value = SECTION_PRIORITIES.get(self.sections[i]["kind"], DEFAULT_SECTION_PRIORITY)
+            return (-1 if value is None else value, i)
+
+        order = sorted(range(len(self.sections)), key=priority)
+        # Dropped and cut sections leave a short marker behind.
+        remaining = token_budget - 16 * len(self.sections)
+        kept = [None] * len(self.sections)
+        for i in order:
+            section = self.sections[i]
+            if section["tokens"] <= remaining:
+                kept[i] = section["lines"]
+                remaining -= section["tokens"]
+            elif remaining >= MIN_PARTIAL_SECTION_TOKENS:
+                lines, used = [], 0
+                for line in section["lines"]:
+                    cost = estimate_tokens(line) + 1
+                    if used + cost > remaining - 16:  # room for the marker
+                        break
+                    lines.append(line)
+                    used += cost
+                omitted = section["tokens"] - used
+                kept[i] = lines + [f"[... {omitted} tokens of this section omitted ...]"]
+                remaining = 0
+                self.stats["truncated_sections"] += 1
+            else:
+                heading = section["heading"] or section["kind"]
+                kept[i] = [f"[Section omitted: {heading}]"]
+                self.stats["dropped_sections"] += 1
+        return [dict(section, lines=lines) for section, lines in zip(self.sections, kept)]
+
+
+class _SectionBuilder:
+    """
+    Splits normalized page lines into sections, replacing the references and
+    acknowledgments with a marker and eliding long runs of numeric table
+    rows. With emit set, kept lines are passed to it instead of being stored.
+    drop_at is the set of (page, line) positions of the headings that start
+    a dropped section; others are kept as text. None drops at every one.
+    """
+
+    def __init__(self, stats: dict, emit=None, drop_at=None):
+        self.stats = stats
+        self.emit = emit
+        self.drop_at = drop_at
+        self.sections = []
+        self._start_section("preamble", None)
+        self._table_run = 0
+
+    def _start_section(self, kind: str, heading):
+        self.current = {"kind": kind, "heading": heading, "lines": [], "tokens": 0}
+        self.sections.append(self.current)
+
+    def _append(self, line: str):
+        if self.emit is not None:
+            self.emit(line)
+            return
+        self.current["lines"].append(line)
+        self.current["tokens"] += estimate_tokens(line) + 1
+
+    def flush_table(self):
+        elided = self._table_run - TABLE_KEEP_ROWS
+        if elided > 0:
+            self._append(f"[{elided} table rows omitted]")
+            self.stats["table_rows"] += elided
+        self._table_run = 0
+
+    def add_lines(self, lines, page: int = None):
+        for i, line in enumerate(lines):
+            kind = _heading_kind(line)
+            if kind is not None and _is_dropped(kind) and self.drop_at is not None and (page, i) not in self.drop_at:
+                kind = None
+            if kind is not None:
+                self.flush_table()
+                self._start_section(kind, line if len(line) <= MAX_HEADING_CHARS else None)
+                if _is_dropped(kind):
+                    self.current["drop"] = True
+                    self._append(f"[{self.current['heading'] or kind} omitted]")
+                    continue
+            if self.current.get("drop"):
+                if self.current["kind"] == "references":
+                    self.stats["reference_lines"] += 1
+                continue
+            if _is_table_row(line):
+                self._table_run += 1
+                if self._table_run > TABLE_KEEP_ROWS:
+                    continue
+            else:
+                self.flush_table()
+            self._append(line)
+
+    def finish(self):
+        self.flush_table()
+        return [section for section in self.sections if section["lines"]]
+
+
+def _find_boilerplate(page_lines) -> set:
+    counts = Counter()
+    for lines in page_lines:
+        counts.update(_edge_keys(lines))
+    threshold = max(MIN_BOILERPLATE_PAGES, int(len(page_lines) * BOILERPLATE_PAGE_RATIO))
+    return {key for key, count in counts.items() if count >= threshold}
+
+
+def compact_pages(pages) -> CompactedDocument:
+    """
+    Compacts the extracted text of each page of a document for an LLM prompt:
+    normalizes whitespace, drops running headers/footers and page numbers,
+    joins hyphenated line breaks, drops the references and acknowledgments
+    (from their last heading, so a table of contents entry drops nothing)
+    and elides long numeric tables. Linear in the length of the text.
+
+    Args:
+        pages (list): The text of each page, in order.
+
+    Returns:
+        CompactedDocument: Render it (with an optional token budget) to get
+        the prompt text; its stats report what was removed.
+    """
+    stats = _new_stats()
+    page_lines = []
+    for page in pages:
+        stats["tokens_before"] += estimate_tokens(page)
+        page_lines.append(_normalize_lines(page))
+    boilerplate = _find_boilerplate(page_lines) if len(page_lines) >= MIN_BOILERPLATE_PAGES else set()
+
+    page_lines = [_strip_edges(lines, boilerplate, stats) for lines in page_lines]
+    builder = _SectionBuilder(stats, drop_at=_last_dropped_headings(page_lines))
+    for page, lines in enumerate(page_lines):
+        builder.add_lines(lines, page)
+    return CompactedDocument(builder.finish(), stats)
+
+
+def compact_page_stream(pages, stats: dict = None):
+    """
+    Streaming variant of compact_pages for chunked summarization: yields the
+    compacted text of each page as pages arrive. Running headers are learned
+    from the first STREAM_WARMUP_PAGES pages (and kept up to date after), and
+    no token budget is applied. The references and acknowledgments are
+    dropped from their last heading if the document ends within those
+    pages, else from any heading after them. Fills stats (if given) like
+    CompactedDocument.stats.
+    """
+    if stats is None:
+        stats = {}
+    stats.update(_new_stats())
+    counts = Counter()
+    buffered = []
+    out = []
+    builder = _SectionBuilder(stats, emit=out.append, drop_at=set())
+
+    def compact(page, lines):
+        builder.add_lines(lines, page)
+        builder.flush_table()
+        text = _HYPHEN_BREAK_RE.sub("", "\n".join(out))
+        out.clear()
+        stats["tokens_after"] += estimate_tokens(text)
+        stats["tokens_saved"] = max(0, stats["tokens_before"] - stats["tokens_after"])
+        return text
+
+    def boilerplate(pages_seen):
+        if pages_seen < MIN_BOILERPLATE_PAGES:
+            return set()
+        threshold = max(MIN_BOILERPLATE_PAGES, int(pages_seen * BOILERPLATE_PAGE_RATIO))
+        return {key for key, count in counts.items() if count >= threshold}
+
+    pages_seen = 0
+    for page in pages:
+        stats["tokens_before"] += estimate_tokens(page)
+        lines = _normalize_lines(page)
+        counts.update(_edge_keys(lines))
+        pages_seen += 1
+        buffered.append(lines)
+        # Emitting starts with the page after the warm-up, so the warm-up
+        # pages are known not to be the end of the document.
+        if pages_seen <= STREAM_WARMUP_PAGES:
+            continue
+        known = boilerplate(pages_seen)
+        for number, held in enumerate(buffered, pages_seen - len(buffered)):
+            if number == STREAM_WARMUP_PAGES:
+                builder.drop_at = None
+            yield compact(number, _strip_edges(held, known, stats))
+        buffered = []
+    known = boilerplate(pages_seen)
+    buffered = [_strip_edges(held, known, stats) for held in buffered]
+    if pages_seen <= STREAM_WARMUP_PAGES:
+        builder.drop_at = _last_dropped_headings(buffered)
+    for number, held in enumerate(buffered, pages_seen - len(buffered)):
+        yield compact(number, held)
+
+
+def prepare_prompt_text(pages, mode: str, model: str):
+    """
+    Compacts extracted pages for the summarize prompt. The per-model token
+    budget applies whenever the text will be sent as a single prompt: always
+    in "single" mode, and in "auto" mode when the compacted text is within
+    auto_chunk_tokens(model). Larger texts are left whole for chunking.
+
+    Returns:
+        tuple: (prompt text, stats dict with tokens_before/after/saved).
+    """
+    document = compact_pages(pages)
+    token_budget = None
+    if mode == "single" or (mode == "auto" and document.tokens <= auto_chunk_tokens(model)):
+        token_budget = token_budget_for_model(model)
+    return document.render(token_budget), document.stats
@@ -0,0 +1,215 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class RateLimitTimeout(Exception):
+    """
+    Raised when a request waited longer than allowed for a rate limiter token.
+    """
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire() blocks until a token is available, so
+    callers queue behind the limit instead of failing.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        # Takes a token now (possibly going negative) and returns how long the
+        # caller must wait for it, so concurrent callers queue in FIFO order.
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, max_wait: float = None):
+        """
+        Blocks until a token is available. Raises RateLimitTimeout if the wait
+        would exceed max_wait seconds.
+        """
+        if not self.rate:
+            return
+        wait = self._reserve()
+        if max_wait is not None and wait > max_wait:
+            with self._lock:
+                self._tokens += 1  # give the reservation back
+            raise RateLimitTimeout(f"rate limit queue wait of {wait:.1f}s exceeds {max_wait:.1f}s")
+        if wait:
+            time.sleep(wait)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a search query for use as a cache key.
+    """
+    return " ".join(query.lower().split())
+
+
+# Seconds between checks for a result another process is fetching.
+SHARED_POLL_INTERVAL = 0.05
+
+
+class SearchCache:
+    """
+    In-process LRU + TTL cache for parsed search results.
+
+    Concurrent misses for the same key share one upstream call (single-flight).
+    Entries older than ttl but younger than ttl + stale_ttl are returned
+    immediately while a background refresh fetches a fresh copy.
+
+    With a shared store (see shared_store.py), misses are looked up there
+    before going upstream, and a lease per key makes the single-flight hold
+    across worker processes: other processes wait up to shared_wait seconds
+    for the result instead of fetching it again.
+    """
+
+    def __init__(self, fetch, max_entries: int = 512, ttl: float = 600, stale_ttl: float = 3600, refresh_workers: int = 2,
+                 shared=None, shared_wait: float = 30):
+        self.fetch = fetch
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.shared = shared
+        self.shared_wait = shared_wait
+        self._entries = OrderedDict()  # key -> (fetched_at, results)
+        self._inflight = {}  # key -> Future
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="search-refresh")
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_requests = 0
+        self.shared_hits = 0
+        self.errors = 0
+
+    @staticmethod
+    def make_key(query: str, max_results: int, start: int):
+        return (normalize_query(query), int(max_results), int(start))
+
+    def peek(self, query: str, max_results: int = 10, start: int = 0):
+        """
+        Returns fresh cached results without fetching or blocking, or None.
+        """
+        key = self.make_key(query, max_results, start)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        return None
+
+    def get(self, query: str, max_results: int = 10, start: int = 0):
+        """
+        Returns results for the query, fetching upstream on a miss. Fetch
+        errors propagate unless a stale entry can be served instead.
+        """
+        key = self.make_key(query, max_results, start)
+        with self._lock:
+            entry = self._entries.get(key)
+            age = time.monotonic() - entry[0] if entry else None
+            if entry and age <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry and age <= self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    self._inflight[key] = Future()
+                    self._refresher.submit(self._refresh, key)
+                return entry[1]
+
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            self._refresh(key)
+        return future.result()
+
+    def _fetch(self, key):
+        with self._lock:
+            self.upstream_requests += 1
+        return self.fetch(key[0], max_results=key[1], start=key[2])
+
+    def _fetch_shared(self, key):
+        # Returns (results, age in seconds), from the shared store if another
+        # process has fetched them within ttl.
+        shared_key = json.dumps(key)
+        lease = f"search:{shared_key}"
+        deadline = time.monotonic() + self.shared_wait
+        while True:
+            entry = self.shared.get("search", shared_key)
+            if entry and time.time() - entry["fetched_at"] <= self.ttl:
+                with self._lock:
+                    self.shared_hits += 1
+                return entry["results"], max(0.0, time.time() - entry["fetched_at"])
+            if self.shared.acquire_lease(lease, self.shared_wait) or time.monotonic() >= deadline:
+                break
+            time.sleep(SHARED_POLL_INTERVAL)
+        try:
+            results = self._fetch(key)
+            self.shared.put("search", shared_key, {"fetched_at": time.time(), "results": results}, ttl_seconds=self.ttl + self.stale_ttl)
+        finally:
+            self.shared.release_lease(lease)
+        return results, 0.0
+
+    def _refresh(self, key):
+        with self._lock:
+            future = self._inflight[key]
+        try:
+            if self.shared is not None:
+                results, age = self._fetch_shared(key)
+            else:
+                results, age = self._fetch(key), 0.0
+        except BaseException as e:
+            with self._lock:
+                self.errors += 1
+                self._inflight.pop(key, None)
+                stale = self._entries.get(key)
+            if stale:
+                # Keep serving what we have; it is retried on the next request.
+                future.set_result(stale[1])
+            else:
+                future.set_exception(e)
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() - age, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._inflight.pop(key, None)
+        future.set_result(results)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "upstream_requests": self.upstream_requests,
+                "shared_hits": self.shared_hits,
+                "errors": self.errors,
+                "inflight": len(self._inflight),
+            }
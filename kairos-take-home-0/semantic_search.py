@@ -0,0 +1,188 @@
+import os
+import threading
+import zlib
+
+from local_index import paper_key, tokenize
+
+# NumPy and the vector store are imported on first use, so the hosts can
+# import EmbeddingError without loading them while semantic search is off.
+
+# Papers embedded per model call.
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+
+class EmbeddingError(Exception):
+    """
+    Raised when the embedding model is misconfigured or cannot be loaded.
+    """
+
+
+class SentenceTransformerEmbedder:
+    """
+    Local CPU embedding model from sentence-transformers (EMBEDDING_MODEL,
+    default all-MiniLM-L6-v2). The model is downloaded on first use.
+    """
+
+    name = "sentence-transformers"
+
+    def __init__(self, model: str = None):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise EmbeddingError("Error: sentence-transformers is not installed (pip install sentence-transformers).")
+        self.model = model or os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        try:
+            self._model = SentenceTransformer(self.model, device="cpu")
+        except Exception as e:
+            raise EmbeddingError(f"Error loading embedding model {self.model}: {e}")
+        self.dim = self._model.get_sentence_embedding_dimension()
+
+    def embed(self, texts):
+        import numpy as np
+
+        return self._model.encode(list(texts), batch_size=EMBEDDING_BATCH_SIZE, normalize_embeddings=True,
+                                  convert_to_numpy=True, show_progress_bar=False).astype(np.float32)
+
+
+class HashingEmbedder:
+    """
+    Deterministic offline stand-in for an embedding model: signed feature
+    hashing of the word unigrams and bigrams of a text. It has no notion of
+    meaning beyond shared words, and is meant for tests and benchmarks.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 384):
+        self.model = f"hashing-{dim}"
+        self.dim = dim
+
+    def embed(self, texts):
+        import numpy as np
+
+        rows, columns, signs = [], [], []
+        texts = list(texts)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                digest = zlib.crc32(feature.encode("utf-8"))
+                rows.append(row)
+                columns.append(digest % self.dim)
+                signs.append(1.0 if digest & 0x80000000 else -1.0)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(vectors, (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64)), np.array(signs, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
+
+
+EMBEDDERS = {embedder.name: embedder for embedder in (SentenceTransformerEmbedder, HashingEmbedder)}
+
+
+def paper_text(paper: dict) -> str:
+    """
+    The text a paper is embedded from: its title and abstract.
+    """
+    return f"{paper.get('title') or ''}\n{paper.get('summary') or ''}".strip()
+
+
+class SemanticIndex:
+    """
+    Embeds papers with a local model and keeps their vectors in a VectorStore,
+    so each paper is embedded once. Re-ranks search results by the cosine
+    similarity of each paper to the query, and finds papers similar to a
+    given one.
+
+    The model and store are loaded on first use; a model that fails to load
+    raises EmbeddingError on every call.
+    """
+
+    def __init__(self, store_dir: str, embedder: str = "sentence-transformers"):
+        self.store_dir = store_dir
+        self.embedder_name = embedder
+        self._embedder = None
+        self._store = None
+        self._lock = threading.Lock()
+        self.embedded = 0
+        self.reused = 0
+
+    def _load(self):
+        if self._store is not None:
+            return self._embedder, self._store
+        with self._lock:
+            if self._store is None:
+                embedder_class = EMBEDDERS.get(self.embedder_name)
+                if embedder_class is None:
+                    raise EmbeddingError(f"Unsupported embedding provider: {self.embedder_name}")
+                embedder = embedder_class()
+                from vector_store import VectorStore
+
+                self._store = VectorStore(self.store_dir, embedder.dim, embedder.model)
+                self._embedder = embedder
+        return self._embedder, self._store
+
+    def embed_papers(self, papers):
+        """
+        Returns the unit vectors of papers as a NumPy array, one row each,
+        embedding only the ones not already stored, in batches.
+        """
+        import numpy as np
+
+        embedder, store = self._load()
+        keys = [paper_key(paper["pdf_url"]) if paper.get("pdf_url") else None for paper in papers]
+        stored = store.get_many(key for key in keys if key)
+        missing = [i for i, key in enumerate(keys) if key not in stored]
+        vectors = np.zeros((len(papers), embedder.dim), dtype=np.float32)
+        for i, key in enumerate(keys):
+            if key in stored:
+                vectors[i] = stored[key]
+        for batch_start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+            batch = missing[batch_start:batch_start + EMBEDDING_BATCH_SIZE]
+            embedded = embedder.embed([paper_text(papers[i]) for i in batch])
+            vectors[batch] = embedded
+            store.add_many([keys[i] for i in batch if keys[i]], embedded[[j for j, i in enumerate(batch) if keys[i]]])
+        with self._lock:
+            self.embedded += len(missing)
+            self.reused += len(papers) - len(missing)
+        return vectors
+
+    def rerank(self, query: str, papers):
+        """
+        Returns papers ordered by cosine similarity to the query, best first,
+        keeping the original order between ties.
+        """
+        if len(papers) < 2:
+            return list(papers)
+        import numpy as np
+
+        embedder, _ = self._load()
+        query_vector = embedder.embed([query])[0]
+        scores = self.embed_papers(papers) @ query_vector
+        return [papers[i] for i in np.argsort(-scores, kind="stable").tolist()]
+
+    def sync(self, papers_by_key: dict) -> int:
+        """
+        Embeds the papers (keyed like local_index.papers) that are not in the
+        store yet, so nearest-neighbour queries cover all of them. Returns
+        how many were added.
+        """
+        _, store = self._load()
+        missing = [paper for key, paper in list(papers_by_key.items())
+                   if key not in store and paper.get("pdf_url") and paper_text(paper)]
+        if missing:
+            self.embed_papers(missing)
+        return len(missing)
+
+    def similar(self, paper: dict, limit: int = 10):
+        """
+        Returns up to limit (paper key, cosine similarity) pairs of the
+        stored papers nearest to paper, leaving paper itself out.
+        """
+        _, store = self._load()
+        vector = self.embed_papers([paper])[0]
+        return store.nearest(vector, limit, exclude={paper_key(paper["pdf_url"])})
+
+    def stats(self) -> dict:
+        stats = {"embedder": self.embedder_name, "embedded": self.embedded, "reused": self.reused}
+        if self._store is not None:
+            stats.update(self._store.stats())
+        return stats
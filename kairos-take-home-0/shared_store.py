@@ -0,0 +1,222 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from search_cache import RateLimitTimeout
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    value TEXT,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS log_entries (
+    log TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (log, seq)
+);
+"""
+
+# How often expired rows are deleted, at most.
+PRUNE_INTERVAL = 60
+
+
+def pid_alive(pid: int) -> bool:
+    """
+    Whether a process with this ID is running on this host.
+    """
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedStore:
+    """
+    On-host store shared by the worker processes of a multi-process
+    deployment, in one SQLite database in WAL mode.
+
+    It holds JSON values with an expiry (kv), leases that make one process
+    the owner of a piece of work (in-flight deduplication), token buckets for
+    global rate limits, and append-only logs. A lease is held until it is
+    released, it expires, or its process exits.
+    """
+
+    def __init__(self, path: str, log_ttl_seconds: float = 3600):
+        self.path = path
+        self.log_ttl_seconds = log_ttl_seconds
+        self._local = threading.local()
+        self._pruned = 0.0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db().executescript(SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        # One connection per thread, reopened after a fork.
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def get(self, namespace: str, key: str):
+        """
+        Returns the value stored under key, or None if missing or expired.
+        """
+        row = self._db().execute("SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return json.loads(row[0])
+
+    def put(self, namespace: str, key: str, value, ttl_seconds: float = None):
+        expires_at = time.time() + ttl_seconds if ttl_seconds else None
+        self._db().execute("INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                           (namespace, key, json.dumps(value), expires_at))
+        self._maybe_prune()
+
+    def delete(self, namespace: str, key: str):
+        self._db().execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def acquire_lease(self, name: str, ttl_seconds: float, value: str = None) -> bool:
+        """
+        Takes the lease for name unless a live process holds it. Returns True
+        if this process holds it now; taking it again renews it.
+        """
+        now = time.time()
+        pid = os.getpid()
+        with self._transaction() as db:
+            row = db.execute("SELECT pid, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] != pid and row[1] > now and pid_alive(row[0]):
+                return False
+            db.execute("INSERT OR REPLACE INTO leases (name, pid, value, expires_at) VALUES (?, ?, ?, ?)",
+                       (name, pid, value, now + ttl_seconds))
+        return True
+
+    def lease_holder(self, name: str):
+        """
+        Returns (pid, value) of the live holder of a lease, or None.
+        """
+        row = self._db().execute("SELECT pid, value, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+        if row is None or row[2] <= time.time() or not pid_alive(row[0]):
+            return None
+        return row[0], row[1]
+
+    def release_lease(self, name: str):
+        self._db().execute("DELETE FROM leases WHERE name = ? AND pid = ?", (name, os.getpid()))
+
+    def reserve_token(self, name: str, rate: float, capacity: float) -> float:
+        """
+        Takes a token from a shared bucket (possibly going negative) and
+        returns how long the caller must wait for it.
+        """
+        with self._transaction() as db:
+            row = db.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+            now = time.time()
+            tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+            tokens -= 1
+            db.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)", (name, tokens, now))
+        return 0.0 if tokens >= 0 else -tokens / rate
+
+    def return_token(self, name: str):
+        with self._transaction() as db:
+            db.execute("UPDATE buckets SET tokens = tokens + 1 WHERE name = ?", (name,))
+
+    def log_append(self, log: str, seq: int, value: str):
+        self._db().execute("INSERT OR REPLACE INTO log_entries (log, seq, value, created_at) VALUES (?, ?, ?, ?)",
+                           (log, seq, value, time.time()))
+
+    def log_read(self, log: str, after_seq: int = 0):
+        """
+        Returns the (seq, value) entries of a log after after_seq, in order.
+        """
+        return self._db().execute("SELECT seq, value FROM log_entries WHERE log = ? AND seq > ? ORDER BY seq",
+                                  (log, after_seq)).fetchall()
+
+    def _maybe_prune(self):
+        now = time.time()
+        if now - self._pruned < PRUNE_INTERVAL:
+            return
+        self._pruned = now
+        db = self._db()
+        db.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        db.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+        db.execute("DELETE FROM log_entries WHERE created_at <= ?", (now - self.log_ttl_seconds,))
+
+    def stats(self) -> dict:
+        db = self._db()
+        return {
+            "path": self.path,
+            "kv": dict(db.execute("SELECT namespace, COUNT(*) FROM kv GROUP BY namespace").fetchall()),
+            "leases": db.execute("SELECT COUNT(*) FROM leases WHERE expires_at > ?", (time.time(),)).fetchone()[0],
+            "logs": db.execute("SELECT COUNT(DISTINCT log) FROM log_entries").fetchone()[0],
+        }
+
+
+class SharedTokenBucket:
+    """
+    Token bucket kept in a SharedStore, so a rate limit holds across all
+    worker processes. Same interface as search_cache.TokenBucket.
+    """
+
+    def __init__(self, store: SharedStore, name: str, rate: float, capacity: float = 1):
+        self.store = store
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+
+    def acquire(self, max_wait: float = None):
+        """
+        Blocks until a token is available. Raises RateLimitTimeout if the wait
+        would exceed max_wait seconds.
+        """
+        if not self.rate:
+            return
+        wait = self.store.reserve_token(self.name, self.rate, self.capacity)
+        if max_wait is not None and wait > max_wait:
+            self.store.return_token(self.name)  # give the reservation back
+            raise RateLimitTimeout(f"rate limit queue wait of {wait:.1f}s exceeds {max_wait:.1f}s")
+        if wait:
+            time.sleep(wait)
+
+
+# Set by the multi-process launcher (gunicorn.conf.py); a single process keeps
+# its caches and limits in memory.
+SHARED_STORE_PATH = os.getenv("SHARED_STORE_PATH")
+shared_store = SharedStore(SHARED_STORE_PATH) if SHARED_STORE_PATH else None
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+# Matches arxiv.org/abs/<id>, arxiv.org/pdf/<id> and arxiv.org/pdf/<id>.pdf,
+# including old-style identifiers such as hep-th/9901001.
+ARXIV_URL_PATTERN = re.compile(r"^(?:https?://)?(?:www\.|export\.)?arxiv\.org/(?:abs|pdf)/(.+?)(?:\.pdf)?/?$", re.IGNORECASE)
+
+# Error strings yielded by summarize_text_with_llm; these must never be cached.
+_ERROR_PREFIXES = ("Error", "Unsupported LLM provider")
+
+REPLAY_CHUNK_SIZE = 256
+
+
+def normalize_arxiv_id(pdf_url: str):
+    """
+    Returns the arXiv identifier (e.g. '2305.15334v2') for an arXiv abs/pdf URL,
+    or None if the URL does not point at arXiv.
+    """
+    if not pdf_url:
+        return None
+    match = ARXIV_URL_PATTERN.match(pdf_url.strip().split("?", 1)[0].split("#", 1)[0])
+    if not match:
+        return None
+    return match.group(1).lower()
+
+
+def pdf_source_id(pdf_url: str = None, pdf_bytes: bytes = None, pdf_sha256: str = None):
+    """
+    Returns a stable identifier for a PDF: the normalized arXiv ID when the URL
+    is an arXiv link, otherwise the SHA-256 of the PDF bytes (pass pdf_sha256
+    when the digest is already known).
+    """
+    arxiv_id = normalize_arxiv_id(pdf_url)
+    if arxiv_id:
+        return f"arxiv:{arxiv_id}"
+    if pdf_sha256:
+        return f"sha256:{pdf_sha256}"
+    if pdf_bytes is not None:
+        return f"sha256:{hashlib.sha256(pdf_bytes).hexdigest()}"
+    return None
+
+
+def make_cache_key(source_id: str, provider: str, model: str, prompt_version: str) -> str:
+    """
+    Builds the content-addressed cache key for a summary.
+    """
+    raw = "\x1f".join([source_id, provider or "", model or "", prompt_version or ""])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def is_cacheable_summary(summary: str) -> bool:
+    """
+    Returns False for empty output and for the error strings the summarizer
+    yields in place of a summary.
+    """
+    return bool(summary and summary.strip()) and not summary.startswith(_ERROR_PREFIXES)
+
+
+def replay_summary(summary: str, chunk_size: int = REPLAY_CHUNK_SIZE):
+    """
+    Yields a cached summary in chunks so it can go through the same streaming
+    Response as a live LLM run.
+    """
+    for i in range(0, len(summary), chunk_size):
+        yield summary[i:i + chunk_size]
+
+
+class SummaryCache:
+    """
+    Persistent on-disk summary cache with TTL and total-size eviction.
+
+    Each entry is a single JSON file named after its cache key. Entries are
+    evicted least-recently-used first once the directory grows past max_bytes.
+    Several processes can share the directory; entries the others write are
+    counted when the directory is rescanned, at most every rescan_interval
+    seconds.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 100 * 1024 * 1024, ttl_seconds: float = 7 * 24 * 3600,
+                 rescan_interval: float = 60):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.rescan_interval = rescan_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        sizes = {}
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                try:
+                    sizes[name[:-5]] = os.path.getsize(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+        with self._lock:
+            self._sizes = sizes
+            self._total_bytes = sum(sizes.values())
+            self._scanned = time.monotonic()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str):
+        """
+        Returns the cached summary for key, or None on a miss or expired entry.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if self.ttl_seconds and time.time() - entry.get("created", 0) > self.ttl_seconds:
+            self._remove(key)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            # Touch the file so eviction order follows last access, not creation.
+            os.utime(path, None)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry.get("summary")
+
+    def put(self, key: str, summary: str, metadata: dict = None):
+        """
+        Stores a summary under key and evicts old entries if the cache is full.
+        """
+        entry = {"created": time.time(), "summary": summary, "metadata": metadata or {}}
+        data = json.dumps(entry).encode("utf-8")
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing summary cache entry {key}: {e}")
+            return
+        with self._lock:
+            self._total_bytes += len(data) - self._sizes.get(key, 0)
+            self._sizes[key] = len(data)
+            rescan = time.monotonic() - self._scanned >= self.rescan_interval
+        if rescan:
+            self._scan()
+        self._evict()
+
+    def _remove(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+        with self._lock:
+            self._total_bytes -= self._sizes.pop(key, 0)
+
+    def _evict(self):
+        with self._lock:
+            if self._total_bytes <= self.max_bytes:
+                return
+            keys = list(self._sizes)
+
+        def last_access(key):
+            try:
+                return os.path.getmtime(self._path(key))
+            except OSError:
+                return 0
+
+        for key in sorted(keys, key=last_access):
+            with self._lock:
+                if self._total_bytes <= self.max_bytes:
+                    return
+                self.evictions += 1
+            self._remove(key)
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counters and current size of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._sizes),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+            }
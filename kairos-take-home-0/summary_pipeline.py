@@ -0,0 +1,407 @@
+import os
+import threading
+import time
+
+from chunked_summarizer import estimate_tokens, summarize_text
+from job_queue import JobQueue, parse_provider_limits
+from local_index import LocalIndex, paper_key
+from page_store import PageSelection, PageStore
+from pdf_extraction import iter_page_texts
+from pdf_summarize_server import PROMPT_VERSION, download_pdf, extract_pages_from_pdf
+from prefetch import PrefetchedPDF, Prefetcher
+from prompt_compaction import COMPACTION_ENABLED, COMPACTION_VERSION, auto_chunk_tokens, compact_page_stream, prepare_prompt_text
+from semantic_search import SemanticIndex
+from shared_store import shared_store
+from summary_cache import SummaryCache, is_cacheable_summary, make_cache_key, pdf_source_id, replay_summary
+from summary_runs import SummaryRuns
+from tool_logging import log_tool_call
+from tracing import span, trace
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Shared by the HTTP hosts and the batch job workers; there must be only one
+# of each per process since both write to their directories.
+summary_cache = SummaryCache(
+    os.getenv("SUMMARY_CACHE_DIR", os.path.join(BACKEND_DIR, ".summary_cache")),
+    max_bytes=int(os.getenv("SUMMARY_CACHE_MAX_BYTES", 100 * 1024 * 1024)),
+    ttl_seconds=float(os.getenv("SUMMARY_CACHE_TTL", 7 * 24 * 3600)),
+)
+
+local_index = LocalIndex(os.getenv("LOCAL_INDEX_DIR", os.path.join(BACKEND_DIR, ".local_index")))
+
+# Extracted page text by PDF hash, so re-summarizing a PDF (with another
+# model or prompt, or other pages) skips parsing it.
+page_store = PageStore(
+    os.getenv("PAGE_STORE_DIR", os.path.join(BACKEND_DIR, ".page_store")),
+    max_bytes=int(os.getenv("PAGE_STORE_MAX_BYTES", 1024 * 1024 * 1024)),
+)
+
+# Semantic re-ranking and "more like this" are opt-in; the embedding model is
+# loaded on first use.
+SEMANTIC_SEARCH = os.getenv("SEMANTIC_SEARCH", "0").lower() in ("1", "true", "yes", "on")
+semantic_index = SemanticIndex(
+    os.getenv("SEMANTIC_INDEX_DIR", os.path.join(BACKEND_DIR, ".semantic_index")),
+    embedder=os.getenv("EMBEDDING_PROVIDER", "sentence-transformers"),
+) if SEMANTIC_SEARCH else None
+
+
+def find_similar_papers(pdf_url: str, max_results: int = 10):
+    """
+    Returns up to max_results papers from the local index most similar to
+    the one at pdf_url, each with a cosine similarity "score", or None if
+    that paper has not been seen. Papers indexed since the last call are
+    embedded first. Raises EmbeddingError if the model cannot be loaded.
+    """
+    paper = local_index.papers.get(paper_key(pdf_url))
+    if paper is None:
+        return None
+    with span("similar") as similar_span:
+        similar_span.set(embedded=semantic_index.sync(local_index.papers))
+        neighbours = semantic_index.similar(paper, max_results)
+        similar_span.set(records=len(neighbours))
+    return [dict(local_index.papers[key], score=round(score, 4)) for key, score in neighbours if key in local_index.papers]
+
+
+def summary_prompt_version(mode: str, incremental: bool, selection: PageSelection = None) -> str:
+    # Chunked and incremental output differ from a single-pass summary, and
+    # compaction and page selection change the prompt text.
+    version = f"{PROMPT_VERSION}:{mode}:{int(incremental)}"
+    if COMPACTION_ENABLED:
+        version = f"{version}:c{COMPACTION_VERSION}"
+    return f"{version}:{selection.key}" if selection is not None else version
+
+
+def summary_cache_key(source_id, mode: str, incremental: bool, selection: PageSelection = None):
+    if not source_id:
+        return None
+    return make_cache_key(source_id, os.getenv("LLM_PROVIDER"), os.getenv("LLM_MODEL"),
+                          summary_prompt_version(mode, incremental, selection))
+
+
+def store_extracted_pages(pdf_sha256: str, pages, extraction_stats: dict):
+    """
+    Saves the pages of a PDF to the page store if extraction finished, so
+    later summaries of it skip parsing.
+    """
+    if not extraction_stats.get("complete") or not any(page.strip() for page in pages):
+        return
+    try:
+        page_store.put(pdf_sha256, pages)
+    except OSError as e:
+        print(f"Error storing extracted pages of {pdf_sha256}: {e}")
+
+
+def store_summary_results(pdf_url: str, cache_key, full_text, summary: str, failed: bool = False, complete: bool = True):
+    """
+    Adds the extracted text and summary to the local index and caches the
+    summary, unless the run failed (an error may follow part of a summary),
+    extraction timed out before the last page (complete is False; the
+    summary only covers the first pages) or the summary is an error message.
+    """
+    if full_text:
+        local_index.add(pdf_url, "fulltext", full_text)
+    if not complete:
+        print(f"Not caching the summary of {pdf_url}: text extraction was incomplete.")
+    elif not failed and is_cacheable_summary(summary):
+        if cache_key:
+            summary_cache.put(cache_key, summary, {"pdf_url": pdf_url, "provider": os.getenv("LLM_PROVIDER"), "model": os.getenv("LLM_MODEL")})
+        local_index.add(pdf_url, "summary", summary)
+
+
+def summarize_pdf_url(pdf_url: str, mode: str = "auto", incremental: bool = False, prefetched: PrefetchedPDF = None,
+                      selection: PageSelection = None, stats: dict = None, download=download_pdf):
+    """
+    Generator running the blocking summarize pipeline for one PDF: summary
+    cache lookup, download, text extraction, summarization and storing the
+    results. Yields summary chunks; failures the pipeline knows about are
+    yielded as "Error..." text and recorded as stats["error"], anything
+    unexpected propagates. Each stage is recorded as a span of the current
+    trace.
+
+    Download and extraction are skipped for PDFs taken from the prefetcher,
+    or passed in as prefetched. Extraction is also skipped for PDFs in the
+    page store, reading only the pages in selection, if given. download
+    fetches the PDF (a PDFDownload, or None on failure); the ASGI host passes
+    one that runs on its event loop.
+    """
+    if stats is None:
+        stats = {}
+    # arXiv URLs can be looked up before downloading anything.
+    cache_key = summary_cache_key(pdf_source_id(pdf_url=pdf_url), mode, incremental, selection)
+    cached_summary = summary_cache.get(cache_key) if cache_key else None
+    if cached_summary is not None:
+        log_tool_call("summary_cache", {"pdf_url": pdf_url}, "hit", 0)
+        yield from replay_summary(cached_summary)
+        return
+
+    if prefetched is None and PREFETCH_TOP_K > 0:
+        with span("prefetch", pdf_url=pdf_url) as prefetch_span:
+            prefetched = prefetcher.take(pdf_url)
+            prefetch_span.set(hit=prefetched is not None)
+        log_tool_call("prefetch", {"pdf_url": pdf_url}, "hit" if prefetched is not None else "miss", prefetch_span.duration)
+
+    pdf_path = None
+    if prefetched is None:
+        with span("download", pdf_url=pdf_url) as download_span:
+            pdf_path = download(pdf_url)
+            if pdf_path is None:
+                download_span.fail("download failed")
+            else:
+                download_span.set(bytes=pdf_path.size, not_modified=pdf_path.not_modified)
+        log_tool_call("download_pdf", {"pdf_url": pdf_url}, download_span.outcome, download_span.duration)
+        if pdf_path is None:
+            stats["error"] = f"Error: could not download PDF from {pdf_url}"
+            yield stats["error"]
+            return
+
+    try:
+        pdf_sha256 = prefetched.sha256 if prefetched is not None else pdf_path.sha256
+        if cache_key is None:
+            cache_key = summary_cache_key(pdf_source_id(pdf_sha256=pdf_sha256), mode, incremental, selection)
+            cached_summary = summary_cache.get(cache_key)
+            if cached_summary is not None:
+                log_tool_call("summary_cache", {"pdf_url": pdf_url}, "hit", 0)
+                yield from replay_summary(cached_summary)
+                return
+
+        if prefetched is not None:
+            log_pdf_path_arg = f"prefetched ({prefetched.size} bytes, {len(prefetched.pages)} pages)"
+        else:
+            log_pdf_path_arg = f"PDFDownload object (size: {pdf_path.size} bytes, cached: {pdf_path.not_modified})"
+        extracted_pages = []
+        # Stored pages are always complete; extraction below updates this.
+        extraction_stats = {"complete": True}
+        compaction_stats = {}
+        stored_pages = page_store.read(pdf_sha256, selection)
+        if mode == "chunked" and stored_pages is None and selection is None:
+            # Feed pages straight into the map stage so summarization starts
+            # before the last page is parsed; the extract span overlaps the
+            # LLM span.
+            def text_content_source():
+                if prefetched is not None:
+                    extraction_stats["complete"] = prefetched.complete
+                with span("extract", streamed=True) as extract_span:
+                    for page_text in prefetched.pages if prefetched is not None else iter_page_texts(pdf_path, stats=extraction_stats):
+                        extracted_pages.append(page_text)
+                        yield page_text
+                    extract_span.set(pages=len(extracted_pages))
+                log_tool_call("extract_text_from_pdf", {"pdf_path": log_pdf_path_arg, "pages": len(extracted_pages)}, "success", extract_span.duration)
+                store_extracted_pages(pdf_sha256, extracted_pages, extraction_stats)
+
+            text_content = text_content_source()
+            if COMPACTION_ENABLED:
+                text_content = compact_page_stream(text_content, compaction_stats)
+        else:
+            with span("extract") as extract_span:
+                if stored_pages is not None:
+                    extracted_pages = stored_pages
+                    extract_span.set(stored=True)
+                else:
+                    if prefetched is not None:
+                        extracted_pages = prefetched.pages
+                        extract_span.set(prefetched=True)
+                        extraction_stats["complete"] = prefetched.complete
+                    else:
+                        extracted_pages = extract_pages_from_pdf(pdf_path, stats=extraction_stats)
+                    store_extracted_pages(pdf_sha256, extracted_pages, extraction_stats)
+                    if selection is not None:
+                        extracted_pages = selection.apply(extracted_pages)
+                extract_span.set(pages=len(extracted_pages))
+                if not any(page.strip() for page in extracted_pages):
+                    extract_span.fail("no text extracted")
+            log_tool_call("extract_text_from_pdf", {"pdf_path": log_pdf_path_arg, "stored": stored_pages is not None},
+                          extract_span.outcome, extract_span.duration)
+            if selection is not None and not extracted_pages:
+                stats["error"] = f"Error: none of the requested pages ({selection.key}) are in this PDF"
+                yield stats["error"]
+                return
+            text_content = "".join(extracted_pages)
+            if COMPACTION_ENABLED:
+                with span("compact") as compact_span:
+                    text_content, compaction_stats = prepare_prompt_text(extracted_pages, mode, os.getenv("LLM_MODEL"))
+                    compact_span.set(**compaction_stats)
+                log_tool_call("compact_prompt", compaction_stats, "success", compact_span.duration)
+
+        summary_chunks = []
+        with span("llm", provider=os.getenv("LLM_PROVIDER"), model=os.getenv("LLM_MODEL"), mode=mode) as llm_span:
+            for chunk in summarize_text(text_content, mode=mode, incremental=incremental, stats=stats,
+                                        max_input_tokens=auto_chunk_tokens(os.getenv("LLM_MODEL"))):
+                if not summary_chunks:
+                    llm_span.event("first_token")
+                summary_chunks.append(chunk)
+                yield chunk
+            full_text = "".join(extracted_pages)
+            summary = "".join(summary_chunks)
+            prompt_tokens = compaction_stats["tokens_after"] if compaction_stats else estimate_tokens(full_text)
+            llm_span.set(input_tokens=prompt_tokens, output_tokens=estimate_tokens(summary))
+            if mode == "chunked" and compaction_stats:
+                # Compaction ran inside the map stage, so it has no span of its own.
+                llm_span.set(tokens_saved=compaction_stats["tokens_saved"])
+            if "error" in stats or not is_cacheable_summary(summary):
+                llm_span.fail(stats.get("error", summary)[:200])
+        log_tool_call("summarize_text_with_llm", {"text_length": len(full_text), "prompt_tokens": prompt_tokens, "mode": mode}, llm_span.outcome, llm_span.duration)
+        if mode == "chunked" and compaction_stats:
+            # Pages were compacted as the map stage consumed them.
+            log_tool_call("compact_prompt", compaction_stats, "success", 0)
+    finally:
+        if pdf_path is not None:
+            pdf_path.close()
+
+    # A summary of some pages is cached, but only the full text is indexed.
+    store_summary_results(pdf_url, cache_key, full_text if selection is None else None, summary, failed="error" in stats,
+                          complete=extraction_stats["complete"])
+
+
+def run_summary_job(pdf_url: str, mode: str) -> str:
+    """
+    Runs the summarize pipeline for a batch job and returns the summary,
+    raising RuntimeError with the message if it ended in an error.
+    """
+    stats = {}
+    with trace("summary_job", pdf_url=pdf_url, mode=mode) as job_trace:
+        summary = "".join(summarize_pdf_url(pdf_url, mode=mode, stats=stats))
+        failed = "error" in stats or not is_cacheable_summary(summary)
+        if failed:
+            job_trace.fail()
+    if failed:
+        raise RuntimeError(stats.get("error") or summary.strip() or "empty summary")
+    return summary
+
+
+# Batch summarization jobs; workers are started by the hosts at startup.
+job_queue = JobQueue(
+    os.getenv("SUMMARY_JOBS_DB", os.path.join(BACKEND_DIR, ".jobs.sqlite3")),
+    run_summary_job,
+    workers=int(os.getenv("SUMMARY_JOB_WORKERS", "4")),
+    provider_limits=parse_provider_limits(os.getenv("SUMMARY_PROVIDER_CONCURRENCY")),
+)
+
+
+def prefetch_pdf(pdf_url: str, cancelled) -> PrefetchedPDF:
+    """
+    Downloads a PDF and extracts its pages for the prefetcher, stopping
+    early (and returning None) once cancelled is set.
+    """
+    with trace("prefetch", pdf_url=pdf_url) as prefetch_trace:
+        with span("download", pdf_url=pdf_url) as download_span:
+            pdf = download_pdf(pdf_url)
+            if pdf is None:
+                download_span.fail("download failed")
+            else:
+                download_span.set(bytes=pdf.size, not_modified=pdf.not_modified)
+        if pdf is None:
+            return None
+        try:
+            pages = page_store.read(pdf.sha256)
+            if pages is not None:
+                return PrefetchedPDF(pages, pdf.size, pdf.sha256)
+            pages = []
+            extraction_stats = {}
+            with span("extract") as extract_span:
+                for page_text in iter_page_texts(pdf, stats=extraction_stats):
+                    if cancelled.is_set():
+                        prefetch_trace.set(cancelled=True)
+                        return None
+                    pages.append(page_text)
+                extract_span.set(pages=len(pages))
+            store_extracted_pages(pdf.sha256, pages, extraction_stats)
+        finally:
+            pdf.close()
+    return PrefetchedPDF(pages, pdf.size, pdf.sha256, complete=extraction_stats["complete"])
+
+
+def presummarize_pdf(pdf_url: str, prefetched: PrefetchedPDF):
+    """
+    Summarizes a prefetched PDF in the background so the summary is cached
+    before it is asked for.
+    """
+    with trace("presummarize", pdf_url=pdf_url) as presummarize_trace:
+        stats = {}
+        summary = "".join(summarize_pdf_url(pdf_url, mode=os.getenv("SUMMARY_MODE", "auto"), prefetched=prefetched, stats=stats))
+        if "error" in stats or not is_cacheable_summary(summary):
+            presummarize_trace.fail()
+
+
+# Search-result prefetching is opt-in: the PDFs of the top PREFETCH_TOP_K
+# results of each search are downloaded and extracted in the background.
+PREFETCH_TOP_K = int(os.getenv("PREFETCH_TOP_K", "0"))
+prefetcher = Prefetcher(
+    prefetch_pdf,
+    workers=int(os.getenv("PREFETCH_WORKERS", "2")),
+    max_bytes=int(os.getenv("PREFETCH_MAX_BYTES", 64 * 1024 * 1024)),
+    max_pending=int(os.getenv("PREFETCH_MAX_PENDING", "8")),
+    ttl_seconds=float(os.getenv("PREFETCH_TTL", "300")),
+    summarize=presummarize_pdf if os.getenv("PREFETCH_SUMMARIZE", "0").lower() in ("1", "true", "yes", "on") else None,
+)
+
+
+def prefetch_search_results(papers) -> int:
+    """
+    Queues the PDFs of the top PREFETCH_TOP_K search results for prefetching,
+    skipping papers whose summary is already cached. Returns how many were
+    queued.
+    """
+    if PREFETCH_TOP_K <= 0:
+        return 0
+    mode = os.getenv("SUMMARY_MODE", "auto")
+    pdf_urls = []
+    for paper in papers[:PREFETCH_TOP_K]:
+        pdf_url = paper.get('pdf_url')
+        cache_key = summary_cache_key(pdf_source_id(pdf_url=pdf_url), mode, False) if pdf_url else None
+        if cache_key and summary_cache.get(cache_key) is not None:
+            continue
+        pdf_urls.append(pdf_url)
+    return prefetcher.prefetch(pdf_urls)
+
+
+# Summary runs: /summarize output is produced into a run log that clients
+# read from, so a dropped connection can resume and identical concurrent
+# requests share one LLM stream.
+summary_runs = SummaryRuns(
+    max_runs=int(os.getenv("SUMMARY_RUNS_MAX", "256")),
+    ttl_seconds=float(os.getenv("SUMMARY_RUN_TTL", "600")),
+    max_bytes=int(os.getenv("SUMMARY_RUN_MAX_BYTES", 1024 * 1024)),
+    shared=shared_store,
+)
+
+
+def summary_run_key(pdf_url: str, mode: str, incremental: bool, selection: PageSelection = None):
+    return (pdf_url, mode, incremental, selection.key if selection is not None else None,
+            os.getenv("LLM_PROVIDER"), os.getenv("LLM_MODEL"))
+
+
+def produce_summary_run(run, pdf_url: str, mode: str, incremental: bool, selection: PageSelection = None):
+    """
+    Runs the summarize pipeline into a run log and finishes the run. Errors
+    end the run with an "Error: ..." chunk, as the streaming response did.
+    """
+    start_time = time.time()
+    try:
+        with trace("summarize", pdf_url=pdf_url, mode=mode, run_id=run.run_id) as summarize_trace, prefetcher.foreground():
+            try:
+                for chunk in summarize_pdf_url(pdf_url, mode=mode, incremental=incremental, selection=selection):
+                    run.append(chunk)
+            except Exception as e:
+                # The span of the stage that raised already carries the error;
+                # log it once against the run.
+                summarize_trace.fail()
+                log_tool_call("summarize_pdf_api", {"pdf_url": pdf_url}, f"error: {e}", time.time() - start_time)
+                run.append(f"Error: {e}")
+    finally:
+        summary_runs.finish(run)
+
+
+def start_summary_run(pdf_url: str, mode: str = "auto", incremental: bool = False, selection: PageSelection = None):
+    """
+    Returns the run producing the summary of pdf_url, joining the one already
+    running for the same paper, pages, mode and model or starting one on a
+    background thread. The run is not tied to any client connection.
+    """
+    run, created = summary_runs.get_or_create(summary_run_key(pdf_url, mode, incremental, selection),
+                                              pdf_url=pdf_url, mode=mode, incremental=incremental,
+                                              pages=selection.key if selection is not None else None)
+    if created:
+        threading.Thread(target=produce_summary_run, args=(run, pdf_url, mode, incremental, selection),
+                         name=f"summary-run-{run.run_id}", daemon=True).start()
+    log_tool_call("summary_run", {"pdf_url": pdf_url, "run_id": run.run_id}, "started" if created else "joined", 0)
+    return run
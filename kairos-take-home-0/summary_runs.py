@@ -0,0 +1,394 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from shared_store import pid_alive
+
+# Seconds between checks for new chunks of a run another process produces.
+SHARED_POLL_INTERVAL = 0.05
+# How long a process may hold the key of a run it produces; the lease is
+# also given up when the process exits.
+RUN_LEASE_SECONDS = 3600
+
+
+class RunExpiredError(Exception):
+    """
+    Raised when a run is resumed from a position its log no longer holds.
+    """
+
+
+class SummaryRun:
+    """
+    Append-only log of the chunks of one summary as they are produced, read
+    by any number of clients, each from its own position.
+
+    Chunks are numbered from 1 (the SSE event IDs); positions in the text
+    are character offsets. Once the log holds more than max_bytes characters
+    the oldest chunks are dropped, and reading from before them raises
+    RunExpiredError.
+    """
+
+    def __init__(self, run_id: str, key, max_bytes: int, mirror=None, **attrs):
+        self.run_id = run_id
+        self.key = key
+        self.attrs = attrs
+        self.max_bytes = max_bytes
+        self.created_at = time.time()
+        self.finished_at = None
+        self.done = False
+        self._chunks = deque()  # (seq, offset, text)
+        self._first_seq = 1  # of the oldest chunk kept
+        self._first_offset = 0
+        self._next_seq = 1
+        self._length = 0
+        self._kept = 0
+        self._readers = 0
+        self._cond = threading.Condition()
+        self._wakers = set()  # callables notified of every change, for async readers
+        self._mirror = mirror  # called with (seq, text) for every chunk
+
+    def _notify(self):
+        # Caller holds the condition.
+        self._cond.notify_all()
+        for waker in list(self._wakers):
+            waker()
+
+    def append(self, text: str):
+        if not text:
+            return
+        with self._cond:
+            seq = self._next_seq
+            self._chunks.append((seq, self._length, text))
+            self._next_seq += 1
+            self._length += len(text)
+            self._kept += len(text)
+            while self._kept > self.max_bytes and len(self._chunks) > 1:
+                dropped_seq, offset, dropped = self._chunks.popleft()
+                self._kept -= len(dropped)
+                self._first_seq, self._first_offset = dropped_seq + 1, offset + len(dropped)
+            self._notify()
+        if self._mirror is not None:
+            self._mirror(seq, text)
+
+    def finish(self):
+        with self._cond:
+            self.done = True
+            self.finished_at = time.time()
+            self._notify()
+
+    def _chunks_after(self, after_seq: int):
+        # Caller holds the condition.
+        if after_seq < self._first_seq - 1:
+            raise RunExpiredError(f"Run {self.run_id} no longer holds output before chunk {self._first_seq}")
+        return [(seq, text) for seq, _, text in self._chunks if seq > after_seq]
+
+    def _seq_at(self, offset: int):
+        # Caller holds the condition. Returns the number of the chunk before
+        # the one holding offset, and how far into that chunk offset is.
+        if offset < self._first_offset:
+            raise RunExpiredError(f"Run {self.run_id} no longer holds output before offset {self._first_offset}")
+        for seq, start, text in self._chunks:
+            if offset < start + len(text):
+                return seq - 1, offset - start
+        return self._next_seq - 1, offset - self._length
+
+    def _check_after(self, after_seq: int):
+        with self._cond:
+            self._chunks_after(after_seq)
+
+    def iter_chunks(self, after_seq: int = 0):
+        """
+        Returns an iterator of (seq, text) for every chunk after after_seq,
+        waiting for new ones until the run finishes. Raises RunExpiredError
+        right away if the log no longer starts early enough.
+        """
+        self._check_after(after_seq)
+        return self._iter_chunks(after_seq)
+
+    def iter_text(self, offset: int = 0):
+        """
+        Returns an iterator of the summary text from a character offset on,
+        like iter_chunks.
+        """
+        with self._cond:
+            after_seq, skip = self._seq_at(offset)
+        return self._iter_text(after_seq, skip)
+
+    def aiter_chunks(self, after_seq: int = 0):
+        """
+        Async variant of iter_chunks for the event loop.
+        """
+        self._check_after(after_seq)
+        return self._aiter_chunks(after_seq)
+
+    def aiter_text(self, offset: int = 0):
+        """
+        Async variant of iter_text for the event loop.
+        """
+        with self._cond:
+            after_seq, skip = self._seq_at(offset)
+        return self._aiter_text(after_seq, skip)
+
+    def _iter_chunks(self, after_seq: int):
+        with self._cond:
+            self._readers += 1
+        try:
+            while True:
+                with self._cond:
+                    while not self.done and self._next_seq - 1 <= after_seq:
+                        self._cond.wait()
+                    chunks = self._chunks_after(after_seq)
+                    done = self.done
+                for seq, text in chunks:
+                    yield seq, text
+                    after_seq = seq
+                if done:
+                    return
+        finally:
+            with self._cond:
+                self._readers -= 1
+
+    def _iter_text(self, after_seq: int, skip: int):
+        for _, text in self._iter_chunks(after_seq):
+            if skip:
+                text, skip = text[skip:], max(0, skip - len(text))
+            if text:
+                yield text
+
+    async def _aiter_chunks(self, after_seq: int):
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def waker():
+            loop.call_soon_threadsafe(changed.set)
+
+        with self._cond:
+            self._wakers.add(waker)
+            self._readers += 1
+        try:
+            while True:
+                changed.clear()
+                with self._cond:
+                    chunks = self._chunks_after(after_seq)
+                    done = self.done
+                for seq, text in chunks:
+                    yield seq, text
+                    after_seq = seq
+                if done:
+                    return
+                if not chunks:
+                    await changed.wait()
+        finally:
+            with self._cond:
+                self._wakers.discard(waker)
+                self._readers -= 1
+
+    async def _aiter_text(self, after_seq: int, skip: int):
+        async for _, text in self._aiter_chunks(after_seq):
+            if skip:
+                text, skip = text[skip:], max(0, skip - len(text))
+            if text:
+                yield text
+
+    def to_dict(self) -> dict:
+        with self._cond:
+            return {
+                "run_id": self.run_id,
+                **self.attrs,
+                "status": "done" if self.done else "running",
+                "chunks": self._next_seq - 1,
+                "length": self._length,
+                "first_chunk": self._first_seq,
+                "first_offset": self._first_offset,
+                "readers": self._readers,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+            }
+
+
+def sse_event(data: str, event: str = None, event_id=None) -> str:
+    """
+    Formats one server-sent event. Multi-line data is split over several
+    data: lines, which the client joins back with newlines.
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+def wants_event_stream(accept: str, stream_format: str = None) -> bool:
+    """
+    Whether a client asked for SSE, either explicitly with stream_format or
+    through its Accept header.
+    """
+    if stream_format:
+        return stream_format == "sse"
+    return "text/event-stream" in (accept or "")
+
+
+def sse_run_events(run: SummaryRun, chunks):
+    """
+    Wraps the (seq, text) chunks of a run as SSE: a "run" event with the run
+    details, one message per chunk with its number as the event ID, and a
+    final "done" event.
+    """
+    yield sse_event(json.dumps({"run_id": run.run_id, **run.attrs}), event="run")
+    for seq, text in chunks:
+        yield sse_event(text, event_id=seq)
+    yield sse_event(json.dumps(run.to_dict()), event="done")
+
+
+async def asse_run_events(run: SummaryRun, chunks):
+    """
+    Async variant of sse_run_events.
+    """
+    yield sse_event(json.dumps({"run_id": run.run_id, **run.attrs}), event="run")
+    async for seq, text in chunks:
+        yield sse_event(text, event_id=seq)
+    yield sse_event(json.dumps(run.to_dict()), event="done")
+
+
+class SummaryRuns:
+    """
+    Registry of summary runs. A request for a summary that is already being
+    produced with the same key joins that run instead of starting another;
+    finished runs stay readable by ID for ttl_seconds, and at most max_runs
+    finished runs are kept.
+
+    With a shared store (see shared_store.py) this holds across worker
+    processes: the process producing a run holds a lease on its key and
+    copies every chunk into the store, and other processes asked for the
+    same key or run ID follow it from there.
+    """
+
+    def __init__(self, max_runs: int = 256, ttl_seconds: float = 600, max_bytes: int = 1024 * 1024, shared=None):
+        self.max_runs = max_runs
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._runs = OrderedDict()  # run_id -> SummaryRun, oldest first
+        self._active = {}  # key -> running SummaryRun
+        self._owned = set()  # run_ids this process produces into the shared store
+        self._lock = threading.Lock()
+        self.started = 0
+        self.joined = 0
+        self.followed = 0
+
+    @staticmethod
+    def _lease_name(key) -> str:
+        return "run:" + json.dumps(key, default=str)
+
+    def get_or_create(self, key, **attrs):
+        """
+        Returns (run, created): the running run for key, or a new one that
+        the caller must produce, calling finish() when it ends.
+        """
+        with self._lock:
+            self._prune()
+            run = self._active.get(key)
+            if run is not None and not run.done:
+                self.joined += 1
+                return run, False
+            run_id = uuid.uuid4().hex[:16]
+            mirror = None
+            if self.shared is not None:
+                lease = self._lease_name(key)
+                for _ in range(2):
+                    if self.shared.acquire_lease(lease, RUN_LEASE_SECONDS, value=run_id):
+                        break
+                    holder = self.shared.lease_holder(lease)
+                    if holder is not None:
+                        self.joined += 1
+                        return self._follow(holder[1], key, attrs), False
+                self.shared.put("runs", run_id, {"attrs": attrs, "pid": os.getpid(), "done": False}, ttl_seconds=RUN_LEASE_SECONDS)
+                mirror = lambda seq, text: self.shared.log_append(f"run:{run_id}", seq, text)
+                self._owned.add(run_id)
+            run = SummaryRun(run_id, key, self.max_bytes, mirror=mirror, **attrs)
+            self._runs[run.run_id] = run
+            self._active[key] = run
+            self.started += 1
+            return run, True
+
+    def _follow(self, run_id: str, key, attrs: dict) -> SummaryRun:
+        # Caller holds the lock. Returns a local copy of a run another process
+        # produces, filled in by a polling thread.
+        run = self._runs.get(run_id)
+        if run is not None:
+            return run
+        run = SummaryRun(run_id, key, self.max_bytes, **attrs)
+        self._runs[run_id] = run
+        if key is not None:
+            self._active[key] = run
+        self.followed += 1
+        threading.Thread(target=self._poll_shared, args=(run,), name=f"summary-run-{run_id}", daemon=True).start()
+        return run
+
+    def _poll_shared(self, run: SummaryRun):
+        after_seq = 0
+        try:
+            while True:
+                # Read the status before the chunks, so nothing appended
+                # before the run finished is missed.
+                meta = self.shared.get("runs", run.run_id)
+                for seq, text in self.shared.log_read(f"run:{run.run_id}", after_seq):
+                    run.append(text)
+                    after_seq = seq
+                if meta is None or meta["done"]:
+                    return
+                if not pid_alive(meta["pid"]):
+                    run.append("Error: the worker producing this summary exited")
+                    return
+                time.sleep(SHARED_POLL_INTERVAL)
+        finally:
+            self.finish(run)
+
+    def finish(self, run: SummaryRun):
+        run.finish()
+        with self._lock:
+            if self._active.get(run.key) is run:
+                del self._active[run.key]
+            owned = run.run_id in self._owned
+            self._owned.discard(run.run_id)
+        if owned:
+            self.shared.put("runs", run.run_id, {"attrs": run.attrs, "pid": os.getpid(), "done": True}, ttl_seconds=self.ttl_seconds)
+            self.shared.release_lease(self._lease_name(run.key))
+
+    def get(self, run_id: str):
+        with self._lock:
+            self._prune()
+            run = self._runs.get(run_id)
+            if run is None and self.shared is not None:
+                meta = self.shared.get("runs", run_id)
+                if meta is not None:
+                    run = self._follow(run_id, None, meta["attrs"])
+            return run
+
+    def _prune(self):
+        # Caller holds the lock.
+        deadline = time.time() - self.ttl_seconds
+        finished = [run for run in self._runs.values() if run.done]
+        excess = len(finished) - self.max_runs
+        for run in finished:
+            if excess <= 0 and run.finished_at > deadline:
+                continue
+            del self._runs[run.run_id]
+            excess -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._prune()
+            return {
+                "runs": len(self._runs),
+                "running": len(self._active),
+                "started": self.started,
+                "joined": self.joined,
+                "followed": self.followed,
+            }
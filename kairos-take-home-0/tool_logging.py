@@ -0,0 +1,19 @@
+import json
+from datetime import datetime
+
+from tracing import current_trace_id
+
+
+def log_tool_call(tool_name, arguments, outcome, latency):
+    timestamp = datetime.now().isoformat()
+    log_entry = {
+        "timestamp": timestamp,
+        "tool_name": tool_name,
+        "arguments": arguments,
+        "outcome": outcome,
+        "latency_s": round(latency, 4)
+    }
+    trace_id = current_trace_id()
+    if trace_id:
+        log_entry["trace_id"] = trace_id
+    print(f"[LOG] {json.dumps(log_entry)}")
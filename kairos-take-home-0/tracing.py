@@ -0,0 +1,330 @@
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1").lower() not in ("0", "false", "no", "off")
+# An empty TRACE_LOG_PATH keeps the metrics but writes no trace log. "{pid}"
+# in it is replaced with the process ID, so each worker of a multi-process
+# deployment writes and rotates its own file.
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", os.path.join(BACKEND_DIR, ".traces", "traces.ndjson"))
+TRACE_LOG_MAX_BYTES = int(os.getenv("TRACE_LOG_MAX_BYTES", 10 * 1024 * 1024))
+TRACE_LOG_BACKUPS = int(os.getenv("TRACE_LOG_BACKUPS", "5"))
+
+METRIC_PREFIX = "paper_scout_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Numeric span attributes that are also summed into the processed counter.
+PROCESSED_UNITS = ("bytes", "pages", "input_tokens", "output_tokens", "tokens_saved", "records")
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Cumulative Prometheus histogram with one series per label combination.
+    """
+
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # sorted label items -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                cumulative += count
+                bucket_labels = _format_labels(key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_number(values[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Counter:
+    """
+    Prometheus counter with one series per label combination.
+    """
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = dict(self._series)
+        for key, value in sorted(series.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {_format_number(value)}")
+        return lines
+
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def histogram(name: str, help_text: str, buckets=LATENCY_BUCKETS) -> Histogram:
+    """
+    Returns the process-wide histogram with this name, creating it on first use.
+    """
+    name = METRIC_PREFIX + name
+    with _metrics_lock:
+        if name not in _metrics:
+            _metrics[name] = Histogram(name, help_text, buckets)
+        return _metrics[name]
+
+
+def counter(name: str, help_text: str) -> Counter:
+    """
+    Returns the process-wide counter with this name, creating it on first use.
+    """
+    name = METRIC_PREFIX + name
+    with _metrics_lock:
+        if name not in _metrics:
+            _metrics[name] = Counter(name, help_text)
+        return _metrics[name]
+
+
+def render_metrics() -> str:
+    """
+    Returns every metric in the Prometheus text exposition format.
+    """
+    with _metrics_lock:
+        metrics = sorted(_metrics.items())
+    lines = []
+    for _, metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+request_duration = histogram("request_duration_seconds", "Duration of traced requests and jobs.")
+stage_duration = histogram("stage_duration_seconds", "Duration of pipeline stages.")
+stage_event = histogram("stage_event_seconds", "Time from the start of a stage to an event in it, e.g. the LLM's first token.")
+stage_processed = counter("stage_processed_total", "Bytes, pages and tokens processed by pipeline stages.")
+
+
+def _outcome(exc_type) -> str:
+    if exc_type is None:
+        return "success"
+    if exc_type is GeneratorExit or exc_type.__name__ == "CancelledError":
+        return "cancelled"
+    return "error"
+
+
+class Span:
+    """
+    Times one pipeline stage. Numeric attributes named in PROCESSED_UNITS are
+    added to the processed counter when the span ends. The span fails if its
+    block raises, or if fail() is called for errors returned as values.
+    """
+
+    __slots__ = ("name", "attrs", "start", "offset", "duration", "outcome", "error")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.offset = None
+        self.duration = 0.0
+        self.outcome = "success"
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def event(self, name: str):
+        # Records the time since the span started, e.g. "first_token".
+        elapsed = time.perf_counter() - self.start
+        self.attrs[f"{name}_s"] = round(elapsed, 6)
+        if TRACING_ENABLED:
+            stage_event.observe(elapsed, stage=self.name, event=name)
+
+    def fail(self, error: str):
+        self.outcome = "error"
+        self.error = error
+
+    def __enter__(self):
+        trace = _current_trace.get()
+        self.start = time.perf_counter()
+        if trace is not None:
+            self.offset = self.start - trace.start
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.outcome = _outcome(exc_type)
+            self.error = str(exc) or exc_type.__name__
+        if TRACING_ENABLED:
+            stage_duration.observe(self.duration, stage=self.name, outcome=self.outcome)
+            for unit in PROCESSED_UNITS:
+                amount = self.attrs.get(unit)
+                if amount:
+                    stage_processed.inc(amount, stage=self.name, unit=unit)
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.spans.append(self)
+        return False
+
+    def to_dict(self) -> dict:
+        span = {"name": self.name, "outcome": self.outcome, "duration_s": round(self.duration, 6)}
+        if self.offset is not None:
+            span["offset_s"] = round(self.offset, 6)
+        if self.error:
+            span["error"] = self.error
+        span.update(self.attrs)
+        return span
+
+
+def span(name: str, **attrs) -> Span:
+    """
+    Context manager timing a pipeline stage and attaching it to the current
+    trace, if any:
+
+        with span("download", pdf_url=pdf_url) as download_span:
+            pdf = download_pdf(pdf_url)
+            download_span.set(bytes=pdf.size)
+    """
+    return Span(name, attrs)
+
+
+class Trace:
+    """
+    Collects the spans of one request or job and writes them as a single
+    NDJSON line to the trace log when it ends.
+    """
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.spans = []
+        self.outcome = "success"
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def fail(self):
+        self.outcome = "error"
+
+    def __enter__(self):
+        self.timestamp = datetime.now().isoformat()
+        self.start = time.perf_counter()
+        if TRACING_ENABLED:
+            self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.outcome = _outcome(exc_type)
+        elif self.outcome == "success" and any(span.outcome == "error" for span in self.spans):
+            # Stages that fail by returning an error message rather than raising.
+            self.outcome = "error"
+        if not TRACING_ENABLED:
+            return False
+        try:
+            _current_trace.reset(self._token)
+        except ValueError:
+            # Ended from another context (e.g. a generator closed by the
+            # garbage collector); the trace is simply no longer current.
+            pass
+        request_duration.observe(duration, route=self.name, outcome=self.outcome)
+        _write_trace({
+            "timestamp": self.timestamp,
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "outcome": self.outcome,
+            "duration_s": round(duration, 6),
+            **self.attrs,
+            "spans": [span.to_dict() for span in self.spans],
+        })
+        return False
+
+
+def trace(name: str, **attrs) -> Trace:
+    """
+    Context manager making a new trace current for the enclosed block, so
+    spans opened in it (on the same thread or task) are recorded together.
+    """
+    return Trace(name, attrs)
+
+
+def current_trace_id():
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+_trace_logger = None
+_trace_logger_lock = threading.Lock()
+
+
+def _get_trace_logger():
+    global _trace_logger
+    with _trace_logger_lock:
+        if _trace_logger is None:
+            logger = logging.getLogger("paper_scout.traces")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            path = TRACE_LOG_PATH.replace("{pid}", str(os.getpid()))
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(path, maxBytes=TRACE_LOG_MAX_BYTES,
+                                                               backupCount=TRACE_LOG_BACKUPS, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(handler)
+            except OSError as e:
+                print(f"Error opening trace log {path}: {e}")
+            _trace_logger = logger
+        return _trace_logger
+
+
+def _write_trace(record: dict):
+    if not TRACE_LOG_PATH:
+        return
+    _get_trace_logger().info(json.dumps(record, default=str))
@@ -0,0 +1,290 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the hosts run as a single process
+    fcntl = None
+
+VECTOR_STORE_VERSION = 1
+
+
+class VectorStore:
+    """
+    Persisted store of unit-length float32 vectors keyed by string, with an
+    approximate nearest-neighbour index over all of them.
+
+    Vectors live in a memory-mapped file (vectors.f32, one row per key) that
+    grows by doubling; keys.txt holds the key of each row, one per line, and
+    is appended after the row is written, so a crash mid-write only loses
+    the last vector. The store is tied to one embedding model: if the model
+    or dimension in meta.json differ, it starts empty.
+
+    Worker processes may share the directory: adds take an exclusive lock
+    on it and first pick up the rows other processes appended, so each
+    row is written once and keys.txt stays in row order. Queries pick up
+    new rows when keys.txt has changed since the last look.
+
+    Nearest-neighbour queries use random-hyperplane LSH: each of lsh_tables
+    tables hashes a vector to lsh_bits sign bits, and a query is scored
+    exactly against the rows sharing a bucket with it (or a bucket one bit
+    away) in any table. Below exact_below rows, and when LSH finds too few
+    candidates, every row is scored instead.
+    """
+
+    def __init__(self, directory: str, dim: int, model: str, lsh_tables: int = 8, lsh_bits: int = 12,
+                 exact_below: int = 20000, initial_capacity: int = 1024):
+        self.directory = directory
+        self.dim = dim
+        self.model = model
+        self.exact_below = exact_below
+        self._initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+        self._rows = {}  # key -> row
+        self._keys = []  # row -> key
+        self._vectors = None
+        self._capacity = 0
+        self._keys_offset = 0  # bytes of keys.txt read so far
+        self._keys_stat = None
+        planes = np.random.default_rng(0).standard_normal((lsh_tables * lsh_bits, dim)).astype(np.float32)
+        self._planes = planes
+        self._lsh_tables = lsh_tables
+        self._lsh_bits = lsh_bits
+        self._bit_values = (1 << np.arange(lsh_bits, dtype=np.int64))
+        self._buckets = [{} for _ in range(lsh_tables)]  # per table: code -> list of rows
+        self.ann_queries = 0
+        self.exact_queries = 0
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(self._path("lock"), "a") if fcntl is not None else None
+        with self._file_lock():
+            self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _file_lock(self):
+        # Serializes loading and adding across processes sharing the directory.
+        if self._lock_file is None:
+            yield
+            return
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        meta = {"version": VECTOR_STORE_VERSION, "model": self.model, "dim": self.dim}
+        try:
+            with open(self._path("meta.json"), "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = None
+        if stored != meta:
+            for name in ("vectors.f32", "keys.txt"):
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+            with open(self._path("meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+
+        row_bytes = self.dim * 4
+        try:
+            stored_rows = os.path.getsize(self._path("vectors.f32")) // row_bytes
+        except OSError:
+            stored_rows = 0
+        self._open(max(stored_rows, self._initial_capacity))
+        try:
+            with open(self._path("keys.txt"), "rb+") as f:
+                data = f.read()
+                end = data.rfind(b"\n") + 1
+                keys = data[:end].decode("utf-8").split("\n")[:-1][:stored_rows]
+                # Drops a torn last line and any keys without a row, so the
+                # next append starts on the line of the next row.
+                end = sum(len(key.encode("utf-8")) + 1 for key in keys)
+                if end < len(data):
+                    f.truncate(end)
+        except OSError:
+            keys, end = [], 0
+        self._add_rows(keys)
+        self._keys_offset = end
+        self._keys_stat = self._stat_keys()
+
+    def _stat_keys(self):
+        try:
+            stat = os.stat(self._path("keys.txt"))
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _sync(self):
+        """
+        Picks up the rows other processes appended since the last sync. Keys
+        are appended after their rows are flushed, so every complete line in
+        keys.txt has its vector in place. The caller holds self._lock.
+        """
+        stat = self._stat_keys()
+        if stat == self._keys_stat:
+            return
+        try:
+            with open(self._path("keys.txt"), "rb") as f:
+                f.seek(self._keys_offset)
+                data = f.read()
+        except OSError:
+            return
+        end = data.rfind(b"\n") + 1
+        self._keys_offset += end
+        self._keys_stat = stat
+        self._add_rows(data[:end].decode("utf-8").split("\n")[:-1])
+
+    def _add_rows(self, keys):
+        # Records keys as the next rows, whose vectors are already written.
+        if not keys:
+            return
+        start = len(self._keys)
+        end = start + len(keys)
+        self._reserve(end)
+        for row, key in enumerate(keys, start):
+            self._rows[key] = row
+        self._keys.extend(keys)
+        self._index_rows(start, end)
+
+    def _reserve(self, rows: int):
+        # Grows the mapping to hold rows, doubling; the file may already be
+        # larger if another process grew it.
+        if rows <= self._capacity:
+            return
+        capacity = max(self._capacity, 1)
+        while capacity < rows:
+            capacity *= 2
+        self._open(capacity)
+
+    def _open(self, capacity: int):
+        # Maps the vectors file with room for capacity rows, growing it first.
+        path = self._path("vectors.f32")
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(path, "ab") as f:
+            if f.tell() < capacity * self.dim * 4:
+                f.truncate(capacity * self.dim * 4)
+        self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._capacity = capacity
+
+    def _codes(self, vectors: np.ndarray) -> np.ndarray:
+        # LSH bucket of each vector in each table, shape (n, tables).
+        bits = (vectors @ self._planes.T > 0).reshape(len(vectors), self._lsh_tables, self._lsh_bits)
+        return bits @ self._bit_values
+
+    def _index_rows(self, start: int, end: int):
+        codes = self._codes(np.asarray(self._vectors[start:end]))
+        for table, buckets in enumerate(self._buckets):
+            for row, code in enumerate(codes[:, table].tolist(), start):
+                buckets.setdefault(code, []).append(row)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key: str):
+        return key in self._rows
+
+    def get_many(self, keys) -> dict:
+        """
+        Returns {key: vector} for the keys that are stored.
+        """
+        with self._lock:
+            self._sync()
+            return {key: np.array(self._vectors[self._rows[key]]) for key in keys if key in self._rows}
+
+    def add_many(self, keys, vectors: np.ndarray):
+        """
+        Stores one vector per key, normalized to unit length. Keys already in
+        the store keep their existing vector.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock, self._file_lock():
+            self._sync()
+            new = [(key, vector) for key, vector in zip(keys, vectors) if key not in self._rows]
+            new = list({key: vector for key, vector in new}.items())
+            if not new:
+                return
+            start = len(self._keys)
+            end = start + len(new)
+            self._reserve(end)
+            block = np.stack([vector for _, vector in new])
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            self._vectors[start:end] = block / np.where(norms > 0, norms, 1)
+            self._vectors.flush()
+            lines = "".join(f"{key}\n" for key, _ in new).encode("utf-8")
+            with open(self._path("keys.txt"), "ab") as f:
+                f.write(lines)
+            self._keys_offset += len(lines)
+            self._keys_stat = self._stat_keys()
+            self._add_rows([key for key, _ in new])
+
+    def _candidates(self, query: np.ndarray) -> np.ndarray:
+        codes = self._codes(query[None, :])[0].tolist()
+        probes = [0] + [1 << bit for bit in range(self._lsh_bits)]
+        rows = set()
+        for table, code in enumerate(codes):
+            buckets = self._buckets[table]
+            for probe in probes:
+                rows.update(buckets.get(code ^ probe, ()))
+        return np.fromiter(rows, dtype=np.int64, count=len(rows))
+
+    def nearest(self, query: np.ndarray, limit: int = 10, exclude=()):
+        """
+        Returns up to limit (key, cosine similarity) pairs closest to query,
+        best first, leaving out the keys in exclude.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0 or limit <= 0:
+            return []
+        query = query / norm
+        exclude = set(exclude)
+        with self._lock:
+            self._sync()
+            count = len(self._keys)
+            wanted = limit + len(exclude)
+            rows = None
+            if count >= self.exact_below:
+                rows = self._candidates(query)
+                if len(rows) < wanted:
+                    rows = None
+            if rows is None:
+                self.exact_queries += 1
+                scores = np.asarray(self._vectors[:count]) @ query
+                rows = np.arange(count)
+            else:
+                self.ann_queries += 1
+                scores = np.asarray(self._vectors[rows]) @ query
+            top = min(wanted, len(rows))
+            best = np.argpartition(-scores, top - 1)[:top] if top < len(rows) else np.arange(len(rows))
+            best = best[np.argsort(-scores[best], kind="stable")]
+            results = []
+            for i in best.tolist():
+                key = self._keys[int(rows[i])]
+                if key in exclude:
+                    continue
+                results.append((key, float(scores[i])))
+                if len(results) >= limit:
+                    break
+            return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "vectors": len(self._keys),
+                "dim": self.dim,
+                "model": self.model,
+                "capacity": self._capacity,
+                "ann_queries": self.ann_queries,
+                "exact_queries": self.exact_queries,
+            }
@@ -1,16 +1,24 @@
 import sys
 import os
-import time
 import json
-from datetime import datetime
+import time
 import subprocess
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.join(current_dir, 'kairos-take-home-0')
 sys.path.append(project_root)
 
-from paper_search_server import search_arxiv
-from pdf_summarize_server import download_pdf, extract_text_from_pdf, summarize_text_with_llm
+from paper_search_server import search_arxiv, search_cache, search_papers, harvest_arxiv, SEARCH_SOURCES, ARXIV_SORT_FIELDS
+from pdf_summarize_server import download_pdf, extract_text_from_pdf, summarize_text_with_llm, llm_router
+from chunked_summarizer import SUMMARY_MODES
+from tool_logging import log_tool_call
+from summary_pipeline import summary_cache, local_index, job_queue, prefetcher, prefetch_search_results, start_summary_run, summary_runs, semantic_index, find_similar_papers, page_store
+from page_store import PageSelection
+from semantic_search import EmbeddingError
+from job_queue import resolve_pdf_url
+from summary_runs import RunExpiredError, sse_run_events, wants_event_stream
+from shared_store import shared_store
+from tracing import TRACING_ENABLED, render_metrics, trace
 
 from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
@@ -111,17 +119,6 @@ def main():
             print("Invalid command. Please use 'search <query>' or 'summarize <PDF_URL>'.")
 
 
-def log_tool_call(tool_name, arguments, outcome, latency):
-    timestamp = datetime.now().isoformat()
-    log_entry = {
-        "timestamp": timestamp,
-        "tool_name": tool_name,
-        "arguments": arguments,
-        "outcome": outcome,
-        "latency": f"{latency:.2f}s"
-    }
-    print(f"[LOG] {json.dumps(log_entry)}")
-
 @app.route('/search', methods=['POST'])
 def search_papers_api():
     data = request.get_json()
@@ -130,26 +127,122 @@ def search_papers_api():
     if not query:
         return jsonify({'error': 'Query parameter is required'}), 400
 
+    try:
+        max_results = int(data.get('max_results', 10))
+        start = int(data.get('start', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_results and start must be integers'}), 400
+
+    source = data.get('source', os.getenv("SEARCH_SOURCE", "arxiv"))
+    if source not in SEARCH_SOURCES:
+        return jsonify({'error': f"source must be one of: {', '.join(SEARCH_SOURCES)}"}), 400
+    # Re-ranking is on by default once semantic search is enabled.
+    reranker = semantic_index if data.get('rerank', True) else None
+
     start_time = time.time()
+    with trace("search", query=query, source=source) as search_trace:
+        try:
+            papers = search_papers(query, max_results=max_results, start=start, source=source, index=local_index, reranker=reranker)
+            outcome = "success"
+            search_trace.set(records=len(papers))
+            prefetch_search_results(papers)
+            response_data = []
+            for paper in papers:
+                response_data.append({
+                    "title": paper['title'],
+                    "authors": paper['authors'],
+                    "summary": paper['summary'],
+                    "pdf_url": paper['pdf_url']
+                })
+            return jsonify(response_data)
+        except Exception as e:
+            outcome = f"error: {e}"
+            search_trace.fail()
+            return jsonify({'error': str(e)}), 500
+        finally:
+            end_time = time.time()
+            latency = end_time - start_time
+            log_tool_call("search_arxiv", {"query": query, "source": source}, outcome, latency)
+
+@app.route('/search/similar', methods=['POST'])
+def similar_papers_api():
+    if semantic_index is None:
+        return jsonify({'error': 'Semantic search is disabled (SEMANTIC_SEARCH=0)'}), 404
+    data = request.get_json()
+    pdf_url = resolve_pdf_url(data.get('pdf_url'))
+
+    if not pdf_url:
+        return jsonify({'error': 'pdf_url must be a PDF URL or arXiv ID'}), 400
     try:
-        papers = search_arxiv(query)
+        max_results = int(data.get('max_results', 10))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_results must be an integer'}), 400
+
+    start_time = time.time()
+    outcome = "success"
+    with trace("similar", pdf_url=pdf_url) as similar_trace:
+        try:
+            papers = find_similar_papers(pdf_url, max_results)
+            if papers is None:
+                outcome = "unknown paper"
+                return jsonify({'error': 'Paper not seen yet; search for it or summarize it first'}), 404
+            return jsonify([
+                {
+                    "title": paper.get('title'),
+                    "authors": paper.get('authors'),
+                    "summary": paper.get('summary'),
+                    "pdf_url": paper.get('pdf_url'),
+                    "score": paper['score']
+                }
+                for paper in papers
+            ])
+        except EmbeddingError as e:
+            outcome = f"error: {e}"
+            similar_trace.fail()
+            return jsonify({'error': str(e)}), 500
+        finally:
+            log_tool_call("similar_papers", {"pdf_url": pdf_url}, outcome, time.time() - start_time)
+
+@app.route('/harvest', methods=['POST'])
+def harvest_papers_api():
+    data = request.get_json()
+    query = data.get('query')
+
+    if not query:
+        return jsonify({'error': 'Query parameter is required'}), 400
+
+    try:
+        max_results = int(data['max_results']) if data.get('max_results') is not None else None
+        start = int(data.get('start', 0))
+        page_size = int(data['page_size']) if data.get('page_size') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_results, start and page_size must be integers'}), 400
+
+    sort_by = data.get('sort_by', 'submittedDate')
+    if sort_by not in ARXIV_SORT_FIELDS:
+        return jsonify({'error': f"sort_by must be one of: {', '.join(ARXIV_SORT_FIELDS)}"}), 400
+
+    def generate():
+        # One JSON record per line; a failure mid-way ends the stream with an
+        # {"error": ...} line after the records already sent.
+        start_time = time.time()
+        count = 0
         outcome = "success"
-        response_data = []
-        for paper in papers:
-            response_data.append({
-                "title": paper['title'],
-                "authors": paper['authors'],
-                "summary": paper['summary'],
-                "pdf_url": paper['pdf_url']
-            })
-        return jsonify(response_data)
-    except Exception as e:
-        outcome = f"error: {e}"
-        return jsonify({'error': str(e)}), 500
-    finally:
-        end_time = time.time()
-        latency = end_time - start_time
-        log_tool_call("search_arxiv", {"query": query}, outcome, latency)
+        with trace("harvest", query=query) as harvest_trace:
+            try:
+                for record in harvest_arxiv(query, max_results=max_results, start=start, page_size=page_size, sort_by=sort_by):
+                    count += 1
+                    local_index.add_paper(dict(record, authors=", ".join(record['authors'])))
+                    yield json.dumps(record) + "\n"
+            except Exception as e:
+                outcome = f"error: {e}"
+                harvest_trace.fail()
+                yield json.dumps({'error': str(e)}) + "\n"
+            finally:
+                harvest_trace.set(records=count)
+                log_tool_call("harvest_arxiv", {"query": query, "records": count}, outcome, time.time() - start_time)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 @app.route('/summarize', methods=['POST'])
 def summarize_pdf_api():
@@ -159,42 +252,136 @@ def summarize_pdf_api():
     if not pdf_url:
         return jsonify({'error': 'PDF URL parameter is required'}), 400
 
+    mode = data.get('mode', os.getenv("SUMMARY_MODE", "auto"))
+    incremental = bool(data.get('incremental', False))
+    if mode not in SUMMARY_MODES:
+        return jsonify({'error': f"mode must be one of: {', '.join(SUMMARY_MODES)}"}), 400
+
+    stream_format = data.get('stream')
+    if stream_format not in (None, 'text', 'sse'):
+        return jsonify({'error': "stream must be one of: text, sse"}), 400
+    try:
+        selection = PageSelection.parse(data.get('pages'), data.get('sections'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # The summary is produced by a background run, so a client that drops the
+    # connection can resume it from /summarize/runs/<run_id>/stream.
+    run = start_summary_run(pdf_url, mode=mode, incremental=incremental, selection=selection)
+    try:
+        return _run_stream_response(run, 0, 0, wants_event_stream(request.headers.get('Accept'), stream_format))
+    except RunExpiredError as e:
+        # Joined a run that has already dropped its first chunks.
+        return jsonify({'error': str(e)}), 410
+
+def _run_stream_response(run, offset, after_seq, sse):
+    if sse:
+        body = sse_run_events(run, run.iter_chunks(after_seq))
+        response = Response(body, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    else:
+        response = Response(run.iter_text(offset), mimetype='text/plain')
+    response.headers['X-Summary-Run-Id'] = run.run_id
+    return response
+
+@app.route('/summarize/runs/<run_id>', methods=['GET'])
+def summarize_run_status_api(run_id):
+    run = summary_runs.get(run_id)
+    if run is None:
+        return jsonify({'error': 'Unknown run'}), 404
+    return jsonify(run.to_dict())
+
+@app.route('/summarize/runs/<run_id>/stream', methods=['GET'])
+def summarize_run_stream_api(run_id):
+    run = summary_runs.get(run_id)
+    if run is None:
+        return jsonify({'error': 'Unknown run'}), 404
+
+    # text/plain resumes from a character offset, SSE from the last event ID
+    # the client saw (sent by EventSource as Last-Event-ID on reconnect).
+    offset = request.args.get('offset', 0, type=int)
+    after_seq = request.args.get('last_event_id', type=int) or request.headers.get('Last-Event-ID', 0, type=int)
+    sse = wants_event_stream(request.headers.get('Accept'), request.args.get('stream'))
+    try:
+        response = _run_stream_response(run, offset, after_seq, sse)
+    except RunExpiredError as e:
+        return jsonify({'error': str(e)}), 410
+    log_tool_call("summary_run", {"run_id": run_id, "offset": offset, "last_event_id": after_seq}, "resumed", 0)
+    return response
+
+@app.route('/summarize/batch', methods=['POST'])
+def summarize_batch_api():
+    data = request.get_json()
+    items = data.get('items') or data.get('pdf_urls')
+
+    if not items or not isinstance(items, list):
+        return jsonify({'error': 'items must be a non-empty list of PDF URLs or arXiv IDs'}), 400
+    max_items = int(os.getenv("SUMMARY_BATCH_MAX_ITEMS", "500"))
+    if len(items) > max_items:
+        return jsonify({'error': f'At most {max_items} items per batch'}), 400
+
+    mode = data.get('mode', os.getenv("SUMMARY_MODE", "auto"))
+    if mode not in SUMMARY_MODES:
+        return jsonify({'error': f"mode must be one of: {', '.join(SUMMARY_MODES)}"}), 400
+
+    batch = job_queue.submit(items, os.getenv("LLM_PROVIDER"), os.getenv("LLM_MODEL"), mode)
+    log_tool_call("summarize_batch", {"items": len(items)}, "queued", 0)
+    return jsonify(batch), 202
+
+@app.route('/summarize/batch/<batch_id>', methods=['GET'])
+def summarize_batch_status_api(batch_id):
+    batch = job_queue.get_batch(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Unknown batch'}), 404
+    return jsonify(batch)
+
+@app.route('/summarize/batch/<batch_id>/events', methods=['GET'])
+def summarize_batch_events_api(batch_id):
+    if job_queue.get_batch(batch_id, include_summaries=False) is None:
+        return jsonify({'error': 'Unknown batch'}), 404
+    timeout = request.args.get('timeout', type=float)
+
     def generate():
-        try:
-            
-            start_time_download = time.time()
-            pdf_path = download_pdf(pdf_url)
-            latency_download = time.time() - start_time_download
-            log_tool_call("download_pdf", {"pdf_url": pdf_url}, "success", latency_download)
-
-            # Extract text
-            start_time_extract = time.time()
-            log_pdf_path_arg = f"BytesIO object (size: {pdf_path.getbuffer().nbytes} bytes)" if pdf_path else "None"
-            text_content = extract_text_from_pdf(pdf_path)
-            latency_extract = time.time() - start_time_extract
-            log_tool_call("extract_text_from_pdf", {"pdf_path": log_pdf_path_arg}, "success", latency_extract)
+        # One JSON line per job status change until the batch is complete.
+        for job in job_queue.iter_batch_events(batch_id, timeout=timeout):
+            yield json.dumps(job) + "\n"
 
-            
-            start_time_summarize = time.time()
-            
-            for chunk in summarize_text_with_llm(text_content):
-                yield chunk
-            latency_summarize = time.time() - start_time_summarize
-            log_tool_call("summarize_text_with_llm", {"text_length": len(text_content)}, "success", latency_summarize)
+    return Response(generate(), mimetype='application/x-ndjson')
 
-        except Exception as e:
-            error_message = str(e)
-            
-            if "download_pdf" not in locals() or "latency_download" not in locals():
-                log_tool_call("download_pdf", {"pdf_url": pdf_url}, f"error: {error_message}", 0)
-            if "extract_text_from_pdf" not in locals() or "latency_extract" not in locals():
-                log_tool_call("extract_text_from_pdf", {"pdf_url": pdf_url}, f"error: {error_message}", 0)
-            if "summarize_text_with_llm" not in locals() or "latency_summarize" not in locals():
-                log_tool_call("summarize_text_with_llm", {"pdf_url": pdf_url}, f"error: {error_message}", 0)
-            yield f"Error: {error_message}"
+@app.route('/summarize/jobs/<job_id>', methods=['GET'])
+def summarize_job_api(job_id):
+    job = job_queue.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_api():
+    if not TRACING_ENABLED:
+        return jsonify({'error': 'Tracing is disabled (TRACING_ENABLED=0)'}), 404
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
-    return Response(generate(), mimetype='text/plain')
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats_api():
+    return jsonify({
+        "summary": summary_cache.stats(),
+        "search": search_cache.stats(),
+        "local_index": local_index.stats(),
+        "jobs": job_queue.stats(),
+        "prefetch": prefetcher.stats(),
+        "runs": summary_runs.stats(),
+        "shared": shared_store.stats() if shared_store is not None else None,
+        "semantic": semantic_index.stats() if semantic_index is not None else None,
+        "pages": page_store.stats(),
+        "llm": llm_router.stats()
+    })
 
 
 if __name__ == "__main__":
+    # Batch job workers run from startup, so jobs persisted by an earlier run
+    # (or left running by a process that died) resume without waiting for a
+    # new batch. They are started only in the process that serves requests:
+    # the reloader runs this block in its watcher process too, and under
+    # gunicorn post_worker_init in gunicorn.conf.py starts them instead.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        job_queue.start()
     app.run(debug=True, port=5000)
\ No newline at end of file
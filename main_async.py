@@ -0,0 +1,391 @@
+"""
+Asyncio (ASGI) version of the agent host with the same /search and
+/summarize contract as main.py.
+
+Run with:
+    python main_async.py
+or:
+    uvicorn main_async:app --port 5000
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.join(current_dir, 'kairos-take-home-0')
+sys.path.append(project_root)
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+from async_tools import download_pdf_async, iterate_in_thread, make_http_client
+from chunked_summarizer import SUMMARY_MODES
+from paper_search_server import ARXIV_SORT_FIELDS, SEARCH_SOURCES, harvest_arxiv, search_cache, search_papers
+from pdf_summarize_server import llm_router
+from shared_store import shared_store
+from job_queue import resolve_pdf_url
+from semantic_search import EmbeddingError
+from page_store import PageSelection
+from summary_pipeline import (find_similar_papers, job_queue, local_index, page_store, prefetch_search_results, prefetcher,
+                              semantic_index, summarize_pdf_url, summary_cache, summary_run_key, summary_runs)
+from summary_runs import RunExpiredError, asse_run_events, wants_event_stream
+from tool_logging import log_tool_call
+from tracing import TRACING_ENABLED, render_metrics, trace
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.http_client = make_http_client()
+    app.state.run_tasks = set()
+    # Resumes jobs persisted by an earlier run without waiting for a new batch.
+    await asyncio.to_thread(job_queue.start)
+    try:
+        yield
+    finally:
+        for task in list(app.state.run_tasks):
+            task.cancel()
+        await asyncio.gather(*app.state.run_tasks, return_exceptions=True)
+        await app.state.http_client.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+@app.get('/')
+async def index():
+    return PlainTextResponse("Scientific Paper Scout Backend is running!")
+
+
+@app.post('/search')
+async def search_papers_api(request: Request):
+    data = await request.json()
+    query = data.get('query')
+
+    if not query:
+        return JSONResponse({'error': 'Query parameter is required'}, status_code=400)
+
+    try:
+        max_results = int(data.get('max_results', 10))
+        start = int(data.get('start', 0))
+    except (TypeError, ValueError):
+        return JSONResponse({'error': 'max_results and start must be integers'}, status_code=400)
+
+    source = data.get('source', os.getenv("SEARCH_SOURCE", "arxiv"))
+    if source not in SEARCH_SOURCES:
+        return JSONResponse({'error': f"source must be one of: {', '.join(SEARCH_SOURCES)}"}, status_code=400)
+    # Re-ranking is on by default once semantic search is enabled.
+    reranker = semantic_index if data.get('rerank', True) else None
+
+    start_time = time.time()
+    outcome = "success"
+    with trace("search", query=query, source=source) as search_trace:
+        try:
+            # Fresh cache hits are answered on the event loop; index lookups and
+            # cache misses (single-flight, rate-limited) run on a worker thread.
+            papers = search_cache.peek(query, max_results, start) if source == "arxiv" and reranker is None else None
+            if papers is None:
+                papers = await asyncio.to_thread(search_papers, query, max_results, start, source, local_index, reranker)
+            search_trace.set(records=len(papers))
+            await asyncio.to_thread(prefetch_search_results, papers)
+            return [
+                {
+                    "title": paper['title'],
+                    "authors": paper['authors'],
+                    "summary": paper['summary'],
+                    "pdf_url": paper['pdf_url']
+                }
+                for paper in papers
+            ]
+        except Exception as e:
+            outcome = f"error: {e}"
+            search_trace.fail()
+            return JSONResponse({'error': str(e)}, status_code=500)
+        finally:
+            log_tool_call("search_arxiv", {"query": query, "source": source}, outcome, time.time() - start_time)
+
+
+@app.post('/search/similar')
+async def similar_papers_api(request: Request):
+    if semantic_index is None:
+        return JSONResponse({'error': 'Semantic search is disabled (SEMANTIC_SEARCH=0)'}, status_code=404)
+    data = await request.json()
+    pdf_url = resolve_pdf_url(data.get('pdf_url'))
+
+    if not pdf_url:
+        return JSONResponse({'error': 'pdf_url must be a PDF URL or arXiv ID'}, status_code=400)
+    try:
+        max_results = int(data.get('max_results', 10))
+    except (TypeError, ValueError):
+        return JSONResponse({'error': 'max_results must be an integer'}, status_code=400)
+
+    start_time = time.time()
+    outcome = "success"
+    with trace("similar", pdf_url=pdf_url) as similar_trace:
+        try:
+            # Embedding and the nearest-neighbour query run on a worker thread.
+            papers = await asyncio.to_thread(find_similar_papers, pdf_url, max_results)
+            if papers is None:
+                outcome = "unknown paper"
+                return JSONResponse({'error': 'Paper not seen yet; search for it or summarize it first'}, status_code=404)
+            return [
+                {
+                    "title": paper.get('title'),
+                    "authors": paper.get('authors'),
+                    "summary": paper.get('summary'),
+                    "pdf_url": paper.get('pdf_url'),
+                    "score": paper['score']
+                }
+                for paper in papers
+            ]
+        except EmbeddingError as e:
+            outcome = f"error: {e}"
+            similar_trace.fail()
+            return JSONResponse({'error': str(e)}, status_code=500)
+        finally:
+            log_tool_call("similar_papers", {"pdf_url": pdf_url}, outcome, time.time() - start_time)
+
+
+@app.post('/harvest')
+async def harvest_papers_api(request: Request):
+    data = await request.json()
+    query = data.get('query')
+
+    if not query:
+        return JSONResponse({'error': 'Query parameter is required'}, status_code=400)
+
+    try:
+        max_results = int(data['max_results']) if data.get('max_results') is not None else None
+        start = int(data.get('start', 0))
+        page_size = int(data['page_size']) if data.get('page_size') else None
+    except (TypeError, ValueError):
+        return JSONResponse({'error': 'max_results, start and page_size must be integers'}, status_code=400)
+
+    sort_by = data.get('sort_by', 'submittedDate')
+    if sort_by not in ARXIV_SORT_FIELDS:
+        return JSONResponse({'error': f"sort_by must be one of: {', '.join(ARXIV_SORT_FIELDS)}"}, status_code=400)
+
+    def harvest_lines():
+        for record in harvest_arxiv(query, max_results=max_results, start=start, page_size=page_size, sort_by=sort_by):
+            local_index.add_paper(dict(record, authors=", ".join(record['authors'])))
+            yield json.dumps(record) + "\n"
+
+    async def generate():
+        # Pages are fetched and parsed on a bridge thread; a failure mid-way
+        # ends the stream with an {"error": ...} line.
+        start_time = time.time()
+        count = 0
+        outcome = "success"
+        with trace("harvest", query=query) as harvest_trace:
+            try:
+                async for line in iterate_in_thread(harvest_lines):
+                    count += 1
+                    yield line
+            except asyncio.CancelledError:
+                outcome = "cancelled: client disconnected"
+                raise
+            except Exception as e:
+                outcome = f"error: {e}"
+                harvest_trace.fail()
+                yield json.dumps({'error': str(e)}) + "\n"
+            finally:
+                harvest_trace.set(records=count)
+                log_tool_call("harvest_arxiv", {"query": query, "records": count}, outcome, time.time() - start_time)
+
+    return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+
+async def _produce_summary_run(run, client, pdf_url: str, mode: str, incremental: bool, selection: PageSelection = None):
+    """
+    Task running the summarize pipeline into a run log. The pipeline runs on
+    a bridge thread, downloading through the host's async client. The task is
+    not cancelled when a client disconnects, only when the host shuts down.
+    """
+    loop = asyncio.get_running_loop()
+    start_time = time.time()
+
+    def download(url: str):
+        return asyncio.run_coroutine_threadsafe(download_pdf_async(client, url), loop).result()
+
+    def summary_chunks():
+        return summarize_pdf_url(pdf_url, mode=mode, incremental=incremental, selection=selection, download=download)
+
+    try:
+        with trace("summarize", pdf_url=pdf_url, mode=mode, run_id=run.run_id) as summarize_trace, prefetcher.foreground():
+            try:
+                async for chunk in iterate_in_thread(summary_chunks):
+                    run.append(chunk)
+            except asyncio.CancelledError:
+                # The bridge thread stops at the pipeline's next chunk.
+                log_tool_call("summarize_pdf_api", {"pdf_url": pdf_url}, "cancelled: host shutting down", time.time() - start_time)
+                raise
+            except Exception as e:
+                # The span of the stage that raised already carries the error.
+                summarize_trace.fail()
+                log_tool_call("summarize_pdf_api", {"pdf_url": pdf_url}, f"error: {e}", time.time() - start_time)
+                run.append(f"Error: {e}")
+    finally:
+        summary_runs.finish(run)
+
+
+def _start_summary_run(app, pdf_url: str, mode: str, incremental: bool, selection: PageSelection = None):
+    run, created = summary_runs.get_or_create(summary_run_key(pdf_url, mode, incremental, selection),
+                                              pdf_url=pdf_url, mode=mode, incremental=incremental,
+                                              pages=selection.key if selection is not None else None)
+    if created:
+        task = asyncio.create_task(_produce_summary_run(run, app.state.http_client, pdf_url, mode, incremental, selection))
+        app.state.run_tasks.add(task)
+        task.add_done_callback(app.state.run_tasks.discard)
+    log_tool_call("summary_run", {"pdf_url": pdf_url, "run_id": run.run_id}, "started" if created else "joined", 0)
+    return run
+
+
+def _run_stream_response(run, offset: int, after_seq: int, sse: bool):
+    if sse:
+        body = asse_run_events(run, run.aiter_chunks(after_seq))
+        response = StreamingResponse(body, media_type='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    else:
+        response = StreamingResponse(run.aiter_text(offset), media_type='text/plain')
+    response.headers['X-Summary-Run-Id'] = run.run_id
+    return response
+
+
+@app.post('/summarize')
+async def summarize_pdf_api(request: Request):
+    data = await request.json()
+    pdf_url = data.get('pdf_url')
+
+    if not pdf_url:
+        return JSONResponse({'error': 'PDF URL parameter is required'}, status_code=400)
+
+    mode = data.get('mode', os.getenv("SUMMARY_MODE", "auto"))
+    incremental = bool(data.get('incremental', False))
+    if mode not in SUMMARY_MODES:
+        return JSONResponse({'error': f"mode must be one of: {', '.join(SUMMARY_MODES)}"}, status_code=400)
+
+    stream_format = data.get('stream')
+    if stream_format not in (None, 'text', 'sse'):
+        return JSONResponse({'error': "stream must be one of: text, sse"}, status_code=400)
+    try:
+        selection = PageSelection.parse(data.get('pages'), data.get('sections'))
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    # The summary is produced by a background task, so a client that drops
+    # the connection can resume it from /summarize/runs/{run_id}/stream.
+    run = _start_summary_run(request.app, pdf_url, mode, incremental, selection)
+    try:
+        return _run_stream_response(run, 0, 0, wants_event_stream(request.headers.get('accept'), stream_format))
+    except RunExpiredError as e:
+        # Joined a run that has already dropped its first chunks.
+        return JSONResponse({'error': str(e)}, status_code=410)
+
+
+@app.get('/summarize/runs/{run_id}')
+async def summarize_run_status_api(run_id: str):
+    run = summary_runs.get(run_id)
+    if run is None:
+        return JSONResponse({'error': 'Unknown run'}, status_code=404)
+    return run.to_dict()
+
+
+@app.get('/summarize/runs/{run_id}/stream')
+async def summarize_run_stream_api(request: Request, run_id: str, offset: int = 0, last_event_id: int = None, stream: str = None):
+    run = summary_runs.get(run_id)
+    if run is None:
+        return JSONResponse({'error': 'Unknown run'}, status_code=404)
+
+    # text/plain resumes from a character offset, SSE from the last event ID
+    # the client saw (sent by EventSource as Last-Event-ID on reconnect).
+    if last_event_id is None:
+        try:
+            last_event_id = int(request.headers.get('last-event-id', 0))
+        except ValueError:
+            return JSONResponse({'error': 'Last-Event-ID must be an integer'}, status_code=400)
+    try:
+        response = _run_stream_response(run, offset, last_event_id, wants_event_stream(request.headers.get('accept'), stream))
+    except RunExpiredError as e:
+        return JSONResponse({'error': str(e)}, status_code=410)
+    log_tool_call("summary_run", {"run_id": run_id, "offset": offset, "last_event_id": last_event_id}, "resumed", 0)
+    return response
+
+
+@app.post('/summarize/batch')
+async def summarize_batch_api(request: Request):
+    data = await request.json()
+    items = data.get('items') or data.get('pdf_urls')
+
+    if not items or not isinstance(items, list):
+        return JSONResponse({'error': 'items must be a non-empty list of PDF URLs or arXiv IDs'}, status_code=400)
+    max_items = int(os.getenv("SUMMARY_BATCH_MAX_ITEMS", "500"))
+    if len(items) > max_items:
+        return JSONResponse({'error': f'At most {max_items} items per batch'}, status_code=400)
+
+    mode = data.get('mode', os.getenv("SUMMARY_MODE", "auto"))
+    if mode not in SUMMARY_MODES:
+        return JSONResponse({'error': f"mode must be one of: {', '.join(SUMMARY_MODES)}"}, status_code=400)
+
+    batch = await asyncio.to_thread(job_queue.submit, items, os.getenv("LLM_PROVIDER"), os.getenv("LLM_MODEL"), mode)
+    log_tool_call("summarize_batch", {"items": len(items)}, "queued", 0)
+    return JSONResponse(batch, status_code=202)
+
+
+@app.get('/summarize/batch/{batch_id}')
+async def summarize_batch_status_api(batch_id: str):
+    batch = await asyncio.to_thread(job_queue.get_batch, batch_id)
+    if batch is None:
+        return JSONResponse({'error': 'Unknown batch'}, status_code=404)
+    return batch
+
+
+@app.get('/summarize/batch/{batch_id}/events')
+async def summarize_batch_events_api(batch_id: str, timeout: float = None):
+    if await asyncio.to_thread(job_queue.get_batch, batch_id, False) is None:
+        return JSONResponse({'error': 'Unknown batch'}, status_code=404)
+
+    async def generate():
+        # The blocking wait for status changes runs on a bridge thread.
+        async for job in iterate_in_thread(lambda: job_queue.iter_batch_events(batch_id, timeout=timeout)):
+            yield json.dumps(job) + "\n"
+
+    return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+
+@app.get('/summarize/jobs/{job_id}')
+async def summarize_job_api(job_id: str):
+    job = await asyncio.to_thread(job_queue.get_job, job_id)
+    if job is None:
+        return JSONResponse({'error': 'Unknown job'}, status_code=404)
+    return job
+
+
+@app.get('/metrics')
+async def metrics_api():
+    if not TRACING_ENABLED:
+        return JSONResponse({'error': 'Tracing is disabled (TRACING_ENABLED=0)'}, status_code=404)
+    return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4')
+
+
+@app.get('/cache/stats')
+async def cache_stats_api():
+    return {
+        "summary": summary_cache.stats(),
+        "search": search_cache.stats(),
+        "local_index": local_index.stats(),
+        "jobs": job_queue.stats(),
+        "prefetch": prefetcher.stats(),
+        "runs": summary_runs.stats(),
+        "shared": shared_store.stats() if shared_store is not None else None,
+        "semantic": semantic_index.stats() if semantic_index is not None else None,
+        "pages": page_store.stats(),
+        "llm": llm_router.stats()
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("PORT", "5000")))
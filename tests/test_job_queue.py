@@ -0,0 +1,154 @@
+"""
+Checks the SQLite summary job queue: duplicate items join the job already
+queued, jobs left running by a process that died are queued again on start,
+and the per-provider concurrency cap holds across queues sharing a database.
+"""
+import os
+import subprocess
+import sqlite3
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "kairos-take-home-0"))
+
+from job_queue import JobQueue  # noqa: E402
+
+PDF_URL = "https://arxiv.org/pdf/2401.00001"
+
+
+class BlockingJobs:
+    """
+    run_job stand-in that holds every job until released and records how
+    many ran at once.
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.ran = []
+
+    def __call__(self, pdf_url: str, mode: str) -> str:
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.ran.append(pdf_url)
+        try:
+            self.release.wait(10)
+        finally:
+            with self.lock:
+                self.running -= 1
+        return f"summary of {pdf_url}"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+@pytest.fixture
+def queues():
+    started = []
+    yield started
+    for queue in started:
+        queue.stop()
+
+
+def wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.02)
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_duplicate_items_join_the_queued_job(db_path):
+    queue = JobQueue(db_path, BlockingJobs())
+    first = queue.submit([PDF_URL, "not a url"], provider="fake", model="stub", mode="single")
+    assert [job["status"] for job in first["jobs"]] == ["queued", "invalid"]
+    assert not first["jobs"][0]["deduplicated"]
+
+    # An arXiv ID resolves to the same URL, so it joins the queued job.
+    second = queue.submit(["arXiv:2401.00001", PDF_URL], provider="fake", model="stub", mode="single")
+    assert [job["job_id"] for job in second["jobs"]] == [first["jobs"][0]["job_id"]] * 2
+    assert all(job["deduplicated"] for job in second["jobs"])
+
+    # Another mode, model or provider is a different job.
+    others = [
+        queue.submit([PDF_URL], provider="fake", model="stub", mode="chunked"),
+        queue.submit([PDF_URL], provider="fake", model="other", mode="single"),
+        queue.submit([PDF_URL], provider="gemini", model="stub", mode="single"),
+    ]
+    job_ids = {batch["jobs"][0]["job_id"] for batch in others}
+    assert len(job_ids) == 3 and first["jobs"][0]["job_id"] not in job_ids
+    assert not any(batch["jobs"][0]["deduplicated"] for batch in others)
+    assert queue.stats()["jobs"] == {"queued": 4}
+
+
+def test_finished_job_is_not_joined(db_path, queues):
+    jobs = BlockingJobs()
+    jobs.release.set()
+    queue = JobQueue(db_path, jobs, workers=1, poll_interval=0.05)
+    queues.append(queue)
+    queue.start()
+    first = queue.submit([PDF_URL], provider="fake", model="stub")
+    wait_for(lambda: queue.get_batch(first["batch_id"])["complete"])
+
+    second = queue.submit([PDF_URL], provider="fake", model="stub")
+    assert second["jobs"][0]["job_id"] != first["jobs"][0]["job_id"]
+    assert not second["jobs"][0]["deduplicated"]
+
+
+def test_jobs_of_a_dead_process_are_requeued_on_start(db_path, queues):
+    jobs = BlockingJobs()
+    jobs.release.set()
+    queue = JobQueue(db_path, jobs, workers=2, poll_interval=0.05)
+    batch = queue.submit([PDF_URL, "https://example.org/live.pdf"], provider="fake", model="stub")
+    orphan, live = (job["job_id"] for job in batch["jobs"])
+    # Claimed by a worker process that has since exited, and by one that is
+    # still alive (this one).
+    with sqlite3.connect(db_path, isolation_level=None) as db:
+        db.execute("UPDATE jobs SET status = 'running', started_at = ?, pid = ? WHERE id = ?", (time.time(), dead_pid(), orphan))
+        db.execute("UPDATE jobs SET status = 'running', started_at = ?, pid = ? WHERE id = ?", (time.time(), os.getpid(), live))
+
+    restarted = JobQueue(db_path, jobs, workers=2, poll_interval=0.05)
+    queues.append(restarted)
+    restarted.start()
+    wait_for(lambda: restarted.get_job(orphan)["status"] == "done")
+    assert restarted.get_job(orphan)["summary"] == f"summary of {PDF_URL}"
+    assert restarted.get_job(live)["status"] == "running"
+    assert jobs.ran == [PDF_URL]
+
+
+def test_provider_cap_holds_across_queues(db_path, queues):
+    jobs = BlockingJobs()
+    # Two queues on one database stand in for two worker processes.
+    for _ in range(2):
+        queue = JobQueue(db_path, jobs, workers=4, provider_limits={"gemini": 2}, poll_interval=0.05)
+        queues.append(queue)
+    gemini = queues[0].submit([f"https://example.org/{i}.pdf" for i in range(5)], provider="gemini", model="flash")
+    anthropic = queues[1].submit(["https://example.org/other.pdf"], provider="anthropic", model="haiku")
+    for queue in queues:
+        queue.start()
+
+    # The provider without a limit is not held up behind the capped one.
+    wait_for(lambda: queues[0].stats()["running_by_provider"] == {"gemini": 2, "anthropic": 1})
+    time.sleep(0.3)  # several polls of every worker
+    assert queues[0].stats()["running_by_provider"] == {"gemini": 2, "anthropic": 1}
+    assert queues[0].stats()["jobs"] == {"queued": 3, "running": 3}
+
+    jobs.release.set()
+    wait_for(lambda: queues[0].get_batch(gemini["batch_id"])["complete"])
+    wait_for(lambda: queues[1].get_batch(anthropic["batch_id"])["complete"])
+    assert jobs.peak == 3
+    assert queues[0].stats()["jobs"] == {"done": 6}
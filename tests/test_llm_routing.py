@@ -0,0 +1,176 @@
+"""
+Checks the LLM router against the fake provider: the AIMD limit grows,
+halves and stays within its bounds, callers waiting for a slot time out,
+only retryable errors are retried, and a hedged call streams the faster
+target while the slower one is cancelled and its slot freed. Options in
+the fake model name (first_token_delay, error_rate) stand in for a slow or
+throttled provider.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "kairos-take-home-0"))
+os.environ.setdefault("TRACE_LOG_PATH", "")
+
+from llm_providers import RATE_LIMITED, UNAVAILABLE, LLMError, LLMProvider, error_kind, fake_llm_chunks, register_provider, reset_providers  # noqa: E402
+from llm_routing import AdaptiveLimiter, LLMRouter  # noqa: E402
+
+PROMPT = "Summarize this.\n\nattention is all you need"
+EXPECTED = "".join(fake_llm_chunks(PROMPT))
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FailingProvider(LLMProvider):
+    """
+    Fails every call with the error named by the model, counting calls.
+    """
+
+    name = "failing"
+    calls = 0
+
+    def stream(self, prompt: str, model: str):
+        type(self).calls += 1
+        kind = {"rate_limited": RATE_LIMITED, "unavailable": UNAVAILABLE}.get(model)
+        raise LLMError(f"Error summarizing with failing provider: {model}", kind=kind)
+        yield
+
+
+@pytest.fixture(autouse=True)
+def providers():
+    register_provider(FailingProvider.name, FailingProvider)
+    FailingProvider.calls = 0
+    yield
+    reset_providers()
+
+
+def wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.02)
+
+
+def test_limit_grows_by_one_per_window_up_to_max():
+    limiter = AdaptiveLimiter(initial=4, max_limit=5)
+    for _ in range(4):
+        limiter.release(limiter.acquire(), "success", 0.1)
+    assert limiter.limit == pytest.approx(5, abs=0.1)
+    for _ in range(20):
+        limiter.release(limiter.acquire(), "success", 0.1)
+    assert limiter.limit == 5
+
+
+def test_limit_halves_once_per_window_down_to_min():
+    limiter = AdaptiveLimiter(initial=16, min_limit=3, latency_target=1)
+    # Calls started before the decrease do not decrease it again.
+    tickets = [limiter.acquire() for _ in range(4)]
+    for ticket in tickets:
+        limiter.release(ticket, RATE_LIMITED)
+    assert limiter.limit == 8
+    # A success slower than the target counts as congestion too.
+    limiter.release(limiter.acquire(), "success", 2.0)
+    assert limiter.limit == 4
+    for _ in range(3):
+        limiter.release(limiter.acquire(), RATE_LIMITED)
+    assert limiter.limit == 3
+    # Errors that are not rate limits, and cancelled calls, leave it alone.
+    limiter.release(limiter.acquire(), "error")
+    limiter.release(limiter.acquire(), "cancelled")
+    assert limiter.limit == 3
+    assert limiter.stats()["rate_limited"] == 7
+    assert limiter.stats()["slow"] == 1
+    assert limiter.stats()["failed"] == 1
+
+
+def test_waiting_for_a_slot_times_out():
+    limiter = AdaptiveLimiter(initial=1)
+    ticket = limiter.acquire()
+    start = time.monotonic()
+    assert limiter.acquire(timeout=0.2) is None
+    assert 0.2 <= time.monotonic() - start < 1
+    assert asyncio.run(limiter.aacquire(timeout=0.2)) is None
+    assert limiter.stats()["queue_timeouts"] == 2
+
+    # A slot freed while waiting is handed over.
+    threading.Timer(0.1, limiter.release, (ticket, "success", 0.1)).start()
+    assert limiter.acquire(timeout=2) is not None
+
+
+def test_router_queue_timeout_is_a_rate_limit_error():
+    router = LLMRouter(queue_timeout=0.2, max_retries=0, limiter_options={"initial": 1})
+    limiter = router.limiter("fake")
+    ticket = limiter.acquire()
+    with pytest.raises(LLMError) as raised:
+        list(router.stream(PROMPT, [("fake", "stub")]))
+    assert raised.value.kind == RATE_LIMITED
+    limiter.release(ticket, "success", 0.1)
+    assert "".join(router.stream(PROMPT, [("fake", "stub")])) == EXPECTED
+
+
+def test_error_classification():
+    assert error_kind(HTTPError(429, "Too Many Requests")) == RATE_LIMITED
+    assert error_kind(Exception("Resource exhausted: quota exceeded")) == RATE_LIMITED
+    assert error_kind(HTTPError(503, "Service Unavailable")) == UNAVAILABLE
+    assert error_kind(Exception("Overloaded")) == UNAVAILABLE
+    assert error_kind(Exception("Read timed out")) == UNAVAILABLE
+    assert error_kind(HTTPError(400, "prompt is too long")) is None
+    assert error_kind(Exception("invalid x-api-key")) is None
+
+
+@pytest.mark.parametrize("model, calls", [("rate_limited", 3), ("unavailable", 3), ("bad_request", 1)])
+def test_only_retryable_errors_are_retried(model, calls):
+    router = LLMRouter(max_retries=2, retry_base_delay=0)
+    with pytest.raises(LLMError):
+        list(router.stream(PROMPT, [("failing", model)]))
+    assert FailingProvider.calls == calls
+    assert router.stats()["retries"] == calls - 1
+
+
+def test_throttled_primary_fails_over():
+    router = LLMRouter(first_token_timeout=0, max_retries=1, retry_base_delay=0)
+    targets = [("fake", "throttled?error_rate=1"), ("fake", "healthy")]
+    assert "".join(router.stream(PROMPT, targets)) == EXPECTED
+    stats = router.stats()
+    assert (stats["retries"], stats["failovers"]) == (1, 1)
+    assert stats["providers"]["fake"]["rate_limited"] == 2
+
+
+def test_hedge_streams_the_faster_target_and_cancels_the_slower():
+    router = LLMRouter(first_token_timeout=0.2)
+    targets = [("fake", "slow?first_token_delay=10"), ("fake", "fast")]
+    start = time.monotonic()
+    assert "".join(router.stream(PROMPT, targets)) == EXPECTED
+    assert time.monotonic() - start < 2
+    assert router.stats()["hedges"] == 1
+    # The slow call gave up its slot without waiting out its delay, and
+    # counts neither as a success nor as a failure.
+    limiter = router.limiter("fake")
+    wait_for(lambda: limiter.stats()["in_flight"] == 0)
+    assert limiter.stats()["started"] == 2
+    assert limiter.stats()["succeeded"] == 1
+    assert limiter.stats()["failed"] == limiter.stats()["rate_limited"] == 0
+
+
+def test_async_hedge_streams_the_faster_target():
+    router = LLMRouter(first_token_timeout=0.2)
+    targets = [("fake", "slow?first_token_delay=10"), ("fake", "fast")]
+
+    async def collect():
+        return "".join([chunk async for chunk in router.astream(PROMPT, targets, bridge=None)])
+
+    start = time.monotonic()
+    assert asyncio.run(collect()) == EXPECTED
+    assert time.monotonic() - start < 2
+    assert router.stats()["hedges"] == 1
+    assert router.limiter("fake").stats()["in_flight"] == 0
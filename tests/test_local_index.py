@@ -0,0 +1,87 @@
+"""
+Checks that replacing a paper's text in the local index keeps document
+frequencies and cached decoded postings in step with the live documents.
+"""
+import os
+import random
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "kairos-take-home-0"))
+
+from local_index import LocalIndex  # noqa: E402
+
+
+def build(docs: dict) -> LocalIndex:
+    index = LocalIndex()
+    for (pdf_url, source), text in docs.items():
+        index.add(pdf_url, source, text)
+    return index
+
+
+def test_replaced_document_no_longer_counts_for_its_terms():
+    index = LocalIndex()
+    index.add("http://example.org/a.pdf", "summary", "transformer attention")
+    index.add("http://example.org/b.pdf", "summary", "transformer pruning")
+    assert [paper["pdf_url"] for paper in index.search("attention")] == ["http://example.org/a.pdf"]
+
+    index.add("http://example.org/a.pdf", "summary", "diffusion sampling")
+    assert index.search("attention") == []
+    assert [paper["pdf_url"] for paper in index.search("diffusion")] == ["http://example.org/a.pdf"]
+    assert [paper["pdf_url"] for paper in index.search("transformer")] == ["http://example.org/b.pdf"]
+    # Counted when the postings are decoded for a query.
+    assert index._df["attention"] == 0
+    assert index._df["transformer"] == 1
+
+
+def test_replacements_match_a_fresh_index():
+    rng = random.Random(7)
+    vocabulary = [f"term{i}" for i in range(60)]
+    index = LocalIndex()
+    docs = {}
+    for step in range(600):
+        key = (f"http://example.org/{rng.randrange(40)}.pdf", rng.choice(["summary", "fulltext"]))
+        docs[key] = " ".join(rng.choices(vocabulary, k=rng.randint(3, 30)))
+        index.add(*key, docs[key])
+        if step % 25:
+            continue
+        query = " ".join(rng.sample(vocabulary[:10], 2))
+        cached = index.search(query)
+        # Decoded postings left in the cache give the same ranking as
+        # decoding everything again.
+        index._decoded.clear()
+        index._decoded_postings_count = 0
+        assert index.search(query) == cached
+
+        fresh = build(docs)
+        fresh.search(query)
+        for term in query.split():
+            assert index._df[term] == fresh._df[term], term
+
+
+WRITER = """
+import sys
+sys.path.append(sys.argv[1])
+from local_index import LocalIndex
+index = LocalIndex(sys.argv[2], compact_after=25)
+for i in range(int(sys.argv[4])):
+    index.add(f"http://example.org/{sys.argv[3]}-{i}.pdf", "summary", f"shared corpus writer{sys.argv[3]} item{i}")
+"""
+
+
+def test_worker_processes_share_one_index_dir(tmp_path):
+    # Several processes appending to one directory, each compacting every
+    # 25 entries, as gunicorn workers do.
+    index_dir = str(tmp_path / "index")
+    reader = LocalIndex(index_dir)
+    writers = [subprocess.Popen([sys.executable, "-c", WRITER, os.path.join(ROOT_DIR, "kairos-take-home-0"), index_dir, str(n), "400"])
+               for n in range(3)]
+    for writer in writers:
+        assert writer.wait(60) == 0
+
+    # A process that was running all along picks up the other processes'
+    # documents, across their compactions.
+    assert len(reader.search("shared corpus", limit=2000)) == 1200
+    assert [paper["pdf_url"] for paper in reader.search("writer2 item399")][0] == "http://example.org/2-399.pdf"
+    assert reader.stats()["documents"] == LocalIndex(index_dir).stats()["documents"] == 1200
@@ -0,0 +1,154 @@
+"""
+Checks the PDF download limits against a local HTTP server: oversized and
+slow downloads are rejected within the time limit, and an endless body is
+cut off at the size limit without buffering it.
+"""
+import asyncio
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "kairos-take-home-0"))
+os.environ.setdefault("PDF_BLOB_STORE_DIR", tempfile.mkdtemp(prefix="pdf-blobs-"))
+os.environ.setdefault("TRACE_LOG_PATH", "")
+
+from async_tools import download_pdf_async, make_http_client  # noqa: E402
+from pdf_summarize_server import download_pdf  # noqa: E402
+
+MAX_BYTES = 2 * 1024 * 1024
+PDF_BODY = b"%PDF-1.4\n" + b"0" * (300 * 1024)
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    # HTTP/1.0: bodies without a Content-Length end when the server closes.
+
+    def do_GET(self):
+        route = getattr(self, "route_" + self.path.strip("/").replace("-", "_"))
+        try:
+            route()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _headers(self, length=None):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        if length is not None:
+            self.send_header("Content-Length", str(length))
+        self.end_headers()
+
+    def route_ok(self):
+        self._headers(len(PDF_BODY))
+        self.wfile.write(PDF_BODY)
+
+    def route_declared_too_big(self):
+        self._headers(10 * MAX_BYTES)
+        self.wfile.write(PDF_BODY)
+
+    def route_endless(self):
+        # No Content-Length: only the running byte count can stop it.
+        self._headers()
+        block = b"0" * 64 * 1024
+        for _ in range(100 * MAX_BYTES // len(block)):
+            self.wfile.write(block)
+
+    def route_trickle(self):
+        # Fast enough never to trip a per-read timeout, far too slow to finish.
+        self._headers(len(PDF_BODY))
+        for _ in range(200):
+            self.wfile.write(b"0")
+            self.wfile.flush()
+            time.sleep(0.05)
+
+    def route_stall_late(self):
+        # Each read resets the per-read timeout, until the body stalls just
+        # before the total time runs out.
+        self._headers(len(PDF_BODY))
+        for _ in range(4):
+            self.wfile.write(b"0")
+            self.wfile.flush()
+            time.sleep(0.3)
+        time.sleep(10)
+
+    def route_stall(self):
+        self._headers(len(PDF_BODY))
+        self.wfile.flush()
+        time.sleep(10)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def download_async(url: str, **kwargs):
+    async def run():
+        client = make_http_client()
+        try:
+            return await download_pdf_async(client, url, **kwargs)
+        finally:
+            await client.aclose()
+
+    return asyncio.run(run())
+
+
+DOWNLOADERS = {"sync": download_pdf, "async": download_async}
+
+
+@pytest.fixture(params=sorted(DOWNLOADERS))
+def download(request):
+    return DOWNLOADERS[request.param]
+
+
+def test_downloads_within_limits(base_url, download):
+    pdf = download(f"{base_url}/ok", max_bytes=MAX_BYTES, timeout=5)
+    assert pdf is not None
+    with pdf:
+        assert pdf.size == len(PDF_BODY)
+        assert pdf.read() == PDF_BODY
+
+
+def test_rejects_declared_oversized_pdf(base_url, download):
+    assert download(f"{base_url}/declared-too-big", max_bytes=MAX_BYTES, timeout=5) is None
+
+
+def test_endless_body_is_cut_off_with_bounded_memory(base_url, download):
+    tracemalloc.start()
+    try:
+        start = time.monotonic()
+        assert download(f"{base_url}/endless", max_bytes=MAX_BYTES, timeout=30) is None
+        elapsed = time.monotonic() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # The body is 100x the limit; reading past the limit would take longer
+    # and hold more than the limit plus one chunk.
+    assert peak < MAX_BYTES + 1024 * 1024
+    assert elapsed < 5
+
+
+@pytest.mark.parametrize("route", ["trickle", "stall"])
+def test_slow_download_times_out_on_total_time(base_url, download, route):
+    start = time.monotonic()
+    assert download(f"{base_url}/{route}", max_bytes=MAX_BYTES, timeout=1) is None
+    assert time.monotonic() - start < 2
+
+
+def test_blocked_read_ends_at_total_time(base_url, download):
+    start = time.monotonic()
+    assert download(f"{base_url}/stall-late", max_bytes=MAX_BYTES, timeout=1) is None
+    # A read blocked when the time runs out is not left to its own timeout.
+    assert time.monotonic() - start < 1.5
@@ -0,0 +1,71 @@
+"""
+Checks the extraction worker pool: pages come back in order, and a document
+that times out has only its own workers killed, so a document extracted
+alongside it still gets every page.
+"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "kairos-take-home-0"))
+sys.path.append(os.path.join(ROOT_DIR, "benchmarks"))
+
+import pdf_extraction  # noqa: E402
+from pdf_extraction import extract_pages, iter_page_texts  # noqa: E402
+from sample_pdfs import ensure_samples  # noqa: E402
+
+WORKERS = 2
+
+
+@pytest.fixture(scope="module")
+def sample_paths(tmp_path_factory):
+    yield ensure_samples(str(tmp_path_factory.mktemp("samples")))
+    pdf_extraction.shutdown_pool()
+
+
+@pytest.fixture
+def stuck_pdf(tmp_path):
+    # Opening a FIFO nobody writes to blocks the worker, like a PDF that
+    # never finishes parsing.
+    if not hasattr(os, "mkfifo"):
+        pytest.skip("needs a FIFO")
+    path = str(tmp_path / "stuck.pdf")
+    os.mkfifo(path)
+    return path
+
+
+def test_pool_matches_in_process_extraction(sample_paths):
+    for path in sample_paths:
+        stats = {}
+        pages = list(iter_page_texts(path, workers=WORKERS, stats=stats))
+        assert pages == extract_pages(path, workers=0)
+        assert stats["complete"]
+
+
+def test_timeout_kills_only_that_documents_workers(sample_paths, stuck_pdf):
+    path = sample_paths[-1]
+    expected = extract_pages(path, workers=0)
+    results = []
+
+    def extract_repeatedly():
+        for _ in range(5):
+            stats = {}
+            results.append((list(iter_page_texts(path, workers=WORKERS, stats=stats)), stats["complete"]))
+
+    other = threading.Thread(target=extract_repeatedly)
+    other.start()
+    stats = {}
+    start = time.monotonic()
+    assert list(iter_page_texts(stuck_pdf, timeout=0.5, workers=WORKERS, stats=stats)) == []
+    assert time.monotonic() - start < 5
+    assert stats["complete"] is False
+    other.join(60)
+
+    assert not other.is_alive()
+    assert results == [(expected, True)] * 5
+    # The pool recovered from the killed worker.
+    assert list(iter_page_texts(path, workers=WORKERS)) == expected
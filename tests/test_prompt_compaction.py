@@ -0,0 +1,145 @@
+"""
+Checks prompt compaction on the paper-shaped sample PDFs built by
+benchmarks/sample_pdfs.py: the sections a summary needs are kept, references
+and running headers/footers are dropped, and the prompt gets smaller.
+"""
+import os
+import re
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "kairos-take-home-0"))
+sys.path.append(os.path.join(ROOT_DIR, "benchmarks"))
+
+from chunked_summarizer import CHUNK_PROMPT, estimate_tokens, summarize_text  # noqa: E402
+from pdf_extraction import extract_pages  # noqa: E402
+from prompt_compaction import auto_chunk_tokens, compact_page_stream, compact_pages, find_sections, prepare_prompt_text  # noqa: E402
+from sample_pdfs import PAPER_CORPUS, ensure_paper_samples, ensure_samples  # noqa: E402
+
+SECTION_HEADINGS = ["1 Introduction", "2 Related Work", "3 Method", "4 Experiments", "5 Results", "6 Discussion", "7 Conclusion"]
+PAGE_FOOTER_RE = re.compile(r"^Page \d+ of \d+$", re.MULTILINE)
+REFERENCE_RE = re.compile(r"^\[\d+\] Author", re.MULTILINE)
+
+
+@pytest.fixture(scope="module")
+def samples_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("samples"))
+
+
+@pytest.fixture(scope="module", params=[name for name, _ in PAPER_CORPUS])
+def paper_pages(request, samples_dir):
+    paths = dict(zip((name for name, _ in PAPER_CORPUS), ensure_paper_samples(samples_dir)))
+    return extract_pages(paths[request.param], workers=0)
+
+
+def compacted_texts(pages):
+    return {
+        "whole": compact_pages(pages).render(),
+        "streamed": "\n".join(compact_page_stream(pages)),
+    }
+
+
+def test_keeps_abstract_headings_and_conclusion(paper_pages):
+    for label, text in compacted_texts(paper_pages).items():
+        assert "Abstract" in text, label
+        for heading in SECTION_HEADINGS:
+            assert re.search(rf"^{heading}$", text, re.MULTILINE), f"{label}: {heading} missing"
+    kinds = [section["kind"] for section in find_sections(paper_pages)]
+    assert kinds == ["abstract", "introduction", "related work", "method", "experiments", "results", "discussion",
+                     "conclusion", "references"]
+
+
+def test_drops_references_and_boilerplate(paper_pages):
+    for label, text in compacted_texts(paper_pages).items():
+        assert not REFERENCE_RE.search(text), f"{label}: reference entries left in"
+        assert "[References omitted]" in text, label
+        assert not PAGE_FOOTER_RE.search(text), f"{label}: page footer left in"
+        assert "- Preprint" not in text, f"{label}: running header left in"
+        assert "repre-\n" not in text and "representation" in text, f"{label}: hyphenated break not joined"
+
+    stats = compact_pages(paper_pages).stats
+    assert stats["reference_lines"] > 0
+    # A running header and a footer on every page.
+    assert stats["boilerplate_lines"] == 2 * len(paper_pages)
+    assert stats["table_rows"] > 0
+
+
+def test_reduces_token_count(paper_pages):
+    document = compact_pages(paper_pages)
+    text = document.render()
+    stats = document.stats
+    assert stats["tokens_before"] == sum(estimate_tokens(page) for page in paper_pages)
+    assert stats["tokens_after"] == estimate_tokens(text)
+    assert stats["tokens_saved"] == stats["tokens_before"] - stats["tokens_after"]
+    # References are the last fifth of each fixture.
+    assert stats["tokens_after"] < 0.85 * stats["tokens_before"]
+
+    stream_stats = {}
+    list(compact_page_stream(paper_pages, stream_stats))
+    assert stream_stats["tokens_before"] == stats["tokens_before"]
+    assert stream_stats["tokens_after"] < 0.85 * stream_stats["tokens_before"]
+
+
+def test_budget_keeps_abstract_and_conclusion(paper_pages):
+    document = compact_pages(paper_pages)
+    text = document.render(3000)
+    assert document.stats["tokens_after"] <= 3000
+    assert "Abstract" in text
+    assert "7 Conclusion" in text
+    assert document.stats["truncated_sections"] + document.stats["dropped_sections"] > 0
+
+
+def test_single_mode_applies_model_budget(paper_pages, monkeypatch):
+    monkeypatch.setenv("SUMMARY_TOKEN_BUDGET", "2000")
+    text, stats = prepare_prompt_text(paper_pages, "single", "gpt-4o")
+    assert stats["tokens_after"] <= 2000
+    assert estimate_tokens(text) == stats["tokens_after"]
+
+    _, chunked_stats = prepare_prompt_text(paper_pages, "chunked", "gpt-4o")
+    assert chunked_stats["truncated_sections"] == chunked_stats["dropped_sections"] == 0
+
+
+def test_unstructured_text_is_kept(samples_dir):
+    pages = extract_pages(ensure_samples(samples_dir)[0], workers=0)
+    document = compact_pages(pages)
+    text = document.render()
+    assert find_sections(pages) == []
+    assert document.stats["reference_lines"] == document.stats["dropped_sections"] == 0
+    # Only the running header and footer lines go.
+    assert 0 < document.stats["tokens_saved"] < 0.05 * document.stats["tokens_before"]
+    assert pages[0].split("\n")[1].strip() in text
+
+
+@pytest.mark.parametrize("page_count", [3, 10])
+def test_table_of_contents_entry_drops_nothing(page_count):
+    # "Our Approach" is not a recognized heading, so a references section
+    # started by the contents entry would run over it.
+    pages = ["Contents\nReferences\nAcknowledgments\nOur Approach\nWe propose a sparse mixture of experts."]
+    topics = ["routing", "capacity", "load balancing", "expert choice", "sparsity", "distillation", "pruning", "scaling"]
+    pages += [f"The model is studied in terms of {topic}." for topic in topics[:page_count - 2]]
+    pages.append("Acknowledgments\nWe thank the reviewers.\nReferences\n[1] Author A. A paper title.")
+    for label, text in compacted_texts(pages).items():
+        assert "We propose a sparse mixture of experts." in text, label
+        assert f"in terms of {topics[page_count - 3]}." in text, label
+        assert "[1] Author" not in text and "We thank the reviewers." not in text, label
+        assert "[References omitted]" in text and "[Acknowledgments omitted]" in text, label
+
+
+def test_auto_mode_leaves_text_over_the_budget_for_chunking(paper_pages, monkeypatch):
+    monkeypatch.setenv("SUMMARY_TOKEN_BUDGET", "2000")
+    assert auto_chunk_tokens("gpt-3.5-turbo") == 2000
+    text, stats = prepare_prompt_text(paper_pages, "auto", "gpt-3.5-turbo")
+    assert stats["tokens_after"] > 2000
+    assert stats["truncated_sections"] == stats["dropped_sections"] == 0
+
+    prompts = []
+
+    def llm(prompt):
+        prompts.append(prompt)
+        yield "summary"
+
+    list(summarize_text(text, mode="auto", llm=llm, max_input_tokens=auto_chunk_tokens("gpt-3.5-turbo")))
+    assert prompts[0].startswith(CHUNK_PROMPT.split("{")[0])
+    assert len(prompts) >= 2
@@ -0,0 +1,87 @@
+"""
+Checks that an arXiv search against an upstream that never answers fails
+within ARXIV_TIMEOUT, and that identical searches coalesced onto it get the
+same error instead of waiting forever.
+"""
+import http.server
+import os
+import sys
+import threading
+import time
+
+import pytest
+import requests
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "kairos-take-home-0"))
+os.environ.setdefault("ARXIV_MIN_INTERVAL", "0")
+os.environ.setdefault("TRACE_LOG_PATH", "")
+
+import paper_search_server  # noqa: E402
+from search_cache import SearchCache  # noqa: E402
+
+TIMEOUT = 1
+
+
+class StallHandler(http.server.BaseHTTPRequestHandler):
+    requests_seen = 0
+    release = threading.Event()
+
+    def do_GET(self):
+        type(self).requests_seen += 1
+        # Accepts the connection but sends nothing until the test is over.
+        self.release.wait(10)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stalled_arxiv(monkeypatch):
+    StallHandler.requests_seen = 0
+    StallHandler.release.clear()
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StallHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(paper_search_server, "ARXIV_API_URL", f"http://127.0.0.1:{server.server_port}/api/query")
+    monkeypatch.setattr(paper_search_server, "ARXIV_TIMEOUT", TIMEOUT)
+    yield
+    StallHandler.release.set()
+    server.shutdown()
+
+
+def test_fetch_times_out(stalled_arxiv):
+    start = time.monotonic()
+    with pytest.raises(requests.exceptions.Timeout):
+        paper_search_server.fetch_arxiv("stalled")
+    assert time.monotonic() - start < TIMEOUT + 1
+
+
+def test_coalesced_waiter_gets_leader_timeout(stalled_arxiv):
+    cache = SearchCache(paper_search_server.fetch_arxiv)
+    errors = {}
+
+    def search(name):
+        try:
+            cache.get("stalled query")
+        except Exception as e:
+            errors[name] = e
+
+    start = time.monotonic()
+    leader = threading.Thread(target=search, args=("leader",))
+    leader.start()
+    while not StallHandler.requests_seen and time.monotonic() - start < TIMEOUT:
+        time.sleep(0.01)
+    waiter = threading.Thread(target=search, args=("waiter",))
+    waiter.start()
+    leader.join(TIMEOUT + 2)
+    waiter.join(TIMEOUT + 2)
+
+    assert not leader.is_alive() and not waiter.is_alive()
+    assert time.monotonic() - start < TIMEOUT + 2
+    assert isinstance(errors.get("leader"), requests.exceptions.Timeout)
+    assert errors.get("waiter") is errors["leader"]
+    stats = cache.stats()
+    assert stats["coalesced"] == 1
+    assert stats["upstream_requests"] == StallHandler.requests_seen == 1
+    assert stats["errors"] == 1
@@ -0,0 +1,128 @@
+"""
+Checks the summary cache through the summarize pipeline with the fake
+provider: a second request for the same paper, model and mode is replayed
+without calling the LLM, another model or mode is a miss, arXiv links hit
+before anything is downloaded, and error output is never cached.
+"""
+import http.server
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "kairos-take-home-0"))
+sys.path.append(os.path.join(ROOT_DIR, "benchmarks"))
+_work_dir = tempfile.mkdtemp(prefix="summary-cache-")
+for _name in ("SUMMARY_CACHE_DIR", "PDF_BLOB_STORE_DIR", "LOCAL_INDEX_DIR", "PAGE_STORE_DIR"):
+    os.environ.setdefault(_name, os.path.join(_work_dir, _name.lower()))
+os.environ.setdefault("SUMMARY_JOBS_DB", os.path.join(_work_dir, "jobs.sqlite3"))
+os.environ.setdefault("TRACE_LOG_PATH", "")
+
+from pdf_summarize_server import download_pdf, llm_router  # noqa: E402
+from sample_pdfs import ensure_samples  # noqa: E402
+from summary_pipeline import summarize_pdf_url, summary_cache  # noqa: E402
+
+
+class PDFHandler(http.server.BaseHTTPRequestHandler):
+    body = b""
+    requests_seen = 0
+
+    def do_GET(self):
+        type(self).requests_seen += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def pdf_server(tmp_path_factory):
+    with open(ensure_samples(str(tmp_path_factory.mktemp("samples")))[0], "rb") as f:
+        PDFHandler.body = f.read()
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), PDFHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def fake_llm(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "fake")
+    monkeypatch.setenv("LLM_MODEL", "stub")
+    monkeypatch.delenv("LLM_FALLBACK", raising=False)
+    monkeypatch.setattr(llm_router, "max_retries", 0)
+
+
+def llm_calls() -> int:
+    return llm_router.limiter("fake").stats()["started"]
+
+
+def summarize(pdf_url: str, mode: str = "single", download=download_pdf) -> str:
+    return "".join(summarize_pdf_url(pdf_url, mode=mode, download=download))
+
+
+def test_same_model_and_mode_is_replayed(pdf_server):
+    pdf_url = f"{pdf_server}/same.pdf"
+    calls, hits = llm_calls(), summary_cache.stats()["hits"]
+    summary = summarize(pdf_url)
+    assert summary.startswith("[fake summary of")
+    assert llm_calls() == calls + 1
+
+    assert summarize(pdf_url) == summary
+    assert llm_calls() == calls + 1
+    assert summary_cache.stats()["hits"] == hits + 1
+
+
+def test_model_and_mode_are_part_of_the_key(pdf_server, monkeypatch):
+    pdf_url = f"{pdf_server}/keyed.pdf"
+    summarize(pdf_url)
+    calls = llm_calls()
+
+    summarize(pdf_url, mode="chunked")
+    assert llm_calls() > calls
+    calls = llm_calls()
+    monkeypatch.setenv("LLM_MODEL", "stub-2")
+    summarize(pdf_url)
+    assert llm_calls() == calls + 1
+
+    # Each of them is cached under its own key.
+    summarize(pdf_url)
+    monkeypatch.setenv("LLM_MODEL", "stub")
+    summarize(pdf_url)
+    summarize(pdf_url, mode="chunked")
+    assert llm_calls() == calls + 1
+
+
+def test_arxiv_link_hits_before_download(pdf_server):
+    downloads = []
+
+    def download(url):
+        downloads.append(url)
+        return download_pdf(f"{pdf_server}/arxiv.pdf")
+
+    summary = summarize("https://arxiv.org/abs/2401.00002", download=download)
+    assert len(downloads) == 1
+    calls, requests_seen = llm_calls(), PDFHandler.requests_seen
+
+    # The pdf link of the same paper shares the entry.
+    assert summarize("https://arxiv.org/pdf/2401.00002.pdf", download=download) == summary
+    assert len(downloads) == 1
+    assert PDFHandler.requests_seen == requests_seen
+    assert llm_calls() == calls
+
+
+def test_errors_are_not_cached(pdf_server, monkeypatch):
+    monkeypatch.setenv("LLM_MODEL", "broken?error_rate=1")
+    pdf_url = f"{pdf_server}/broken.pdf"
+    calls = llm_calls()
+    assert summarize(pdf_url).startswith("Error")
+    assert summarize(pdf_url).startswith("Error")
+    assert llm_calls() == calls + 2
@@ -0,0 +1,187 @@
+"""
+Checks resuming summary runs on both hosts: text streams resume from a
+character offset and SSE streams from the last event ID (query parameter or
+Last-Event-ID header), a reader joining a live run gets every chunk, and a
+position the run log has already dropped, or a client joining such a run,
+gets a 410.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "kairos-take-home-0"))
+sys.path.append(ROOT_DIR)
+_work_dir = tempfile.mkdtemp(prefix="summary-runs-")
+for _name in ("SUMMARY_CACHE_DIR", "PDF_BLOB_STORE_DIR", "LOCAL_INDEX_DIR", "PAGE_STORE_DIR"):
+    os.environ.setdefault(_name, os.path.join(_work_dir, _name.lower()))
+os.environ.setdefault("SUMMARY_JOBS_DB", os.path.join(_work_dir, "jobs.sqlite3"))
+os.environ.setdefault("TRACE_LOG_PATH", "")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+import main_async  # noqa: E402
+from summary_pipeline import summary_run_key, summary_runs  # noqa: E402
+from summary_runs import RunExpiredError, SummaryRun  # noqa: E402
+
+PDF_URL = "https://example.org/paper.pdf"
+CHUNKS = ["The paper ", "proposes a ", "sparse router ", "for experts."]
+TEXT = "".join(CHUNKS)
+
+
+class FlaskHost:
+    def __init__(self):
+        self.client = main.app.test_client()
+
+    def get(self, path, **kwargs):
+        response = self.client.get(path, **kwargs)
+        return response.status_code, response.get_data(as_text=True)
+
+    def post(self, path, body):
+        response = self.client.post(path, json=body)
+        return response.status_code, response.get_data(as_text=True)
+
+
+class ASGIHost:
+    def __init__(self):
+        self.client = TestClient(main_async.app)
+
+    def get(self, path, query_string=None, headers=None):
+        response = self.client.get(path, params=query_string, headers=headers)
+        return response.status_code, response.text
+
+    def post(self, path, body):
+        response = self.client.post(path, json=body)
+        return response.status_code, response.text
+
+
+@pytest.fixture(params=["flask", "asgi"])
+def host(request):
+    return {"flask": FlaskHost, "asgi": ASGIHost}[request.param]()
+
+
+@pytest.fixture(autouse=True)
+def llm_env(monkeypatch):
+    # Part of the run key.
+    monkeypatch.setenv("LLM_PROVIDER", "fake")
+    monkeypatch.setenv("LLM_MODEL", "stub")
+
+
+def new_run(chunks=CHUNKS, finish=True, max_bytes=None, pdf_url=PDF_URL, mode="single"):
+    previous = summary_runs.max_bytes
+    if max_bytes is not None:
+        summary_runs.max_bytes = max_bytes
+    try:
+        run, created = summary_runs.get_or_create(summary_run_key(pdf_url, mode, False), pdf_url=pdf_url, mode=mode,
+                                                  incremental=False, pages=None)
+    finally:
+        summary_runs.max_bytes = previous
+    assert created
+    for chunk in chunks:
+        run.append(chunk)
+    if finish:
+        summary_runs.finish(run)
+    return run
+
+
+def sse_messages(body: str):
+    # (event ID, data) of each message event, leaving out "run" and "done".
+    messages = []
+    for block in body.strip().split("\n\n"):
+        fields = {}
+        for line in block.split("\n"):
+            name, _, value = line.partition(": ")
+            fields[name] = fields[name] + "\n" + value if name in fields else value
+        if "event" not in fields:
+            messages.append((int(fields["id"]), fields["data"]))
+    return messages
+
+
+def test_run_log_positions():
+    run = SummaryRun("r1", None, max_bytes=1024)
+    for chunk in CHUNKS:
+        run.append(chunk)
+    run.finish()
+    assert "".join(run.iter_text(0)) == TEXT
+    assert "".join(run.iter_text(14)) == TEXT[14:]  # inside the second chunk
+    assert list(run.iter_chunks(2)) == [(3, CHUNKS[2]), (4, CHUNKS[3])]
+    assert list(run.iter_text(len(TEXT))) == []
+
+    # Once past max_bytes the oldest chunks go, and reading from before the
+    # oldest kept chunk fails right away.
+    small = SummaryRun("r2", None, max_bytes=len(CHUNKS[-1]) + len(CHUNKS[-2]))
+    for chunk in CHUNKS:
+        small.append(chunk)
+    small.finish()
+    with pytest.raises(RunExpiredError):
+        small.iter_chunks(1)
+    with pytest.raises(RunExpiredError):
+        small.iter_text(len(CHUNKS[0]))
+    assert list(small.iter_chunks(2)) == [(3, CHUNKS[2]), (4, CHUNKS[3])]
+    assert "".join(small.iter_text(len(TEXT) - 3)) == TEXT[-3:]
+
+
+def test_text_stream_resumes_from_offset(host):
+    run = new_run()
+    path = f"/summarize/runs/{run.run_id}/stream"
+    assert host.get(path) == (200, TEXT)
+    for offset in (5, len(CHUNKS[0]), len(TEXT) - 1, len(TEXT)):
+        assert host.get(path, query_string={"offset": offset}) == (200, TEXT[offset:])
+
+
+def test_sse_stream_resumes_after_last_event_id(host):
+    run = new_run()
+    path = f"/summarize/runs/{run.run_id}/stream"
+    accept = {"Accept": "text/event-stream"}
+    status, body = host.get(path, headers=accept)
+    assert status == 200
+    assert sse_messages(body) == list(enumerate(CHUNKS, 1))
+    assert json.loads(body.strip().split("\n\n")[-1].split("data: ", 1)[1])["status"] == "done"
+
+    # EventSource sends the header on reconnect; the query parameter is for
+    # clients that cannot set headers.
+    _, body = host.get(path, headers=dict(accept, **{"Last-Event-ID": "2"}))
+    assert sse_messages(body) == [(3, CHUNKS[2]), (4, CHUNKS[3])]
+    _, body = host.get(path, query_string={"last_event_id": 3, "stream": "sse"})
+    assert sse_messages(body) == [(4, CHUNKS[3])]
+
+
+def test_reader_of_a_live_run_gets_every_chunk(host):
+    run = new_run(chunks=CHUNKS[:1], finish=False, pdf_url="https://example.org/live.pdf")
+
+    def produce():
+        for chunk in CHUNKS[1:]:
+            time.sleep(0.05)
+            run.append(chunk)
+        summary_runs.finish(run)
+
+    threading.Thread(target=produce).start()
+    assert host.get(f"/summarize/runs/{run.run_id}/stream", query_string={"offset": 4}) == (200, TEXT[4:])
+
+
+def test_dropped_position_is_gone(host):
+    run = new_run(max_bytes=len(CHUNKS[-1]), pdf_url="https://example.org/long.pdf")
+    path = f"/summarize/runs/{run.run_id}/stream"
+    assert host.get(path, query_string={"offset": 0})[0] == 410
+    assert host.get(path, headers={"Accept": "text/event-stream", "Last-Event-ID": "1"})[0] == 410
+    assert host.get(path, query_string={"offset": len(TEXT) - len(CHUNKS[-1])}) == (200, CHUNKS[-1])
+    assert host.get("/summarize/runs/unknown/stream")[0] == 404
+
+
+def test_joining_a_run_that_dropped_its_start_is_gone(host):
+    # Still running, so a request for the same paper joins it instead of
+    # starting another, but its first chunks are no longer held.
+    pdf_url = "https://example.org/joined.pdf"
+    run = new_run(finish=False, max_bytes=len(CHUNKS[-1]), pdf_url=pdf_url)
+    try:
+        status, body = host.post("/summarize", {"pdf_url": pdf_url, "mode": "single"})
+        assert status == 410
+        assert run.run_id in json.loads(body)["error"]
+    finally:
+        summary_runs.finish(run)
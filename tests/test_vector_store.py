@@ -0,0 +1,82 @@
+"""
+Checks that worker processes sharing a vector store directory each write
+their own rows, so every key still finds its own vector after a reload.
+"""
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "kairos-take-home-0"))
+
+from vector_store import VectorStore  # noqa: E402
+
+DIM = 16
+
+
+def vector_for(key: str) -> np.ndarray:
+    vector = np.random.default_rng(abs(hash(key)) % (1 << 32)).standard_normal(DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+WRITER = """
+import sys
+import numpy as np
+sys.path.append(sys.argv[1])
+from vector_store import VectorStore
+store = VectorStore(sys.argv[2], 16, "test", initial_capacity=4)
+for i in range(int(sys.argv[4])):
+    # Every writer also adds one key shared by all of them.
+    keys = [f"{sys.argv[3]}-{i}", "shared"]
+    vectors = np.zeros((2, 16), dtype=np.float32)
+    vectors[0, i % 16] = 1
+    vectors[0, int(sys.argv[3])] += 2
+    vectors[1, 0] = 1
+    store.add_many(keys, vectors)
+"""
+
+
+def expected(key: str) -> np.ndarray:
+    vector = np.zeros(DIM, dtype=np.float32)
+    if key == "shared":
+        vector[0] = 1
+        return vector
+    writer, i = (int(part) for part in key.split("-"))
+    vector[i % DIM] = 1
+    vector[writer] += 2
+    return vector / np.linalg.norm(vector)
+
+
+def test_keys_keep_their_vectors_across_reload(tmp_path):
+    store_dir = str(tmp_path / "vectors")
+    store = VectorStore(store_dir, DIM, "test", initial_capacity=4)
+    keys = [f"key{i}" for i in range(10)]
+    store.add_many(keys, np.stack([vector_for(key) for key in keys]))
+
+    reloaded = VectorStore(store_dir, DIM, "test", initial_capacity=4)
+    stored = reloaded.get_many(keys)
+    for key in keys:
+        assert np.allclose(stored[key], vector_for(key))
+    assert reloaded.nearest(vector_for("key3"), limit=1)[0][0] == "key3"
+
+
+def test_worker_processes_share_one_store_dir(tmp_path):
+    store_dir = str(tmp_path / "vectors")
+    reader = VectorStore(store_dir, DIM, "test", initial_capacity=4)
+    writers = [subprocess.Popen([sys.executable, "-c", WRITER, os.path.join(ROOT_DIR, "kairos-take-home-0"), store_dir, str(n), "200"])
+               for n in range(3)]
+    for writer in writers:
+        assert writer.wait(60) == 0
+
+    keys = ["shared"] + [f"{n}-{i}" for n in range(3) for i in range(200)]
+    # A process that was running all along sees the other processes' rows,
+    # and a fresh one reads the same rows back from disk.
+    for store in (reader, VectorStore(store_dir, DIM, "test")):
+        assert len(store.get_many(keys)) == len(keys) == store.stats()["vectors"]
+        stored = store.get_many(keys)
+        for key in keys:
+            assert np.allclose(stored[key], expected(key)), key
+    with open(os.path.join(store_dir, "keys.txt"), encoding="utf-8") as f:
+        assert sorted(f.read().splitlines()) == sorted(keys)